@@ -0,0 +1,458 @@
+"""
+End-to-end checks of the rating pipeline on a scratch copy of a few blends, with the
+GitHub dispatch replaced by rating_ingest's stub and Cloudflare KV by kv_standin.py's
+server on a free local port. Nothing in the repository is touched: the blend files,
+rating log and queue live in a temporary directory, and the caches and lock files made
+for it are removed afterwards.
+
+    python .github/scripts/check_rating_pipeline.py                       # every check
+    python .github/scripts/check_rating_pipeline.py ingest_crash_recovery
+
+Each check prints "ok" or the traceback of what went wrong; the exit status is 1 if any
+check failed.
+"""
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Any, Iterator, List
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from kv_standin import make_handler
+from process_ratings import BLEND_DATA_DIR, process_batch
+from rating_ingest import DISPATCH_LOG, REJECTED_FILE, IngestService, RatingQueue, StubDispatcher, read_lines
+from blend_corpus import CACHE_DIR, lock_path_for, read_blend_file
+from blend_sparse import SPARSE_MARKER
+from rating_log import EVENTS_DIR, RatingLog, log_dir_for, log_lock, record, replay, sync
+
+PROCESS_RATINGS = Path(__file__).resolve().parent / "process_ratings.py"
+
+# Blends copied into each scratch corpus
+BLENDS = 4
+
+CHECKS: Dict[str, Callable[[Path], None]] = {}
+
+
+def check(func: Callable[[Path], None]) -> Callable[[Path], None]:
+    CHECKS[func.__name__[len("check_"):]] = func
+    return func
+
+
+def expect(condition: bool, message: str) -> None:
+    if not condition:
+        raise AssertionError(message)
+
+
+def scratch_corpus(root: Path, count: int = BLENDS) -> Path:
+    """root/blend_data/ holding the first `count` blend files, in the repository's format."""
+    blend_dir = root / "blend_data"
+    blend_dir.mkdir()
+    for path in sorted(BLEND_DATA_DIR.glob("*.json"))[:count]:
+        shutil.copy2(path, blend_dir / path.name)
+    if (BLEND_DATA_DIR / SPARSE_MARKER).exists():
+        shutil.copy2(BLEND_DATA_DIR / SPARSE_MARKER, blend_dir / SPARSE_MARKER)
+    return blend_dir
+
+
+def remove_scratch(root: Path) -> None:
+    """Delete a scratch tree along with the caches and lock files made for it."""
+    paths = [root, *root.rglob("*")]
+    digests = {hashlib.sha1(str(path.resolve()).encode("utf-8")).hexdigest()[:12] for path in paths if path.is_dir()}
+    for cache in CACHE_DIR.glob("*"):
+        if cache.stem.rsplit("-", 1)[-1] in digests:
+            cache.unlink()
+    for path in paths:
+        lock_path_for(path).unlink(missing_ok=True)
+    shutil.rmtree(root, ignore_errors=True)
+
+
+def reviews(blend_dir: Path) -> Dict[str, int]:
+    """Star ratings per blendId."""
+    return {path.stem: sum(read_blend_file(path).data["ratingDistribution"].values())
+            for path in sorted(blend_dir.glob("*.json"))}
+
+
+def rating_for(blend_id: str, stars: float = 3.0, **profiles: str) -> Dict[str, Any]:
+    return {"blendId": blend_id, "rating": stars, "profiles": profiles or {"strength": "Medium"}}
+
+
+def dispatches(queue_dir: Path) -> List[Dict[str, Any]]:
+    """client_payloads the stub dispatcher recorded, in order."""
+    return [entry["client_payload"] for entry in read_lines(queue_dir / DISPATCH_LOG)]
+
+
+def ingest_service(root: Path, blend_dir: Path, dispatcher=None, **options) -> IngestService:
+    queue = RatingQueue(root / "queue")
+    return IngestService(queue, blend_dir, dispatcher or StubDispatcher(queue.dir / DISPATCH_LOG), **options)
+
+
+@contextmanager
+def kv_standin(values_dir: Path, handler=None) -> Iterator[Dict[str, str]]:
+    """Serve values_dir as Cloudflare KV; yields the environment pointing process_ratings at it."""
+    class QuietHandler(handler or make_handler(values_dir)):
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield {"CF_API_BASE": f"http://127.0.0.1:{server.server_port}", "CF_API_TOKEN": "check",
+               "CF_ACCOUNT_ID": "check", "CF_KV_NAMESPACE_ID": "check"}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def run_process_ratings(*args: str, env: Dict[str, str] = None) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, str(PROCESS_RATINGS), *args], env=dict(os.environ, **(env or {})),
+                          capture_output=True, text=True)
+
+
+async def wait_until(condition: Callable[[], bool], timeout: float) -> float:
+    """Seconds until condition() held; AssertionError after `timeout`."""
+    start = time.monotonic()
+    while not condition():
+        expect(time.monotonic() - start < timeout, f"still waiting after {timeout}s")
+        await asyncio.sleep(0.02)
+    return time.monotonic() - start
+
+
+@check
+def check_ingest_crash_recovery(root: Path) -> None:
+    """A restart finishes the segments a crash left and picks up the journal, applying each rating once."""
+    blend_dir = scratch_corpus(root)
+    before = reviews(blend_dir)
+    ids = list(before)[:3]
+
+    queue = RatingQueue(root / "queue")
+    # A crash after a segment was applied and marked done, before its dispatch was saved...
+    queue.append(rating_for(ids[0]))
+    queue.append(rating_for(ids[1]))
+    applied_segment = queue.seal()
+    written, _ = process_batch(read_lines(applied_segment), blend_dir)
+    expect(len(written) == 2, f"process_batch wrote {written}")
+    queue.mark_done(applied_segment, {"blends": sorted(ids[:2]), "ratings": read_lines(applied_segment), "rejected": 0})
+    # ...with the next segment sealed but not applied yet
+    queue.append(rating_for(ids[2]))
+    queue.seal()
+    # One more rating reached the journal; a crash mid-append leaves a torn last line,
+    # which was never acknowledged
+    queue.append(rating_for(ids[2]))
+    with open(queue.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"blendId": "' + ids[0])
+
+    service = ingest_service(root, blend_dir)
+    service.recover()
+    expect(service.pending_total == 1, f"recovered {service.pending_total} journal ratings, expected 1")
+    summary = asyncio.run(service.flush())
+
+    after = reviews(blend_dir)
+    gained = {blend_id: after[blend_id] - before[blend_id] for blend_id in before}
+    expect(gained == {**dict.fromkeys(before, 0), ids[0]: 1, ids[1]: 1, ids[2]: 2}, f"ratings gained: {gained}")
+    expect(summary["applied"] == 4, f"flush summary {summary}")
+    expect(not queue.segments() and not queue.dispatches() and not queue.pending(), "queue not drained")
+    sent = dispatches(queue.dir)
+    expect([payload["blends"] for payload in sent] == [sorted(ids[:2]), [ids[2]], [ids[2]]], f"dispatched {sent}")
+    expect(len(sent[0]["ratings"]) == 2, "the resumed segment's dispatch lost the ratings applied before the crash")
+
+
+@check
+def check_ingest_flush_triggers(root: Path) -> None:
+    """max_batch ratings flush at once; fewer wait for flush_interval after the first."""
+    blend_dir = scratch_corpus(root)
+    ids = list(reviews(blend_dir))
+    interval = 0.5
+    service = ingest_service(root, blend_dir, max_batch=3, flush_interval=interval)
+    log_dir = service.queue.dir
+
+    async def run() -> None:
+        flusher = asyncio.create_task(service.flusher())
+        try:
+            for blend_id in ids[:3]:
+                await service.submit(rating_for(blend_id))
+            waited = await wait_until(lambda: len(dispatches(log_dir)) == 1, 5)
+            expect(waited < interval, f"a full batch waited {waited:.2f}s, as long as the interval")
+
+            start = time.monotonic()
+            await service.submit(rating_for(ids[0]))
+            await asyncio.sleep(interval / 2)
+            expect(len(dispatches(log_dir)) == 1, "a single rating was flushed before the interval")
+            await wait_until(lambda: len(dispatches(log_dir)) == 2, 5)
+            expect(time.monotonic() - start >= interval, "the interval flush came early")
+        finally:
+            flusher.cancel()
+
+    asyncio.run(run())
+    expect(service.pending_total == 0 and not service.queue.pending(), "ratings left queued")
+
+
+@check
+def check_ingest_rejected(root: Path) -> None:
+    """Bad payloads get a 400; ratings a blend can't take go to rejected.jsonl and leave it unchanged."""
+    blend_dir = scratch_corpus(root)
+    before = reviews(blend_dir)
+    blend_id = next(iter(before))
+    service = ingest_service(root, blend_dir)
+
+    async def run() -> Dict[str, Any]:
+        for body in [b"{not json", json.dumps({"blendId": blend_id, "rating": 3}).encode(),
+                     json.dumps(rating_for("../" + blend_id)).encode()]:
+            status, _ = await service.respond("POST", "/", body)
+            expect(status == 400, f"{body!r} got {status}, expected 400")
+        for rating in [rating_for("No Such Blend"), rating_for(blend_id, strength="Scorching"),
+                       rating_for(blend_id, 5.0), rating_for(blend_id, 2.5)]:
+            status, _ = await service.respond("POST", "/", json.dumps(rating).encode())
+            expect(status == 200, f"{rating} got {status}, expected 200")
+        return await service.flush()
+
+    summary = asyncio.run(run())
+    expect((summary["applied"], summary["rejected"]) == (1, 3), f"flush summary {summary}")
+    reasons = [entry["reason"] for entry in read_lines(service.queue.dir / REJECTED_FILE)]
+    expect(len(reasons) == 3 and any("unknown blendId" in r for r in reasons)
+           and any("strength level" in r for r in reasons) and any("half-star" in r for r in reasons),
+           f"rejected.jsonl reasons: {reasons}")
+    after = reviews(blend_dir)
+    expect(after == {**before, blend_id: before[blend_id] + 1}, "only the valid rating should have been applied")
+
+
+@check
+def check_ingest_dispatch_retry(root: Path) -> None:
+    """A failed dispatch stays saved and goes out, ahead of newer ones, on the next flush."""
+    blend_dir = scratch_corpus(root)
+    ids = list(reviews(blend_dir))
+
+    class FlakyDispatcher(StubDispatcher):
+        failures = 1
+
+        def dispatch(self, event_type: str, payload: Dict[str, Any]) -> None:
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("GitHub is down")
+            super().dispatch(event_type, payload)
+
+    service = ingest_service(root, blend_dir, FlakyDispatcher(root / "queue" / DISPATCH_LOG))
+
+    async def run() -> None:
+        await service.submit(rating_for(ids[0]))
+        await service.flush()
+        expect(len(service.queue.dispatches()) == 1 and not dispatches(service.queue.dir),
+               "the failed dispatch was not kept")
+        await service.submit(rating_for(ids[1]))
+        await service.flush()
+
+    asyncio.run(run())
+    sent = [payload["blends"] for payload in dispatches(service.queue.dir)]
+    expect(sent == [[ids[0]], [ids[1]]], f"dispatched {sent}")
+    expect(not service.queue.dispatches(), "a sent dispatch is still saved")
+
+
+@check
+def check_batch_from_file(root: Path) -> None:
+    """A JSONL batch applies several ratings per blend, skips the bad ones and lists the blends it changed."""
+    blend_dir = scratch_corpus(root)
+    before = reviews(blend_dir)
+    ids = list(before)
+    ratings = [rating_for(ids[0], 1.5), rating_for(ids[1]), rating_for(ids[0], 4.0, taste="Full"),
+               rating_for("No Such Blend"), rating_for(ids[1], strength="Scorching"), rating_for(ids[0])]
+    ratings_file, changed_list = root / "ratings.jsonl", root / "changed.txt"
+    ratings_file.write_text("".join(json.dumps(rating) + "\n" for rating in ratings), encoding="utf-8")
+
+    result = run_process_ratings("--from-file", str(ratings_file), "--blend-dir", str(blend_dir),
+                                 "--changed-list", str(changed_list))
+    expect(result.returncode == 0, f"exit {result.returncode}: {result.stderr}")
+    expect(result.stderr.count("Skipped rating") == 2, f"expected 2 skipped ratings: {result.stderr}")
+    expect("Applied 4 of 6 ratings to 2 blends" in result.stdout, result.stdout)
+    after = reviews(blend_dir)
+    expect(after == {**before, ids[0]: before[ids[0]] + 3, ids[1]: before[ids[1]] + 1}, "wrong ratings applied")
+    listed = {Path(line).stem for line in changed_list.read_text(encoding="utf-8").splitlines()}
+    expect(listed == {ids[0], ids[1]}, f"changed list {listed}")
+
+
+@check
+def check_batch_kv_day(root: Path) -> None:
+    """--kv --date applies that day's ratings from KV; a day with no key applies nothing."""
+    blend_dir = scratch_corpus(root)
+    before = reviews(blend_dir)
+    ids = list(before)
+    values_dir = root / "kv"
+    values_dir.mkdir()
+    (values_dir / "ratings_2024-01-02.json").write_text(
+        json.dumps([rating_for(ids[2]), rating_for(ids[3], 2.0), rating_for(ids[2], 3.5)]), encoding="utf-8")
+
+    with kv_standin(values_dir) as env:
+        result = run_process_ratings("--kv", "--date", "2024-01-02", "--blend-dir", str(blend_dir), env=env)
+        expect(result.returncode == 0, f"exit {result.returncode}: {result.stderr}")
+        expect("Applied 3 of 3 ratings to 2 blends" in result.stdout, result.stdout)
+        result = run_process_ratings("--kv", "--date", "2024-01-03", "--blend-dir", str(blend_dir), env=env)
+        expect(result.returncode == 0 and "Applied 0 of 0 ratings" in result.stdout, result.stdout + result.stderr)
+    after = reviews(blend_dir)
+    expect(after == {**before, ids[2]: before[ids[2]] + 2, ids[3]: before[ids[3]] + 1}, "wrong ratings applied")
+
+
+def kv_days(root: Path, ids: List[str], days: List[str]) -> Path:
+    """A KV values directory with day i's ratings for ids[0..i] (so each day is told apart by its counts)."""
+    values_dir = root / "kv"
+    values_dir.mkdir()
+    for i, day in enumerate(days):
+        ratings = [rating_for(blend_id) for blend_id in ids[:i + 1]]
+        (values_dir / f"ratings_{day}.json").write_text(json.dumps(ratings), encoding="utf-8")
+    return values_dir
+
+
+def day_gains(ids: List[str], days: int) -> Dict[str, int]:
+    """Ratings per blend after applying the first `days` days of kv_days()."""
+    return {blend_id: max(days - i, 0) for i, blend_id in enumerate(ids)}
+
+
+@check
+def check_backfill_retry(root: Path) -> None:
+    """A backfill retries every transient 503 and still applies each day once, in order."""
+    blend_dir = scratch_corpus(root)
+    before = reviews(blend_dir)
+    ids = list(before)
+    days = ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04"]
+    values_dir = kv_days(root, ids, days)
+    fetched: List[str] = []
+
+    class FailFirstHandler(make_handler(values_dir)):
+        def do_GET(self):
+            key = self.path.rsplit("/", 1)[-1]
+            fetched.append(key)
+            if fetched.count(key) == 1:
+                self.send_error(503)
+                return
+            super().do_GET()
+
+    with kv_standin(values_dir, FailFirstHandler) as env:
+        result = run_process_ratings("--kv", "--since", days[0], "--until", days[-1], "--workers", "4",
+                                     "--checkpoint", str(root / "checkpoint.json"), "--blend-dir", str(blend_dir),
+                                     env=env)
+    expect(result.returncode == 0, f"exit {result.returncode}: {result.stderr}")
+    expect(result.stderr.count("Retrying") == len(days), f"expected one retry per day: {result.stderr}")
+    expect(sorted(fetched) == sorted(f"ratings_{day}" for day in days for _ in range(2)), f"fetched {fetched}")
+    applied = [line.split(":")[0] for line in result.stdout.splitlines()]
+    expect(applied == days, f"days applied out of order: {applied}")
+    after = reviews(blend_dir)
+    gained = day_gains(ids, len(days))
+    expect(after == {blend_id: before[blend_id] + gained[blend_id] for blend_id in ids}, "wrong ratings applied")
+
+
+@check
+def check_backfill_resume(root: Path) -> None:
+    """A backfill stopped by a failing day checkpoints the days before it, and a rerun resumes after them."""
+    blend_dir = scratch_corpus(root)
+    before = reviews(blend_dir)
+    ids = list(before)
+    days = ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04"]
+    values_dir = kv_days(root, ids, days)
+    checkpoint = root / "checkpoint.json"
+    fetched: List[str] = []
+    broken = {f"ratings_{days[2]}"}
+
+    class BrokenDayHandler(make_handler(values_dir)):
+        def do_GET(self):
+            key = self.path.rsplit("/", 1)[-1]
+            fetched.append(key)
+            if key in broken:
+                # Not a retryable status: the backfill stops straight away
+                self.send_error(403)
+                return
+            super().do_GET()
+
+    args = ["--kv", "--since", days[0], "--until", days[-1], "--workers", "2", "--checkpoint", str(checkpoint),
+            "--blend-dir", str(blend_dir)]
+    with kv_standin(values_dir, BrokenDayHandler) as env:
+        result = run_process_ratings(*args, env=env)
+        expect(result.returncode == 1 and "backfill stopped" in result.stderr,
+               f"exit {result.returncode}: {result.stderr}")
+        expect(json.loads(checkpoint.read_text(encoding="utf-8"))["done"] == days[:2], "checkpoint after the failure")
+        gained = day_gains(ids, 2)
+        expect(reviews(blend_dir) == {blend_id: before[blend_id] + gained[blend_id] for blend_id in ids},
+               "the days before the failure were not applied exactly once")
+
+        broken.clear()
+        fetched.clear()
+        result = run_process_ratings(*args, env=env)
+    expect(result.returncode == 0, f"exit {result.returncode}: {result.stderr}")
+    expect(sorted(fetched) == [f"ratings_{day}" for day in days[2:]], f"the rerun fetched {fetched}")
+    expect(json.loads(checkpoint.read_text(encoding="utf-8"))["done"] == days, "checkpoint after the rerun")
+    gained = day_gains(ids, len(days))
+    expect(reviews(blend_dir) == {blend_id: before[blend_id] + gained[blend_id] for blend_id in ids},
+           "a checkpointed day was applied again")
+
+
+@check
+def check_log_late_partition(root: Path) -> None:
+    """Events appended to a partition older than the snapshot's newest are synced once, and appends never go back."""
+    blend_dir = scratch_corpus(root)
+    before = reviews(blend_dir)
+    ids = list(before)[:3]
+    log_dir = log_dir_for(blend_dir)
+    record([rating_for(ids[0])], blend_dir)
+    log = RatingLog(log_dir)
+    newest = log.partitions()[-1]
+
+    # A partition that sorts first, written after the snapshot already covered the newest
+    late = {"seq": log.last_seq() + 1, "at": "2000-01-01T00:00:00Z", **rating_for(ids[1])}
+    with open(log_dir / EVENTS_DIR / "2000-01-01.ndjson", "a", encoding="utf-8") as f:
+        f.write(json.dumps(late) + "\n")
+    sync(blend_dir)
+    expected = {**before, ids[0]: before[ids[0]] + 1, ids[1]: before[ids[1]] + 1}
+    expect(reviews(blend_dir) == expected, "the late event was not synced")
+    expect(not sync(blend_dir), "a second sync rewrote blends")
+
+    # An append dated before the newest partition goes to the newest, after the highest seq
+    with log_lock(log_dir):
+        event = log.append([rating_for(ids[2])], at="2001-01-01T00:00:00Z")[0]
+    expect(event["seq"] == late["seq"] + 1, f"appended as seq {event['seq']}")
+    expect([path.name for path in log.partitions()] == ["2000-01-01.ndjson", newest.name],
+           f"partitions {[path.name for path in log.partitions()]}")
+    sync(blend_dir)
+    expected[ids[2]] = before[ids[2]] + 1
+    expect(reviews(blend_dir) == expected, "the back-dated append was not synced")
+    _, applied, _ = replay(blend_dir)
+    expect(applied == 3 and reviews(blend_dir) == expected, f"replay applied {applied} events")
+
+
+def run_checks(checks: Dict[str, Callable[[Path], None]], description: str) -> None:
+    """Command line for a set of checks: run the named ones (default: all), each in a fresh scratch directory."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("checks", nargs="*", metavar="CHECK", help=f"checks to run (default: all): {', '.join(checks)}")
+    args = parser.parse_args()
+    unknown = [name for name in args.checks if name not in checks]
+    if unknown:
+        parser.error(f"unknown check {', '.join(unknown)}; expected one of {', '.join(checks)}")
+
+    failed = 0
+    for name in args.checks or checks:
+        root = Path(tempfile.mkdtemp(prefix="check-"))
+        start = time.perf_counter()
+        try:
+            checks[name](root)
+        except Exception:
+            failed += 1
+            print(f"FAIL {name}")
+            traceback.print_exc()
+        else:
+            print(f"ok   {name} ({time.perf_counter() - start:.1f}s)")
+        finally:
+            remove_scratch(root)
+    sys.exit(1 if failed else 0)
+
+
+def main():
+    run_checks(CHECKS, "Run end-to-end checks of the rating pipeline on scratch data.")
+
+
+if __name__ == "__main__":
+    main()
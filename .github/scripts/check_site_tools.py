@@ -0,0 +1,361 @@
+"""
+Checks of the site tools that rewrite files on disk, each run on a scratch copy of a few
+blends (and pictures) in a temporary directory, like check_rating_pipeline.py. The
+tools are run through their command lines where that is how they are used; the patch
+and lock checks call blend_patch.py and blend_corpus.py directly, from several threads.
+
+    python .github/scripts/check_site_tools.py                  # every check
+    python .github/scripts/check_site_tools.py image_prune
+
+Each check prints "ok" or the traceback of what went wrong; the exit status is 1 if any
+check failed.
+"""
+from pathlib import Path
+from typing import Callable, Dict, List
+import gzip
+import json
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+from PIL import Image
+
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT_DIR / "site_tools"))
+
+from check_rating_pipeline import expect, run_checks, scratch_corpus
+from process_ratings import process_batch
+from blend_corpus import (BLEND_DATA_DIR, PICTURES_DIR, BlendConflict, atomic_write, blend_lock, blend_version,
+                          read_blend_file, update_blend_file, write_blend_file)
+from blend_patch import PatchError, commit, parse_patches, plan
+from blend_ratings import PROFILE_SCALES, STAR_KEYS, derive_profile, empty_ratings
+from blend_shards import brotli, shard_bucket
+from blend_sparse import FIELD_DEFAULTS, dump_sparse, expand_blend
+
+CHECKS: Dict[str, Callable[[Path], None]] = {}
+
+
+def check(func: Callable[[Path], None]) -> Callable[[Path], None]:
+    CHECKS[func.__name__[len("check_"):]] = func
+    return func
+
+
+def run_tool(script: str, *args: str, status: int = 0) -> subprocess.CompletedProcess:
+    """Run one of the repository's scripts (a path from the root) with its command line."""
+    result = subprocess.run([sys.executable, str(ROOT_DIR / script), *args], capture_output=True, text=True)
+    expect(result.returncode == status, f"{script} exited {result.returncode}, expected {status}: {result.stderr}")
+    return result
+
+
+def js_shard_buckets(filenames: List[str], buckets: int) -> List[int]:
+    """shardBucket() of assets/js/blend-shards.js for each filename, run with node."""
+    node = shutil.which("node")
+    expect(node is not None, "node is needed to run the site's shardBucket()")
+    module = (ROOT_DIR / "assets" / "js" / "blend-shards.js").as_uri()
+    script = (f"import {{ readFileSync }} from 'fs'; import {{ shardBucket }} from '{module}';"
+              f"console.log(JSON.stringify(JSON.parse(readFileSync(0, 'utf8')).map(f => shardBucket(f, {buckets}))));")
+    result = subprocess.run([node, "--input-type=module", "-e", script], input=json.dumps(filenames),
+                            capture_output=True, text=True, encoding="utf-8")
+    expect(result.returncode == 0, f"node exited {result.returncode}: {result.stderr}")
+    return json.loads(result.stdout)
+
+
+@check
+def check_image_prune(root: Path) -> None:
+    """--content-address --prune deletes only the pictures it moved, never pictureless.jpg or other strays."""
+    blend_dir = scratch_corpus(root, 2)
+    pictures_dir = root / "blend_pictures"
+    pictures_dir.mkdir()
+    first, second = sorted(blend_dir.glob("*.json"))
+    sources = sorted(path for path in PICTURES_DIR.glob("*.jpg") if path.name != "pictureless.jpg")[:2]
+    shutil.copy2(sources[0], pictures_dir / "Referenced.jpg")
+    shutil.copy2(sources[1], pictures_dir / "Stray.jpg")
+    shutil.copy2(PICTURES_DIR / "pictureless.jpg", pictures_dir / "pictureless.jpg")
+
+    def point_at(name):
+        def set_image(blend):
+            blend["imagePath"] = f"../blend_pictures/{name}"
+        return set_image
+
+    update_blend_file(first, point_at("Referenced.jpg"))
+    update_blend_file(second, point_at("Missing.jpg"))
+
+    run_tool("site_tools/image_dedup.py", "--pictures-dir", str(pictures_dir), "--blend-dir", str(blend_dir),
+             "--report", str(root / "report.json"), "--content-address", "--prune")
+    remaining = sorted(path.relative_to(pictures_dir).as_posix() for path in pictures_dir.rglob("*.jpg"))
+    image_path = read_blend_file(first).data["imagePath"]
+    expect(image_path.startswith("../blend_pictures/by-hash/") and (pictures_dir / image_path[18:]).is_file(),
+           f"imagePath {image_path} does not point at a by-hash/ picture")
+    expect("pictureless.jpg" in remaining, "the prune deleted pictureless.jpg")
+    expect("Stray.jpg" in remaining, "the prune deleted a picture it never moved")
+    expect("Referenced.jpg" not in remaining, "the moved picture was not pruned")
+    report = json.loads((root / "report.json").read_text(encoding="utf-8"))
+    expect("pictureless.jpg" in report["unreferenced"], "the report should still list it as unreferenced")
+
+
+@check
+def check_image_stem_collision(root: Path) -> None:
+    """Sources differing only in extension are rejected instead of writing over each other's variants."""
+    pictures_dir = root / "pictures"
+    pictures_dir.mkdir()
+    sources = sorted(path for path in PICTURES_DIR.glob("*.jpg") if path.name != "pictureless.jpg")[:3]
+    shutil.copy2(sources[0], pictures_dir / "Same.jpg")
+    with Image.open(sources[1]) as img:
+        img.save(pictures_dir / "Same.png")
+    shutil.copy2(sources[2], pictures_dir / "Other.jpg")
+
+    output_dir = root / "out"
+    result = run_tool("site_tools/image_pipeline.py", str(pictures_dir), "--output-dir", str(output_dir), status=1)
+    expect("Same.jpg" in result.stderr and "Same.png" in result.stderr, f"errors reported: {result.stderr}")
+    written = sorted(path.name for path in output_dir.iterdir())
+    expect(not any(name.startswith("Same") for name in written), f"a colliding source was rendered: {written}")
+    expect("Other.jpg" in written, f"the other source was not rendered: {written}")
+
+
+@check
+def check_build_missing_outputs(root: Path) -> None:
+    """An incremental build with no blend edits rewrites the outputs deleted from disk since the last one."""
+    blend_dir = scratch_corpus(root, 20)
+    output_dir = root / "data"
+    build = ("scripts/build_site_data.py", "--blend-dir", str(blend_dir), "--output-dir", str(output_dir),
+             "--buckets", "4")
+    run_tool(*build)
+    expect(not (output_dir / "blend_types.json").exists(), "the build wrote a curated vocab list")
+    shard_dir = output_dir / "shards"
+    deleted = [output_dir / "blend_index.json", shard_dir / "head.json.gz", shard_dir / "detail-002.json",
+               shard_dir / "detail-003.json.gz", shard_dir / "search_index.bin"]
+    expected = {path: path.read_bytes() for path in deleted}
+    for path in deleted:
+        path.unlink()
+    run_tool(*build)
+    for path, data in expected.items():
+        expect(path.exists(), f"{path.name} was not rewritten")
+        expect(path.read_bytes() == data, f"{path.name} was rewritten with different content")
+    (shard_dir / "search_index.bin.gz").unlink()
+    run_tool(*build)
+    expect((shard_dir / "search_index.bin.gz").exists(), "a missing .gz sibling was not rewritten")
+
+
+@check
+def check_shard_contract(root: Path) -> None:
+    """Each blend is in the detail shard the site's JS hash picks, and every .gz/.br sibling matches its file."""
+    blend_dir = scratch_corpus(root, 40)
+    # Non-ASCII names, where a hash over anything but UTF-8 bytes would differ
+    for path in sorted(BLEND_DATA_DIR.glob("*.json")):
+        if not path.name.isascii() and len(list(blend_dir.glob("*.json"))) < 45:
+            shutil.copy2(path, blend_dir / path.name)
+    buckets = 8
+    output_dir = root / "data"
+    run_tool("scripts/build_site_data.py", "--blend-dir", str(blend_dir), "--output-dir", str(output_dir),
+             "--buckets", str(buckets))
+    shard_dir = output_dir / "shards"
+    shard_map = json.loads((shard_dir / "shard_map.json").read_text(encoding="utf-8"))
+    expect(shard_map["hash"] == "fnv1a32-utf8" and shard_map["buckets"] == buckets, f"shard map {shard_map}")
+
+    found = {}
+    for bucket, entry in enumerate(shard_map["detail"]):
+        shard = json.loads((shard_dir / entry["file"]).read_text(encoding="utf-8"))
+        found.update(dict.fromkeys(shard, bucket))
+    filenames = sorted(path.name for path in blend_dir.glob("*.json"))
+    expect(sorted(found) == filenames, "the detail shards do not hold exactly the corpus's blends")
+    js_buckets = js_shard_buckets(filenames, buckets)
+    for filename, js_bucket in zip(filenames, js_buckets):
+        expect(found[filename] == js_bucket == shard_bucket(filename, buckets),
+               f"{filename} is in bucket {found[filename]}, the site looks in {js_bucket}")
+
+    compressed = sorted(shard_dir.glob("*.gz"))
+    expect(len(compressed) >= buckets + 1, f"only {len(compressed)} .gz siblings were written")
+    for gz_path in compressed:
+        path = gz_path.with_suffix("")
+        data = path.read_bytes()
+        expect(gzip.decompress(gz_path.read_bytes()) == data, f"{gz_path.name} does not match {path.name}")
+        br_path = path.with_name(path.name + ".br")
+        if brotli is not None:
+            expect(br_path.exists(), f"{br_path.name} is missing")
+            expect(brotli.decompress(br_path.read_bytes()) == data, f"{br_path.name} does not match {path.name}")
+        else:
+            expect(not br_path.exists(), f"{br_path.name} is left over without brotli")
+
+
+@check
+def check_sparse_round_trip(root: Path) -> None:
+    """The sparse form of a template, a partly rated and a fully rated blend expands back to the same record."""
+    def template(**fields):
+        blend = {**FIELD_DEFAULTS, "ratingDistribution": dict.fromkeys(STAR_KEYS, 0), "ratings": empty_ratings()}
+        blend.update(fields)
+        return json.loads(json.dumps(blend))
+
+    # blend_data_creator.py writes integer averageRating and maxRating zeros
+    created = template(name="Created", averageRating=0, maxRating=0)
+    partly = template(name="Partly", blender="Rated", reviewCount=3, totalReviews=3, averageRating=3.5)
+    partly["ratingDistribution"]["4_star"] = 3
+    partly["ratings"]["taste"]["counts"].update({"Mild": 2, "Medium": 2})
+    partly["ratings"]["taste"]["tiebreak"] = "Mild"
+    partly["ratings"]["strength"]["counts"]["Overwhelming"] = 3
+    fully = template(**{field: f"{field} text" for field, default in FIELD_DEFAULTS.items() if default == ""})
+    fully.update(reviewCount=80, totalReviews=90, averageRating=2.75)
+    fully["ratingDistribution"] = {key: count for count, key in enumerate(STAR_KEYS, 1)}
+    for profile_type, (_, levels) in PROFILE_SCALES.items():
+        fully["ratings"][profile_type]["counts"] = {level: count for count, level in enumerate(levels, 1)}
+
+    for blend in (template(), created, partly, fully):
+        sparse = json.loads(dump_sparse("key", blend))["key"]
+        expanded = expand_blend(sparse)
+        expect(json.dumps(expanded) == json.dumps(blend), f"{blend['name']!r} expands to {expanded}")
+    expect(json.loads(dump_sparse("key", template()))["key"] == {}, "the bare template is not stored as {}")
+    sparse = json.loads(dump_sparse("key", partly))["key"]
+    stored = {"strength": {"Overwhelming": 3}, "taste": {"Mild": 2, "Medium": 2, "tiebreak": "Mild"}}
+    expect(sparse["ratings"] == stored, f"partly rated profiles stored as {sparse['ratings']}")
+
+
+@check
+def check_ratings_migration(root: Path) -> None:
+    """--migrate and --remigrate keep the levels legacy files showed, keep later ratings and are idempotent."""
+    blend_dir = scratch_corpus(root, 3)
+    tied, recounted, _ = sorted(blend_dir.glob("*.json"))
+    taste_scale = PROFILE_SCALES["taste"][0]
+
+    def legacy_taste(distribution, level, total_reviews):
+        def set_profile(blend):
+            blend["totalReviews"] = total_reviews
+            blend["ratings"]["taste"] = {"level": level, "scale": taste_scale,
+                                         "distribution": dict(empty_ratings()["taste"]["counts"], **distribution)}
+        return set_profile
+
+    # A tie the derived level would settle on Mild, where the legacy file showed Medium...
+    update_blend_file(tied, legacy_taste({"Mild": 100.0, "Medium": 100.0}, "Medium", 2))
+    # ...and 2:1 proportions, which are 4 and 2 ratings out of 6
+    update_blend_file(recounted, legacy_taste({"Mild": 100.0, "Medium": 50.0}, "Mild", 6))
+    legacy_dir = root / "legacy"
+    shutil.copytree(blend_dir, legacy_dir)
+
+    tool = ("site_tools/blend_ratings.py", "--blend-dir", str(blend_dir))
+    run_tool(*tool, "--check", status=1)
+    run_tool(*tool, "--migrate")
+    taste = read_blend_file(tied).data["ratings"]["taste"]
+    expect(taste.get("tiebreak") == "Medium" and derive_profile(taste)["level"] == "Medium", f"migrated to {taste}")
+    expect("Migrated 0 " in run_tool(*tool, "--migrate").stdout, "a second --migrate changed files")
+    run_tool(*tool, "--check", "--against", str(legacy_dir))
+
+    # What the first migration wrote: no tiebreak and the bare ratios, plus a rating added since
+    def first_migration(counts):
+        def set_counts(blend):
+            blend["ratings"]["taste"].pop("tiebreak", None)
+            blend["ratings"]["taste"]["counts"].update(counts)
+        return set_counts
+
+    update_blend_file(tied, first_migration({}))
+    update_blend_file(recounted, first_migration({"Mild": 2, "Medium": 2}))
+    run_tool(*tool, "--check", "--against", str(legacy_dir), status=1)
+    result = run_tool(*tool, "--remigrate", str(legacy_dir))
+    expect("in 2 blend files" in result.stdout, f"--remigrate: {result.stdout}")
+    expect(read_blend_file(tied).data["ratings"]["taste"].get("tiebreak") == "Medium", "the tiebreak was not restored")
+    counts = read_blend_file(recounted).data["ratings"]["taste"]["counts"]
+    expect((counts["Mild"], counts["Medium"]) == (4, 3), f"recounted to {counts}, expected 4 and 2 plus the new 1")
+    expect("in 0 blend files" in run_tool(*tool, "--remigrate", str(legacy_dir)).stdout,
+           "a second --remigrate changed files")
+    run_tool(*tool, "--check", "--against", str(legacy_dir))
+
+    # A rating that breaks the tie drops the tiebreak
+    process_batch([{"blendId": tied.stem, "rating": 3.0, "profiles": {"taste": "Mild"}}], blend_dir)
+    taste = read_blend_file(tied).data["ratings"]["taste"]
+    expect("tiebreak" not in taste and derive_profile(taste)["level"] == "Mild", f"after a Mild rating: {taste}")
+
+
+@check
+def check_patch_rollback(root: Path) -> None:
+    """A patch batch that hits a conflict part way puts back the files it had already replaced."""
+    blend_dir = scratch_corpus(root, 3)
+    paths = sorted(blend_dir.glob("*.json"))
+    originals = [path.read_bytes() for path in paths]
+    patches = parse_patches(json.dumps({"file": path.name, "field": "notes", "new": "Patched"}) for path in paths)
+    changes = plan(patches, blend_dir)
+
+    # Hold the last file's lock so the commit stops there, and edit that file meanwhile
+    errors = []
+
+    def run_commit():
+        try:
+            commit(changes, blend_dir)
+        except PatchError as e:
+            errors.extend(e.errors)
+
+    with blend_lock(paths[-1]):
+        writer = threading.Thread(target=run_commit)
+        writer.start()
+        start = time.monotonic()
+        while any(path.read_bytes() == original for path, original in zip(paths[:-1], originals)):
+            expect(time.monotonic() - start < 5, "the commit never replaced the first files")
+            time.sleep(0.01)
+        edited = originals[-1].decode("utf-8") + "\n"
+        atomic_write(paths[-1], edited)
+    writer.join()
+
+    expect(len(errors) == 1 and "2 files restored" in errors[0], f"commit errors: {errors}")
+    for path, original in zip(paths[:-1], originals):
+        expect(path.read_bytes() == original, f"{path.name} was not restored")
+    expect(paths[-1].read_text(encoding="utf-8") == edited, "the concurrent edit was overwritten")
+
+
+@check
+def check_blend_lock(root: Path) -> None:
+    """Concurrent update_blend_file() calls lose no update, readers never see a partial file, nothing is left over."""
+    blend_dir = scratch_corpus(root, 1)
+    path = next(blend_dir.glob("*.json"))
+    start = read_blend_file(path).data.get("reviewCount") or 0
+    writers, updates = 4, 25
+
+    def bump(blend):
+        blend["reviewCount"] = (blend.get("reviewCount") or 0) + 1
+        # Widen the window between read and write
+        time.sleep(0.001)
+
+    def write():
+        for _ in range(updates):
+            update_blend_file(path, bump)
+
+    torn = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                json.loads(path.read_text(encoding="utf-8"))
+            except ValueError as e:
+                torn.append(str(e))
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    threads = [threading.Thread(target=write) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    reader.join()
+
+    record = read_blend_file(path)
+    expect(record.data["reviewCount"] == start + writers * updates,
+           f"reviewCount {record.data['reviewCount']}, expected {start + writers * updates}")
+    expect(not torn, f"a reader saw a partial file: {torn[:1]}")
+    expect(sorted(p.name for p in blend_dir.iterdir() if p.name != ".sparse") == [path.name], "temp files left over")
+
+    stale = blend_version(path)
+    update_blend_file(path, bump)
+    try:
+        write_blend_file(path, record.key, record.data, expected=stale)
+    except BlendConflict:
+        pass
+    else:
+        raise AssertionError("write_blend_file overwrote a newer version of the file")
+    expect(read_blend_file(path).data["reviewCount"] == start + writers * updates + 1, "the newer write was lost")
+
+
+def main():
+    run_checks(CHECKS, "Run checks of the site tools that rewrite data on disk, on scratch data.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Local stand-in for the Cloudflare KV "read value" endpoint, for running
+process_ratings.py batches without Cloudflare credentials.
+
+Serves GET /accounts/<id>/storage/kv/namespaces/<id>/values/<key> from
+<dir>/<key>.json (404 when missing), e.g.:
+
+    python .github/scripts/kv_standin.py ratings_dir --port 8787
+    CF_API_BASE=http://127.0.0.1:8787 CF_API_TOKEN=x CF_ACCOUNT_ID=x CF_KV_NAMESPACE_ID=x \
+        python .github/scripts/process_ratings.py --kv --date 2024-01-01
+
+--delay and --fail-rate make it slow and flaky, to exercise a backfill's parallel
+fetches and retries (--kv --since 2024-01-01 --until 2024-01-31).
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import argparse
+import random
+import re
+import time
+
+VALUE_PATH = re.compile(r"^/accounts/[^/]+/storage/kv/namespaces/[^/]+/values/([^/?]+)$")
+
+
+def make_handler(values_dir: Path, delay: float = 0.0, fail_rate: float = 0.0):
+    class KVHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            if random.random() < fail_rate:
+                self.send_error(503)
+                return
+            match = VALUE_PATH.match(self.path.split("?", 1)[0])
+            value_file = values_dir / f"{match.group(1)}.json" if match else None
+            if value_file is None or not value_file.is_file():
+                self.send_error(404)
+                return
+            body = value_file.read_bytes()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return KVHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve KV values from a directory of <key>.json files.")
+    parser.add_argument("values_dir", type=Path)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before each response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.values_dir, args.delay, args.fail_rate))
+    print(f"Serving {args.values_dir} on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
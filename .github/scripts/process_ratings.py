@@ -1,106 +1,271 @@
 import os
 import json
+import argparse
+import random
+import time
 import requests
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date as Date, datetime, timedelta
 from collections import defaultdict
+from pathlib import Path
 import sys
 
-def get_cloudflare_ratings():
-    """Fetch ratings from Cloudflare KV"""
-    api_token = os.environ['CF_API_TOKEN']
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT_DIR / "site_tools"))
+
+from blend_corpus import read_blend_file as read_blend_record
+from blend_ratings import profile_counts
+from rating_log import log_dir_for, record
+
+BLEND_DATA_DIR = ROOT_DIR / "blend_data"
+
+# Point CF_API_BASE at a local stand-in (see kv_standin.py) to run a batch without Cloudflare
+CF_API_BASE = "https://api.cloudflare.com/client/v4"
+
+# Days fetched at once by a backfill, and how hard each fetch is retried
+KV_WORKERS = 4
+KV_RETRIES = 5
+KV_BACKOFF = 1.0  # seconds before the first retry, doubled for each one after
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Days a backfill has applied, so an interrupted one resumes where it stopped
+CHECKPOINT_FILE = ROOT_DIR / "site_tools_output" / "ratings_backfill.json"
+
+def kv_session(workers=1):
+    """A requests session for the KV API, pooling up to `workers` connections"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'Authorization': f"Bearer {os.environ['CF_API_TOKEN']}",
+        'Content-Type': 'application/json'
+    })
+    return session
+
+def kv_value_url(key):
     account_id = os.environ['CF_ACCOUNT_ID']
     namespace_id = os.environ['CF_KV_NAMESPACE_ID']
-    
-    # Get yesterday's date
-    yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-    key = f'ratings_{yesterday}'
-    
-    headers = {
-        'Authorization': f'Bearer {api_token}',
-        'Content-Type': 'application/json'
-    }
-    
-    url = f'https://api.cloudflare.com/client/v4/accounts/{account_id}/storage/kv/namespaces/{namespace_id}/values/{key}'
-    
-    response = requests.get(url, headers=headers)
-    if response.status_code == 404:
-        return []  # No ratings for yesterday
-    
-    response.raise_for_status()
-    return response.json()
-
-def update_blend_ratings(blend_data, new_rating):
-    """Update blend ratings with a new rating submission"""
-    
-    # Update overall rating statistics
-    blend_data['totalReviews'] += 1
-    
-    # Convert rating to star category
-    rating_value = float(new_rating['rating'])
-    if rating_value % 1 == 0:
-        star_category = f"{int(rating_value)}_star"
-    else:
-        if rating_value < 1:
-            star_category = "half_star"
+    api_base = os.environ.get('CF_API_BASE', CF_API_BASE).rstrip('/')
+    return f'{api_base}/accounts/{account_id}/storage/kv/namespaces/{namespace_id}/values/{key}'
+
+def get_cloudflare_ratings(date=None, session=None, retries=KV_RETRIES, backoff=KV_BACKOFF):
+    """Fetch a day's ratings (default: yesterday) from Cloudflare KV, retrying transient failures"""
+    if date is None:
+        date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    key = f'ratings_{date}'
+    url = kv_value_url(key)
+    session = session or kv_session()
+
+    for attempt in range(retries + 1):
+        retry_after = None
+        try:
+            response = session.get(url, timeout=30)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
         else:
-            star_category = f"{int(rating_value)}half_star"
-    
-    blend_data['ratingDistribution'][star_category] += 1
-    
-    # Recalculate average rating
-    total_stars = sum(
-        float(k.replace('half_star', '.5').replace('_star', '')) * v 
-        for k, v in blend_data['ratingDistribution'].items()
-    )
-    blend_data['averageRating'] = round(total_stars / blend_data['totalReviews'], 2)
-    
-    # Update profile ratings
-    for profile_type, rating_value in new_rating['profiles'].items():
-        profile_data = blend_data['ratings'][profile_type]
-        distribution = profile_data['distribution']
-        
-        # Count current ratings
-        total_per_level = defaultdict(int)
-        for level, normalized_value in distribution.items():
-            # De-normalize the value to get original count
-            max_value = max(distribution.values())
-            if max_value > 0:
-                count = int(round((normalized_value * 100 / max_value)))
-                total_per_level[level] = count
-        
-        # Add new rating
-        total_per_level[rating_value] += 1
-        
-        # Re-normalize all values
-        max_count = max(total_per_level.values())
-        for level in distribution:
-            if max_count > 0:
-                normalized_value = (total_per_level[level] / max_count) * 100
-                distribution[level] = round(normalized_value, 10)
-        
-        # Update the most common level
-        profile_data['level'] = max(total_per_level.items(), key=lambda x: (x[1], x[0]))[0]
-
-    return blend_data
+            if response.status_code == 404:
+                return []  # No ratings for that day
+            if response.status_code not in RETRY_STATUS:
+                response.raise_for_status()
+                return response.json()
+            error = requests.HTTPError(f"{response.status_code} fetching {key}", response=response)
+            retry_after = response.headers.get('Retry-After')
+        if attempt == retries:
+            raise error
+        # Exponential backoff with jitter, so parallel fetches don't retry in lockstep
+        delay = backoff * 2 ** attempt + random.uniform(0, backoff)
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        print(f"Retrying {key} in {delay:.1f}s: {error}", file=sys.stderr)
+        time.sleep(delay)
+
+def date_range(since, until):
+    """Every YYYY-MM-DD from since to until, inclusive"""
+    start, end = Date.fromisoformat(since), Date.fromisoformat(until)
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+def load_checkpoint(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return set(json.load(f)['done'])
+    except (OSError, ValueError, KeyError):
+        return set()
+
+def save_checkpoint(path, done):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'done': sorted(done)}, f, indent=2)
+    os.replace(tmp_path, path)
+
+def load_ratings_file(path):
+    """Read ratings from a JSONL file (one rating per line) or a JSON list"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def rating_error(blend_data, rating):
+    """Return why a rating can't be applied to this blend, or None if it can"""
+    try:
+        rating_value = float(rating['rating'])
+    except (KeyError, TypeError, ValueError):
+        return "missing or non-numeric rating"
+    if rating_value < 0.5 or rating_value > 4 or (rating_value * 2) % 1 != 0:
+        return f"rating {rating_value} is not 0.5-4 in half-star steps"
+    profiles = rating.get('profiles')
+    if not isinstance(profiles, dict):
+        return "missing profiles"
+    for profile_type, level in profiles.items():
+        profile_data = blend_data['ratings'].get(profile_type)
+        if profile_data is None:
+            return f"unknown profile '{profile_type}'"
+        if level not in profile_counts(profile_data):
+            return f"unknown {profile_type} level '{level}'"
+    return None
+
+def group_ratings(ratings):
+    """Group ratings by blendId, keeping submission order within each blend"""
+    grouped = defaultdict(list)
+    for rating in ratings:
+        grouped[rating.get('blendId')].append(rating)
+    return grouped
+
+def read_blend_file(blend_file):
+    # Sparse files come back expanded to the full record
+    record = read_blend_record(blend_file)
+    return {record.key: record.data}, record.key
+
+def process_batch(ratings, blend_dir=BLEND_DATA_DIR, log_dir=None):
+    """Log the valid ones of a batch of ratings and apply the log to blend_dir.
+
+    Each touched blend file is read once to check its ratings against, and rewritten once
+    from the rating log (see site_tools/rating_log.py). Returns (written files, rejected
+    ratings as (rating, reason) pairs).
+    """
+    log_dir = log_dir or log_dir_for(blend_dir)
+    accepted = []
+    rejected = []
+    for blend_id, blend_ratings in sorted(group_ratings(ratings).items(), key=lambda item: str(item[0])):
+        blend_file = Path(blend_dir) / f"{blend_id}.json"
+        if not blend_id or not blend_file.is_file():
+            rejected.extend((rating, "unknown blendId") for rating in blend_ratings)
+            continue
+
+        blend_json, blend_key = read_blend_file(blend_file)
+        blend_data = blend_json[blend_key]
+        for rating in blend_ratings:
+            error = rating_error(blend_data, rating)
+            if error:
+                rejected.append((rating, error))
+            else:
+                accepted.append(rating)
+
+    if not accepted:
+        return [], rejected
+    return record(accepted, blend_dir, log_dir), rejected
+
+def backfill(dates, blend_dir=BLEND_DATA_DIR, checkpoint=CHECKPOINT_FILE, workers=KV_WORKERS):
+    """Fetch many days' ratings concurrently and apply each day as soon as it and the days
+    before it are in, checkpointing it straight after.
+
+    Yields (date, ratings, written files, rejected ratings) per day; days the checkpoint
+    already lists are skipped.
+    """
+    done = load_checkpoint(checkpoint) if checkpoint else set()
+    todo = [date for date in dates if date not in done]
+    session = kv_session(workers)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        # map() yields in date order while up to `workers` fetches run ahead
+        days = pool.map(lambda date: get_cloudflare_ratings(date, session), todo)
+        for date, ratings in zip(todo, days):
+            written, rejected = process_batch(ratings, blend_dir)
+            done.add(date)
+            if checkpoint:
+                save_checkpoint(checkpoint, done)
+            yield date, ratings, written, rejected
+    finally:
+        # A failed day stops the backfill: drop the fetches not started yet, and wait only
+        # for the ones in flight so the session isn't closed under them
+        pool.shutdown(wait=True, cancel_futures=True)
+        session.close()
+
+def process_single(blend_file, rating_data):
+    """Apply one rating (the repository_dispatch path)"""
+    blend_file = Path(blend_file)
+    rating = dict(rating_data, blendId=blend_file.stem)
+    _, rejected = process_batch([rating], blend_file.parent)
+    for _, reason in rejected:
+        print(f"Skipped rating for {blend_file.stem!r}: {reason}", file=sys.stderr)
+
+def write_changed_list(path, written):
+    if path:
+        with open(path, 'w', encoding='utf-8') as f:
+            for blend_file in written:
+                f.write(f"{os.path.relpath(blend_file)}\n")
 
 def main():
-    blend_file = sys.argv[1]
-    rating_data = json.loads(sys.argv[2])
-    
-    with open(blend_file, 'r') as f:
-        blend_json = json.load(f)
-    
-    # Get blend key (first key in the JSON)
-    blend_key = next(iter(blend_json))
-    blend_data = blend_json[blend_key]
-    
-    # Update the ratings
-    updated_blend = update_blend_ratings(blend_data, rating_data)
-    blend_json[blend_key] = updated_blend
-    
-    # Write back to file
-    with open(blend_file, 'w') as f:
-        json.dump(blend_json, f, indent=4)
+    parser = argparse.ArgumentParser(
+        description="Apply ratings to blend_data/. Either one rating (BLEND_FILE RATING_JSON) "
+                    "or a batch from Cloudflare KV (--kv) or a JSONL file (--from-file).")
+    parser.add_argument("blend_file", nargs="?", help="blend file for a single rating")
+    parser.add_argument("rating", nargs="?", help="rating payload as JSON for a single rating")
+    parser.add_argument("--kv", action="store_true", help="batch: fetch a day's ratings from Cloudflare KV")
+    parser.add_argument("--date", help="day to fetch with --kv as YYYY-MM-DD (default: yesterday)")
+    parser.add_argument("--since", metavar="DATE",
+                        help="backfill: fetch every day from DATE to --until with --kv, several at once")
+    parser.add_argument("--until", metavar="DATE", help="last day of a backfill (default: yesterday)")
+    parser.add_argument("--workers", type=int, default=KV_WORKERS, help="days fetched in parallel by a backfill")
+    parser.add_argument("--checkpoint", type=Path, default=CHECKPOINT_FILE,
+                        help="file recording the days a backfill has applied, so a rerun resumes")
+    parser.add_argument("--from-file", type=Path, metavar="FILE", help="batch: read ratings from a JSONL/JSON file")
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    parser.add_argument("--changed-list", type=Path, metavar="FILE",
+                        help="write the updated blend files here, one per line (for build_site_data.py)")
+    args = parser.parse_args()
+
+    if not (args.kv or args.from_file):
+        if not (args.blend_file and args.rating):
+            parser.error("give BLEND_FILE RATING_JSON, --kv or --from-file")
+        process_single(args.blend_file, json.loads(args.rating))
+        return
+
+    if args.since:
+        if not args.kv:
+            parser.error("--since needs --kv")
+        until = args.until or (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        written = []
+        try:
+            for date, ratings, day_written, rejected in backfill(date_range(args.since, until), args.blend_dir,
+                                                                 args.checkpoint, args.workers):
+                for rating, reason in rejected:
+                    print(f"Skipped rating for {rating.get('blendId')!r}: {reason}", file=sys.stderr)
+                print(f"{date}: applied {len(ratings) - len(rejected)} of {len(ratings)} ratings "
+                      f"to {len(day_written)} blends")
+                written.extend(f for f in day_written if f not in written)
+        except requests.RequestException as e:
+            # Days applied so far are checkpointed; rerunning the same command resumes
+            print(f"Error: backfill stopped: {e}", file=sys.stderr)
+            exit_code = 1
+        else:
+            exit_code = 0
+        write_changed_list(args.changed_list, written)
+        sys.exit(exit_code)
+
+    if args.kv:
+        ratings = get_cloudflare_ratings(args.date)
+    else:
+        ratings = load_ratings_file(args.from_file)
+
+    written, rejected = process_batch(ratings, args.blend_dir)
+    for rating, reason in rejected:
+        print(f"Skipped rating for {rating.get('blendId')!r}: {reason}", file=sys.stderr)
+    print(f"Applied {len(ratings) - len(rejected)} of {len(ratings)} ratings to {len(written)} blends")
+    write_changed_list(args.changed_list, written)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,423 @@
+"""
+Rating ingestion service: accepts rating POSTs, queues them durably and applies them to
+blend_data/ in coalesced batches instead of one workflow run per rating.
+
+A POST carries the same payload the ratings worker receives and is checked by the same
+rule (blendId, rating and profiles must be present). Accepted ratings are appended to a
+journal in the queue directory and fsync'd before the reply, so a crash loses nothing
+that was acknowledged. When --max-batch ratings are waiting, or --flush-interval seconds
+after the first one arrived, the journal is sealed into a segment and applied with
+process_ratings.process_batch(), which checks each touched blend file once, logs the
+segment's accepted ratings in one go and rewrites each blend once however many ratings it
+got. The segment is then marked done as a whole, so a restart after that point only sends
+its dispatch; a crash between the log write and the mark is the one window that applies
+a segment twice. Ratings the blend file can't take (unknown blend, profile or level) go
+to rejected.jsonl.
+
+Each applied segment becomes one "ratings_flushed" dispatch carrying the changed blends
+and the ratings that were applied to them, so the repository can apply the same ratings:
+.github/workflows/process-ratings-flushed.yml feeds client_payload.ratings to
+process_ratings.py --from-file, rebuilds the site data and commits. The dispatch is saved
+next to the segment before the segment is deleted and removed only once it was sent, so a
+crash or a failed send retries it on the next flush instead of losing those ratings. By
+default dispatches go to a stub that appends them to dispatches.jsonl, so the whole loop
+runs locally; --github-repo (with GITHUB_TOKEN set) sends them as repository_dispatch
+events instead.
+
+    python .github/scripts/rating_ingest.py --port 8788 --flush-interval 10
+    curl -X POST localhost:8788 -d '{"blendId": "Peterson - Irish Flake", "rating": 3.5,
+         "profiles": {"strength": "Medium", "taste": "Full"}}'
+    curl -X POST localhost:8788/flush      # apply what is queued now
+"""
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+from process_ratings import BLEND_DATA_DIR, ROOT_DIR, process_batch
+
+QUEUE_DIR = ROOT_DIR / "site_tools_output" / "rating_queue"
+JOURNAL_FILE = "pending.jsonl"
+REJECTED_FILE = "rejected.jsonl"
+DISPATCH_LOG = "dispatches.jsonl"
+
+MAX_BATCH = 100
+FLUSH_INTERVAL = 60.0
+MAX_BODY = 64 * 1024
+
+GITHUB_API = "https://api.github.com"
+DISPATCH_EVENT = "ratings_flushed"
+
+# As sent by workers/ratings/worker.js
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "https://tabac.wiki",
+    "Access-Control-Allow-Methods": "POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type",
+    "Access-Control-Max-Age": "86400",
+}
+
+REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def validation_error(rating: Any) -> Optional[str]:
+    """The worker's check on a payload, or None if it passes."""
+    if not isinstance(rating, dict) or not rating.get("blendId") or not rating.get("rating") \
+            or not rating.get("profiles"):
+        return "Invalid rating data"
+    # The worker hands blendId to a workflow that only ever opens blend_data/<blendId>.json;
+    # here it is a path straight away, so it has to be a bare file stem
+    blend_id = rating["blendId"]
+    if not isinstance(blend_id, str) or "/" in blend_id or "\\" in blend_id or blend_id.startswith("."):
+        return "Invalid rating data"
+    return None
+
+
+def append_line(path: Path, item: Dict[str, Any]) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_lines(path: Path) -> List[Dict[str, Any]]:
+    """JSONL entries of a file; a torn last line (from a crash mid-append) is dropped."""
+    items = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    items.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+    except FileNotFoundError:
+        pass
+    return items
+
+
+class RatingQueue:
+    """
+    Durable queue in a directory: new ratings are appended to the journal; a flush seals
+    the journal into segment-<n>.jsonl, applies it (noting its changed blends and applied
+    ratings in segment-<n>.done), saves its dispatch as
+    segment-<n>.dispatch and then deletes the segment; the dispatch goes once it is sent.
+    """
+
+    def __init__(self, queue_dir: Path = QUEUE_DIR):
+        self.dir = Path(queue_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.journal_path = self.dir / JOURNAL_FILE
+        self.lock = threading.Lock()
+
+    def append(self, rating: Dict[str, Any]) -> None:
+        with self.lock:
+            append_line(self.journal_path, rating)
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Ratings in the journal, not yet sealed into a segment."""
+        with self.lock:
+            return read_lines(self.journal_path)
+
+    def seal(self) -> Optional[Path]:
+        """Turn the journal into the next segment; None when nothing is queued."""
+        with self.lock:
+            if not self.journal_path.exists() or self.journal_path.stat().st_size == 0:
+                return None
+            segment = self.dir / f"segment-{time.time_ns()}.jsonl"
+            os.replace(self.journal_path, segment)
+            self._sync_dir()
+            return segment
+
+    def segments(self) -> List[Path]:
+        """Sealed segments still to apply, oldest first."""
+        return sorted(self.dir.glob("segment-*.jsonl"))
+
+    def done(self, segment: Path) -> Optional[Dict[str, Any]]:
+        """The done entry of a segment already applied, or None."""
+        entries = read_lines(segment.with_suffix(".done"))
+        return entries[0] if entries else None
+
+    def mark_done(self, segment: Path, entry: Dict[str, Any]) -> None:
+        """Note a segment as applied: {"blends": changed blendIds, "ratings": applied, "rejected": count}."""
+        append_line(segment.with_suffix(".done"), entry)
+
+    def finish(self, segment: Path, dispatch: Optional[Dict[str, Any]]) -> None:
+        """Replace an applied segment by the dispatch still to send for it (if any)."""
+        if dispatch is not None:
+            tmp_path = segment.with_suffix(".dispatch.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(dispatch, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, segment.with_suffix(".dispatch"))
+            self._sync_dir()
+        segment.unlink()
+        segment.with_suffix(".done").unlink(missing_ok=True)
+        self._sync_dir()
+
+    def dispatches(self) -> List[Path]:
+        """Saved dispatches not sent yet, oldest first."""
+        return sorted(self.dir.glob("segment-*.dispatch"))
+
+    def sent(self, dispatch: Path) -> None:
+        dispatch.unlink()
+        self._sync_dir()
+
+    def _sync_dir(self) -> None:
+        # Make renames and deletions durable too (not possible on Windows)
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(self.dir, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+
+class StubDispatcher:
+    """Stands in for GitHub: records each dispatch in a JSONL file instead of sending it."""
+
+    def __init__(self, log_path: Path):
+        self.log_path = Path(log_path)
+
+    def dispatch(self, event_type: str, payload: Dict[str, Any]) -> None:
+        append_line(self.log_path, {"event_type": event_type, "client_payload": payload,
+                                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())})
+
+
+class GitHubDispatcher:
+    """Sends a repository_dispatch, as the worker does, but once per flush."""
+
+    def __init__(self, repo: str, token: str):
+        self.url = f"{GITHUB_API}/repos/{repo}/dispatches"
+        self.token = token
+
+    def dispatch(self, event_type: str, payload: Dict[str, Any]) -> None:
+        import requests
+        response = requests.post(self.url, timeout=30, json={"event_type": event_type, "client_payload": payload},
+                                 headers={"Authorization": f"Bearer {self.token}",
+                                          "Accept": "application/vnd.github.v3+json",
+                                          "User-Agent": "TabacWiki-Rating-Ingest"})
+        response.raise_for_status()
+
+
+def apply_segment(queue: RatingQueue, segment: Path, blend_dir: Path) -> Tuple[List[str], int, int]:
+    """Apply one sealed segment; returns (changed blendIds, ratings applied, ratings rejected)."""
+    done = queue.done(segment)
+    if done is None:
+        ratings = read_lines(segment)
+        written, rejected = process_batch(ratings, blend_dir)
+        for rating, reason in rejected:
+            append_line(queue.dir / REJECTED_FILE, {"rating": rating, "reason": reason})
+        written_ids = {Path(path).stem for path in written}
+        applied = [rating for rating in ratings if rating.get("blendId") in written_ids
+                   and not any(rating is r for r, _ in rejected)]
+        changed = sorted({rating["blendId"] for rating in applied})
+        # Marked once the blend files are in place; a restart from here on only finishes the
+        # segment, with the same dispatch
+        done = {"blends": changed, "ratings": applied, "rejected": len(rejected)}
+        queue.mark_done(segment, done)
+    dispatch = {"blends": done["blends"], "ratings": done["ratings"]} if done["blends"] else None
+    queue.finish(segment, dispatch)
+    return done["blends"], len(done["ratings"]), done["rejected"]
+
+
+class IngestService:
+    def __init__(self, queue: RatingQueue, blend_dir: Path, dispatcher, max_batch: int = MAX_BATCH,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.queue = queue
+        self.blend_dir = Path(blend_dir)
+        self.dispatcher = dispatcher
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        # Counts only; the ratings themselves live in the journal until a flush reads them
+        self.pending: Dict[str, int] = {}
+        self.pending_total = 0
+        self.oldest: Optional[float] = None
+        self.flush_lock = asyncio.Lock()
+        self.wake = asyncio.Event()
+
+    def recover(self) -> None:
+        """Pick up ratings left in the journal by a previous run."""
+        for rating in self.queue.pending():
+            self._count(rating)
+
+    def _count(self, rating: Dict[str, Any]) -> None:
+        self.pending[rating["blendId"]] = self.pending.get(rating["blendId"], 0) + 1
+        self.pending_total += 1
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+            # Let the flusher start the clock on this batch
+            self.wake.set()
+        if self.pending_total >= self.max_batch:
+            self.wake.set()
+
+    async def submit(self, rating: Dict[str, Any]) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.queue.append, rating)
+        self._count(rating)
+
+    async def flush(self) -> Dict[str, Any]:
+        """Seal what is queued and apply every sealed segment (including ones a crash left)."""
+        loop = asyncio.get_running_loop()
+        async with self.flush_lock:
+            # Sealed on the loop itself, so no rating is counted between the seal and the reset
+            # and then lost from the counts (one counted just before only over-counts)
+            self.queue.seal()
+            self.pending, self.pending_total, self.oldest = {}, 0, None
+            self.wake.clear()
+
+            changed, applied, rejected = set(), 0, 0
+            for segment in self.queue.segments():
+                result = await loop.run_in_executor(None, apply_segment, self.queue, segment, self.blend_dir)
+                changed.update(result[0])
+                applied += result[1]
+                rejected += result[2]
+            summary = {"blends": sorted(changed), "applied": applied, "rejected": rejected}
+            if applied or rejected:
+                print(f"Applied {applied} ratings to {len(changed)} blends ({rejected} rejected)")
+            for dispatch in self.queue.dispatches():
+                with open(dispatch, "r", encoding="utf-8") as f:
+                    payload = json.load(f)
+                try:
+                    await loop.run_in_executor(None, self.dispatcher.dispatch, DISPATCH_EVENT, payload)
+                except Exception as e:
+                    # The blend files here are already written; the dispatch stays saved and
+                    # is sent again, ahead of newer ones, by the next flush
+                    print(f"Dispatch failed for {len(payload['blends'])} blends: {e}", file=sys.stderr)
+                    break
+                self.queue.sent(dispatch)
+            return summary
+
+    async def flusher(self) -> None:
+        """Flush when max_batch ratings are waiting or the oldest has waited flush_interval."""
+        while True:
+            timeout = None
+            if self.oldest is not None:
+                timeout = max(0.0, self.oldest + self.flush_interval - time.monotonic())
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            due = self.pending_total >= self.max_batch or (
+                self.oldest is not None and time.monotonic() - self.oldest >= self.flush_interval)
+            if not due:
+                continue
+            try:
+                await self.flush()
+            except Exception as e:
+                # The segment stays on disk; try again after another interval
+                print(f"Flush failed: {e}", file=sys.stderr)
+                self.oldest = time.monotonic()
+
+    async def respond(self, method: str, path: str, body: bytes) -> Tuple[int, Optional[Dict[str, Any]]]:
+        if method == "OPTIONS":
+            return 204, None
+        if method == "GET":
+            return 200, {"status": "Rating ingest is running", "pending": self.pending_total,
+                         "blends": len(self.pending), "segments": len(self.queue.segments())}
+        if method != "POST":
+            return 405, {"error": "Method not allowed"}
+        if path == "/flush":
+            return 200, await self.flush()
+        try:
+            rating = json.loads(body)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            return 400, {"error": "Invalid JSON data", "details": str(e)}
+        error = validation_error(rating)
+        if error:
+            return 400, {"error": error}
+        await self.submit(rating)
+        return 200, {"success": True, "pending": self.pending_total}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 15)
+            request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+            headers = {}
+            for line in header_lines:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            method, target, _ = request_line.split(" ", 2)
+            length = int(headers.get("content-length") or 0)
+            if length > MAX_BODY:
+                status, payload = 413, {"error": "Payload too large"}
+            else:
+                body = await reader.readexactly(length) if length else b""
+                try:
+                    status, payload = await self.respond(method, target.split("?", 1)[0], body)
+                except Exception as e:
+                    print(f"Error handling {request_line}: {e}", file=sys.stderr)
+                    status, payload = 500, {"error": "Failed to process rating", "details": str(e)}
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+            status, payload = 400, {"error": "Bad request"}
+        except ConnectionError:
+            writer.close()
+            return
+
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        response_headers = dict(CORS_HEADERS, **{"Content-Length": str(len(body)), "Connection": "close"})
+        if payload is not None:
+            response_headers["Content-Type"] = "application/json"
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+        lines += [f"{name}: {value}" for name, value in response_headers.items()]
+        try:
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(service: IngestService, host: str, port: int, origin: str) -> None:
+    CORS_HEADERS["Access-Control-Allow-Origin"] = origin
+    service.recover()
+    if service.queue.segments() or service.queue.dispatches():
+        # Finish whatever a previous run was in the middle of applying or sending
+        await service.flush()
+    listener = await asyncio.start_server(service.handle, host, port)
+    print(f"Accepting ratings on http://{host}:{port} (flush at {service.max_batch} ratings "
+          f"or after {service.flush_interval:g}s, {service.pending_total} queued)")
+    async with listener:
+        await asyncio.gather(listener.serve_forever(), service.flusher())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue rating POSTs and apply them to blend_data/ in batches.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    parser.add_argument("--queue-dir", type=Path, default=QUEUE_DIR)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="flush once this many ratings are queued")
+    parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL,
+                        help="flush this many seconds after the first queued rating")
+    parser.add_argument("--origin", default=CORS_HEADERS["Access-Control-Allow-Origin"],
+                        help="Access-Control-Allow-Origin to send")
+    parser.add_argument("--github-repo", metavar="OWNER/REPO",
+                        help="send flush dispatches to this repository (needs GITHUB_TOKEN); default: stub")
+    args = parser.parse_args()
+
+    if args.github_repo:
+        token = os.environ.get("GITHUB_TOKEN")
+        if not token:
+            print("Error: --github-repo needs GITHUB_TOKEN", file=sys.stderr)
+            sys.exit(1)
+        dispatcher = GitHubDispatcher(args.github_repo, token)
+    else:
+        dispatcher = StubDispatcher(args.queue_dir / DISPATCH_LOG)
+
+    queue = RatingQueue(args.queue_dir)
+    service = IngestService(queue, args.blend_dir, dispatcher, args.max_batch, args.flush_interval)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.origin))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+// Thumbnail atlas lookup
+//
+// scripts/build_atlases.py packs every blend picture into a few sprite sheets
+// (/assets/data/shards/atlas-NN.jpg) and writes atlas_map.json with each blend file's
+// [sheet, tile index]. Cards show their thumbnail as a background-position into a sheet,
+// so a whole listing needs one request per sheet instead of one per picture.
+
+const SHARD_DIR = '/assets/data/shards';
+
+let atlasMapPromise = null;
+
+export function loadAtlasMap() {
+    if (!atlasMapPromise) {
+        atlasMapPromise = fetch(`${SHARD_DIR}/atlas_map.json`, { cache: 'no-cache' })
+            .then(response => (response.ok ? response.json() : null))
+            .catch(() => null);
+    }
+    return atlasMapPromise;
+}
+
+// Inline style for a `size`-pixel square showing the blend's thumbnail, or null if it has none
+export function thumbnailStyle(atlasMap, filename, size = 64) {
+    const tile = atlasMap && atlasMap.tiles[filename];
+    if (!tile) return null;
+    const [sheetIndex, index] = tile;
+    const sheet = atlasMap.sheets[sheetIndex];
+    const scale = size / atlasMap.tile;
+    const x = (index % atlasMap.columns) * size;
+    const y = Math.floor(index / atlasMap.columns) * size;
+    return `background-image:url('${SHARD_DIR}/${sheet.file}?v=${sheet.v}');`
+        + `background-size:${sheet.width * scale}px ${sheet.height * scale}px;`
+        + `background-position:-${x}px -${y}px;width:${size}px;height:${size}px;`;
+}
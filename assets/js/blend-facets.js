@@ -0,0 +1,161 @@
+// Facet filter bitmap index reader
+//
+// Reads /assets/data/shards/facet_index.bin, written by scripts/build_site_data.py (see
+// site_tools/blend_facets.py for the layout). Each facet value is a compressed bitmap over
+// blend ordinals (positions in the head shard); the listing's dropdown and checkbox filters
+// become ORs and ANDs of those bitmaps and the counts next to each option are popcounts.
+
+const ARRAY = 0;
+const BITSET = 1;
+
+function popcount32(x) {
+    x -= (x >>> 1) & 0x55555555;
+    x = (x & 0x33333333) + ((x >>> 2) & 0x33333333);
+    x = (x + (x >>> 4)) & 0x0f0f0f0f;
+    return Math.imul(x, 0x01010101) >>> 24;
+}
+
+export function popcount(bits) {
+    let total = 0;
+    for (let i = 0; i < bits.length; i++) total += popcount32(bits[i]);
+    return total;
+}
+
+class FacetIndex {
+    constructor(buffer) {
+        const view = new DataView(buffer);
+        const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+        if (magic !== 'TWFB' || view.getUint32(4, true) !== 1) {
+            throw new Error('Unsupported facet index');
+        }
+        const nDocs = view.getUint32(8, true);
+        const nValues = view.getUint32(12, true);
+        const nContainers = view.getUint32(16, true);
+        const nWords = view.getUint32(20, true);
+        const tableLength = view.getUint32(24, true);
+
+        let pos = 28;
+        this.valueStarts = new Uint32Array(buffer, pos, nValues + 1);
+        pos += (nValues + 1) * 4;
+        this.keys = new Uint32Array(buffer, pos, nContainers);
+        pos += nContainers * 4;
+        this.offsets = new Uint32Array(buffer, pos, nContainers + 1);
+        pos += (nContainers + 1) * 4;
+        this.payload = new Uint16Array(buffer, pos, nWords);
+        pos += nWords * 2 + ((4 - (nWords * 2) % 4) % 4);
+        const table = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, pos, tableLength)));
+
+        this.size = nDocs;
+        this.words = Math.ceil(nDocs / 32);
+        this.facets = new Map();
+        let base = 0;
+        for (const facet of table.facets) {
+            this.facets.set(facet.name, { ...facet, base, lower: facet.values.map(value => value.toLowerCase()) });
+            base += facet.values.length;
+        }
+        this.optionCache = new Map();
+    }
+
+    empty() {
+        return new Uint32Array(this.words);
+    }
+
+    all() {
+        const bits = new Uint32Array(this.words).fill(0xffffffff);
+        if (this.size % 32) bits[this.words - 1] = (1 << (this.size % 32)) - 1;
+        return bits;
+    }
+
+    // ORs one stored value's containers into `bits`
+    orValue(bits, valueIndex) {
+        for (let i = this.valueStarts[valueIndex]; i < this.valueStarts[valueIndex + 1]; i++) {
+            const base = (this.keys[i] >>> 2) << 16;
+            const kind = this.keys[i] & 3;
+            const start = this.offsets[i];
+            const end = this.offsets[i + 1];
+            if (kind === ARRAY) {
+                for (let j = start; j < end; j++) {
+                    const ordinal = base + this.payload[j];
+                    bits[ordinal >>> 5] |= 1 << (ordinal & 31);
+                }
+            } else if (kind === BITSET) {
+                for (let j = start; j < end; j++) {
+                    const w = j - start;
+                    bits[(base >>> 5) + (w >>> 1)] |= this.payload[j] << ((w & 1) * 16);
+                }
+            } else {
+                for (let j = start; j < end; j += 2) {
+                    const first = base + this.payload[j];
+                    const last = first + this.payload[j + 1];
+                    for (let ordinal = first; ordinal <= last; ordinal++) {
+                        bits[ordinal >>> 5] |= 1 << (ordinal & 31);
+                    }
+                }
+            }
+        }
+    }
+
+    // Blends a chosen option lets through, matched the way applyFiltersToResults() compares
+    // values: case-insensitively, by equality or substring per facet. Cached; don't mutate.
+    optionBits(facetName, option) {
+        const wanted = option.toLowerCase();
+        const key = `${facetName}\u0000${wanted}`;
+        let bits = this.optionCache.get(key);
+        if (bits) return bits;
+        const facet = this.facets.get(facetName);
+        bits = this.empty();
+        facet.lower.forEach((value, i) => {
+            if (facet.match === 'contains' ? value.includes(wanted) : value === wanted) {
+                this.orValue(bits, facet.base + i);
+            }
+        });
+        this.optionCache.set(key, bits);
+        return bits;
+    }
+
+    // Bitmap of the given ordinals, e.g. the blends left by filters the index doesn't cover
+    fromOrdinals(ordinals) {
+        const bits = this.empty();
+        for (const ordinal of ordinals) bits[ordinal >>> 5] |= 1 << (ordinal & 31);
+        return bits;
+    }
+
+    // Blends passing every [facet, option] term, optionally within another bitmap
+    query(terms, within = null) {
+        const bits = within ? within.slice() : this.all();
+        for (const [facet, option] of terms) {
+            const other = this.optionBits(facet, option);
+            for (let i = 0; i < bits.length; i++) bits[i] &= other[i];
+        }
+        return bits;
+    }
+
+    has(bits, ordinal) {
+        return (bits[ordinal >>> 5] & (1 << (ordinal & 31))) !== 0;
+    }
+
+    // How many blends each option would leave on top of `terms`. For single-choice facets
+    // (exclusive) the facet's own term is dropped, so options are counted against the rest.
+    optionCounts(facet, options, terms, within = null, exclusive = true) {
+        const base = this.query(exclusive ? terms.filter(([name]) => name !== facet) : terms, within);
+        const counts = new Map();
+        for (const option of options) {
+            const bits = this.optionBits(facet, option);
+            let total = 0;
+            for (let i = 0; i < base.length; i++) total += popcount32(base[i] & bits[i]);
+            counts.set(option, total);
+        }
+        return counts;
+    }
+}
+
+export async function loadFacetIndex(version = '') {
+    try {
+        const response = await fetch(`/assets/data/shards/facet_index.bin${version ? `?v=${version}` : ''}`);
+        if (!response.ok) return null;
+        return new FacetIndex(await response.arrayBuffer());
+    } catch (error) {
+        console.warn('Facet index unavailable, falling back to per-blend filters:', error);
+        return null;
+    }
+}
@@ -0,0 +1,105 @@
+// Trigram search index reader
+//
+// Reads /assets/data/shards/search_index.bin, written by scripts/build_site_data.py (see
+// site_tools/blend_search.py for the layout), and narrows a free-text query down to the
+// blends that can possibly contain it, so the listing only runs its substring checks on those.
+
+const ALPHABET = ' 0123456789abcdefghijklmnopqrstuvwxyz';
+const CODE = new Map([...ALPHABET].map((ch, i) => [ch, i]));
+
+export const FIELD_BITS = {
+    name: 1, blender: 2, blendedBy: 4, manufacturedBy: 8, flavoring: 16, blendType: 32, contents: 64
+};
+
+// Mirrors normalize() in site_tools/blend_search.py for ASCII input
+function normalize(text) {
+    return text.toLowerCase()
+        .replace(/[^a-z0-9]+/g, ' ')
+        .trim();
+}
+
+function trigramCodes(normalized) {
+    const codes = new Set();
+    for (let i = 0; i + 2 < normalized.length; i++) {
+        codes.add(CODE.get(normalized[i]) * 1369 + CODE.get(normalized[i + 1]) * 37 + CODE.get(normalized[i + 2]));
+    }
+    return [...codes];
+}
+
+class SearchIndex {
+    constructor(buffer) {
+        const view = new DataView(buffer);
+        const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+        if (magic !== 'TWSI' || view.getUint32(4, true) !== 1) {
+            throw new Error('Unsupported search index');
+        }
+        const nDocs = view.getUint32(8, true);
+        const nGrams = view.getUint32(12, true);
+        const nPostings = view.getUint32(16, true);
+        const tableLength = view.getUint32(20, true);
+
+        let pos = 24;
+        this.grams = new Uint16Array(buffer, pos, nGrams);
+        pos += nGrams * 2 + ((4 - (nGrams * 2) % 4) % 4);
+        this.offsets = new Uint32Array(buffer, pos, nGrams + 1);
+        pos += (nGrams + 1) * 4;
+        this.docIds = new Uint32Array(buffer, pos, nPostings);
+        pos += nPostings * 4;
+        this.masks = new Uint8Array(buffer, pos, nPostings);
+        pos += nPostings + ((4 - nPostings % 4) % 4);
+        const table = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, pos, tableLength)));
+        this.filenames = table.docs.map(doc => doc[0]);
+        this.size = nDocs;
+    }
+
+    postings(code) {
+        let lo = 0;
+        let hi = this.grams.length;
+        while (lo < hi) {
+            const mid = (lo + hi) >>> 1;
+            if (this.grams[mid] < code) lo = mid + 1; else hi = mid;
+        }
+        if (lo === this.grams.length || this.grams[lo] !== code) return null;
+        return [this.offsets[lo], this.offsets[lo + 1]];
+    }
+
+    // Filenames of blends whose `fields` contain every trigram of the query, or null when
+    // the index can't narrow it (query too short or non-ASCII) and callers should scan.
+    candidates(query, fields) {
+        if (/[^\x00-\x7f]/.test(query)) return null;
+        const codes = trigramCodes(normalize(query));
+        if (codes.length === 0) return null;
+
+        const ranges = [];
+        for (const code of codes) {
+            const range = this.postings(code);
+            if (!range) return new Set();
+            ranges.push(range);
+        }
+        ranges.sort((a, b) => (a[1] - a[0]) - (b[1] - b[0]));
+
+        let result = null;
+        for (const [start, end] of ranges) {
+            const matched = new Set();
+            for (let i = start; i < end; i++) {
+                if ((this.masks[i] & fields) && (result === null || result.has(this.docIds[i]))) {
+                    matched.add(this.docIds[i]);
+                }
+            }
+            result = matched;
+            if (result.size === 0) break;
+        }
+        return new Set([...result].map(ordinal => this.filenames[ordinal]));
+    }
+}
+
+export async function loadSearchIndex(version = '') {
+    try {
+        const response = await fetch(`/assets/data/shards/search_index.bin${version ? `?v=${version}` : ''}`);
+        if (!response.ok) return null;
+        return new SearchIndex(await response.arrayBuffer());
+    } catch (error) {
+        console.warn('Search index unavailable, falling back to full scans:', error);
+        return null;
+    }
+}
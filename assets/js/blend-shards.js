@@ -0,0 +1,155 @@
+// Sharded blend index loader
+//
+// scripts/build_site_data.py writes /assets/data/shards/: a small head shard with the
+// fields the listing needs, detail shards holding full blend records bucketed by a hash
+// of the filename, and shard_map.json describing both. Everything here falls back to the
+// old blend_index.json / per-file blend_data fetches when the shards are not built.
+
+const SHARD_DIR = '/assets/data/shards';
+
+let shardMapPromise = null;
+const detailShardPromises = new Map();
+
+// 32-bit FNV-1a over UTF-8 bytes; must match fnv1a32() in site_tools/blend_shards.py
+export function shardBucket(filename, buckets) {
+    const bytes = new TextEncoder().encode(filename);
+    let hash = 0x811c9dc5;
+    for (const byte of bytes) {
+        hash ^= byte;
+        hash = Math.imul(hash, 0x01000193) >>> 0;
+    }
+    return hash % buckets;
+}
+
+export function loadShardMap() {
+    if (!shardMapPromise) {
+        shardMapPromise = fetch(`${SHARD_DIR}/shard_map.json`, { cache: 'no-cache' })
+            .then(response => (response.ok ? response.json() : null))
+            .catch(() => null);
+    }
+    return shardMapPromise;
+}
+
+async function fetchShard(entry) {
+    const response = await fetch(`${SHARD_DIR}/${entry.file}?v=${entry.v}`);
+    if (!response.ok) {
+        throw new Error(`Failed to load shard ${entry.file}: ${response.status}`);
+    }
+    return response.json();
+}
+
+// Returns the listing rows as {filename, n, b, ...} objects in blend_index.json's short-key form
+export async function loadHeadEntries() {
+    const shardMap = await loadShardMap();
+    if (shardMap) {
+        try {
+            const head = await fetchShard(shardMap.head);
+            return head.rows.map(row => Object.fromEntries(head.fields.map((field, i) => [field, row[i]])));
+        } catch (error) {
+            console.warn('Falling back to blend_index.json:', error);
+        }
+    }
+
+    const response = await fetch('/assets/data/blend_index.json');
+    if (!response.ok) {
+        throw new Error(`Failed to load blend index: ${response.status}`);
+    }
+    const blendIndex = await response.json();
+    return Object.entries(blendIndex).map(([filename, data]) => ({ filename, ...data }));
+}
+
+// Mirrors derive_profile() in site_tools/blend_ratings.py: blend_data files store raw
+// per-level counts (and maybe a tiebreak level), while the shards carry the derived level
+// and distribution
+function deriveProfile(profile) {
+    if (!profile || !profile.counts) return profile;
+    const levels = Object.keys(profile.counts);
+    const counts = levels.map(level => profile.counts[level]);
+    const top = Math.max(0, ...counts);
+    const total = counts.reduce((sum, count) => sum + count, 0);
+    let level = '0';
+    if (top > 0 && profile.tiebreak !== undefined && profile.counts[profile.tiebreak] === top) {
+        level = profile.tiebreak;
+    } else if (top > 0) {
+        const mean = counts.reduce((sum, count, i) => sum + i * count, 0) / total;
+        let best = -1;
+        counts.forEach((count, i) => {
+            if (count === top && (best === -1 || Math.abs(i - mean) < Math.abs(best - mean))) best = i;
+        });
+        level = levels[best];
+    }
+    const distribution = Object.fromEntries(levels.map((name, i) => [
+        name, top > 0 ? Number((counts[i] * 100 / top).toPrecision(14)) : 0
+    ]));
+    return { level, scale: profile.scale, distribution };
+}
+
+// Mirrors expand_blend() in site_tools/blend_sparse.py: sparse blend_data files omit empty
+// strings, zero counters and zero rating counts, so fill the template back in
+const FIELD_DEFAULTS = {
+    imagePath: '', name: '', blender: '', blendedBy: '', manufacturedBy: '', production: '',
+    country: '', blendType: '', contents: '', cut: '', packaging: '', flavoring: '',
+    description: '', notes: '', reviewCount: 0, totalReviews: 0, averageRating: 0, maxRating: 4
+};
+const STAR_KEYS = ['4_star', '3half_star', '3_star', '2half_star', '2_star', '1half_star', '1_star', 'half_star'];
+const PROFILE_SCALES = {
+    strength: ['Extremely Mild -> Overwhelming', ['Extremely Mild', 'Very Mild', 'Mild', 'Mild to Medium', 'Medium',
+        'Medium to Strong', 'Strong', 'Very Strong', 'Extremely Strong', 'Overwhelming']],
+    flavoring: ['None Detected -> Extra Strong', ['None Detected', 'Extremely Mild', 'Very Mild', 'Mild',
+        'Mild to Medium', 'Medium', 'Medium to Strong', 'Strong', 'Very Strong', 'Extra Strong']],
+    roomNote: ['Unnoticeable -> Overwhelming', ['Unnoticeable', 'Pleasant', 'Very Pleasant', 'Pleasant to Tolerable',
+        'Tolerable', 'Tolerable to Strong', 'Strong', 'Very Strong', 'Extra Strong', 'Overwhelming']],
+    taste: ['Extremely Mild (Flat) -> Overwhelming', ['Extremely Mild (Flat)', 'Very Mild', 'Mild', 'Mild to Medium',
+        'Medium', 'Medium to Full', 'Full', 'Very Full', 'Extra Full', 'Overwhelming']]
+};
+
+function expandBlend(blend) {
+    const dense = { ...FIELD_DEFAULTS, ...blend };
+    dense.ratingDistribution = Object.fromEntries(
+        STAR_KEYS.map(key => [key, (blend.ratingDistribution || {})[key] || 0])
+    );
+    const ratings = blend.ratings || {};
+    dense.ratings = Object.fromEntries(Object.entries(PROFILE_SCALES).map(([type, [scale, levels]]) => {
+        const profile = ratings[type] || {};
+        if (profile.counts || profile.distribution) return [type, profile];
+        const expanded = { scale, counts: Object.fromEntries(levels.map(level => [level, profile[level] || 0])) };
+        if (profile.tiebreak !== undefined) expanded.tiebreak = profile.tiebreak;
+        return [type, expanded];
+    }));
+    return dense;
+}
+
+function publishedBlend(blend) {
+    if (!blend.ratings) return blend;
+    const ratings = Object.fromEntries(
+        Object.entries(blend.ratings).map(([type, profile]) => [type, deriveProfile(profile)])
+    );
+    return { ...blend, ratings };
+}
+
+// Returns the full (unwrapped) blend record for a blend_data filename, or null if missing
+export async function loadBlendRecord(filename) {
+    const shardMap = await loadShardMap();
+    if (shardMap) {
+        const bucket = shardBucket(filename, shardMap.buckets);
+        if (!detailShardPromises.has(bucket)) {
+            detailShardPromises.set(bucket, fetchShard(shardMap.detail[bucket]).catch(error => {
+                detailShardPromises.delete(bucket);
+                console.warn(`Falling back to /blend_data/ for bucket ${bucket}:`, error);
+                return null;
+            }));
+        }
+        const shard = await detailShardPromises.get(bucket);
+        if (shard && shard[filename]) {
+            return shard[filename];
+        }
+    }
+
+    const response = await fetch(`/blend_data/${encodeURIComponent(filename)}`);
+    if (!response.ok) {
+        console.warn(`Failed to load blend file ${filename}:`, response.status);
+        return null;
+    }
+    const blendData = await response.json();
+    return publishedBlend(expandBlend(blendData[Object.keys(blendData)[0]]));
+}
@@ -1,3 +1,5 @@
+import { loadBlendRecord } from '../assets/js/blend-shards.js';
+
 // Standard Rating Scales
 const RATING_SCALES = {
     strength: {
@@ -51,22 +53,9 @@ async function loadBlendData(filename) {
         console.group(`Loading Blend Data: ${filename}`);
         console.time('Blend Data Load Time');
 
-        // Encode the filename to handle special characters
-        const encodedFilename = encodeURIComponent(filename);
-        const response = await fetch(`/blend_data/${encodedFilename}`);
-        
-        // Check if response is successful
-        if (!response.ok) {
-            console.error(`HTTP error! status: ${response.status}, path: /blend_data/${encodedFilename}`);
-            throw new Error(`HTTP error! status: ${response.status}, path: /blend_data/${encodedFilename}`);
-        }
-        
-        const jsonData = await response.json();
-        console.log('Raw JSON Data:', jsonData);
-        
-        // Get the first (and only) key's value
-        const blendKey = Object.keys(jsonData)[0];
-        const originalBlendData = jsonData[blendKey];
+        // One detail shard fetch serves every blend in its bucket
+        const originalBlendData = await loadBlendRecord(filename);
+        console.log('Raw JSON Data:', originalBlendData);
         
         // Validate blendData
         if (!originalBlendData || typeof originalBlendData !== 'object') {
@@ -98,7 +87,8 @@ async function loadBlendData(filename) {
             country: originalBlendData.country || '',
             production: originalBlendData.production || '',
             flavoring: originalBlendData.flavoring || 'None',
-            ratings: originalBlendData.ratings || {}
+            ratings: originalBlendData.ratings || {},
+            similar: originalBlendData.similar || []
         };
 
         console.timeEnd('Blend Data Load Time');
@@ -413,6 +403,13 @@ async function renderBlendPopup(blendKey) {
                                 </div>
                             </div>
                         </div>
+                        ${blend.similar.length ? `
+                        <!-- Similar Blends Section -->
+                        <div class="bg-[#161413]/20 rounded-xl p-6 backdrop-blur-sm w-full">
+                            <h3 class="font-semibold text-[#BDAE9F] text-lg mb-6">Similar Blends</h3>
+                            <div id="similarBlends" class="grid grid-cols-1 sm:grid-cols-2 gap-3"></div>
+                        </div>
+                        ` : ''}
                     </div>
                 </div>
             `;
@@ -476,6 +473,25 @@ async function renderBlendPopup(blendKey) {
             }
         });
 
+        // Similar blends come precomputed in the detail shard; each opens in place of this one
+        const similarContainer = document.getElementById('similarBlends');
+        if (similarContainer) {
+            blend.similar.forEach(([similarFilename, similarName, similarBlender]) => {
+                const item = document.createElement('button');
+                item.type = 'button';
+                item.className = 'bg-[#362C29]/20 hover:bg-[#362C29]/40 rounded-lg px-4 py-3 text-left transition-colors';
+                const blenderLine = document.createElement('div');
+                blenderLine.className = 'text-[#C89F65] text-sm';
+                blenderLine.textContent = similarBlender;
+                const nameLine = document.createElement('div');
+                nameLine.className = 'text-[#BDAE9F] font-medium';
+                nameLine.textContent = similarName;
+                item.append(blenderLine, nameLine);
+                item.addEventListener('click', () => openPopup(similarFilename));
+                similarContainer.appendChild(item);
+            });
+        }
+
         // Add the event listener after creating the button
         document.getElementById('rateBlendButton').addEventListener('click', () => {
             document.getElementById('ratingModal').classList.remove('hidden');
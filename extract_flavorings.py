@@ -1,32 +1,18 @@
 #!/usr/bin/env python3
-import json
-import os
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'site_tools'))
+from blend_corpus import load_blends
+from blend_vocab import tokenize
+
 def extract_flavorings():
-    blend_data_dir = Path('blend_data')
     flavorings = set()
 
-    # Iterate through all JSON files
-    for json_file in blend_data_dir.glob('*.json'):
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-                # Get the first (and only) key's value
-                blend_key = list(data.keys())[0]
-                blend_data = data[blend_key]
-
-                # Extract flavoring field
-                flavoring = blend_data.get('flavoring', '')
-                if flavoring and flavoring.strip():
-                    # Split by common delimiters and clean up
-                    for item in flavoring.replace(',', '/').split('/'):
-                        item = item.strip()
-                        if item and item.lower() != 'none' and item.lower() != 'unflavored':
-                            flavorings.add(item)
-        except Exception as e:
-            print(f"Error processing {json_file}: {e}")
+    # Iterate through all blends
+    for record in load_blends().values():
+        # Same tokens the site's flavoring filters and token index use
+        flavorings.update(tokenize('flavoring', record.data.get('flavoring')))
 
     # Sort and print
     sorted_flavorings = sorted(flavorings, key=str.lower)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Pack blend thumbnails into sprite atlas sheets for the listing grid.
+
+Thumbnails are grouped into sheets by the same filename hash as the index shards and
+written to assets/data/shards/atlas-NN.jpg, with atlas_map.json giving each blend's
+[sheet, x, y]. A state file remembers which picture (and picture content) every blend
+used, so changing one picture only re-renders the sheet it lives on.
+
+    python scripts/build_atlases.py           # incremental
+    python scripts/build_atlases.py --full    # re-render every sheet
+"""
+from pathlib import Path
+from typing import Dict, Any, List
+import argparse
+import hashlib
+import sys
+import time
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "site_tools"))
+
+from blend_corpus import (BLEND_DATA_DIR, PICTURES_DIR, load_blends, picture_for, cache_path_for,
+                          read_pickle, write_pickle)
+from blend_atlas import (ATLAS_SHEETS, ATLAS_MAP_FILE, TILE_SIZE, COLUMNS, atlas_sheet, sheet_file,
+                         render_sheet, render_atlas_map)
+from build_site_data import OUTPUT_DIR, SHARD_DIR_NAME, write_output
+
+# Bump whenever the sheet layout or rendering changes
+STATE_VERSION = 1
+
+
+def picture_digest(picture: Path, name: str, stat: tuple, previous: Dict[str, Any]) -> str:
+    """Content hash of a picture, reusing the last one when its (mtime, size) is unchanged."""
+    if previous and previous["picture"] == name and previous["stat"] == stat:
+        return previous["sha1"]
+    with open(picture, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def build(blend_dir: Path = BLEND_DATA_DIR, pictures_dir: Path = PICTURES_DIR, output_dir: Path = OUTPUT_DIR,
+          full: bool = False, sheets: int = ATLAS_SHEETS) -> Dict[str, Any]:
+    """Re-render the sheets whose members or pictures changed and rewrite the atlas map."""
+    shard_dir = Path(output_dir) / SHARD_DIR_NAME
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    state_file = cache_path_for(pictures_dir, "atlas_state")
+    spec = (sheets, TILE_SIZE, COLUMNS, str(shard_dir.resolve()))
+
+    state = None if full else read_pickle(state_file, STATE_VERSION)
+    if state is None or state.get("spec") != spec:
+        state = {"version": STATE_VERSION, "spec": spec, "members": {}, "outputs": {}}
+    members = state["members"]
+    first_build = not state["outputs"]
+
+    current = {}
+    for filename, record in load_blends(blend_dir).items():
+        picture = picture_for(record.data.get("imagePath"), pictures_dir)
+        if picture is None:
+            continue
+        st = picture.stat()
+        stat = (st.st_mtime_ns, st.st_size)
+        name = picture.relative_to(pictures_dir).as_posix()
+        current[filename] = {"picture": name, "stat": stat,
+                             "sha1": picture_digest(picture, name, stat, members.get(filename))}
+
+    dirty = {sheet for sheet in range(sheets) if first_build or not (shard_dir / sheet_file(sheet)).exists()}
+    for filename in set(members) | set(current):
+        before, after = members.get(filename), current.get(filename)
+        if before is None or after is None or before["picture"] != after["picture"] or before["sha1"] != after["sha1"]:
+            dirty.add(atlas_sheet(filename, sheets))
+    state["members"] = current
+
+    by_sheet: Dict[int, List[str]] = {sheet: [] for sheet in range(sheets)}
+    for filename in sorted(current):
+        by_sheet[atlas_sheet(filename, sheets)].append(filename)
+
+    outputs = state["outputs"]
+    written = []
+    for sheet in sorted(dirty):
+        pictures = [pictures_dir / current[filename]["picture"] for filename in by_sheet[sheet]]
+        if write_output(shard_dir / sheet_file(sheet), render_sheet(pictures), outputs):
+            written.append(f"{SHARD_DIR_NAME}/{sheet_file(sheet)}")
+
+    versions = {sheet_file(sheet): outputs.get(str(shard_dir / sheet_file(sheet)), "")[:10] for sheet in range(sheets)}
+    if write_output(shard_dir / ATLAS_MAP_FILE, render_atlas_map(by_sheet, versions, sheets), outputs, compress=True):
+        written.append(f"{SHARD_DIR_NAME}/{ATLAS_MAP_FILE}")
+
+    write_pickle(state_file, state)
+    return {"thumbnails": len(current), "rendered": len(dirty), "written": written}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build thumbnail atlas sheets for the blend listing.")
+    parser.add_argument("--full", action="store_true", help="ignore the build state and re-render every sheet")
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    parser.add_argument("--pictures-dir", type=Path, default=PICTURES_DIR)
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = build(args.blend_dir, args.pictures_dir, args.output_dir, full=args.full)
+    elapsed = time.perf_counter() - start
+
+    print(f"Packed {summary['thumbnails']} thumbnails, re-rendered {summary['rendered']} of "
+          f"{ATLAS_SHEETS} sheets in {elapsed:.2f}s")
+    for filename in summary["written"]:
+        print(f"  wrote {args.output_dir / filename}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Build every generated file in assets/data/ from blend_data/ in one pass.
+
+Produces blend_manifest.json, blend_index.json, blend_metadata.json, the uncurated dropdown
+vocab lists, the contents/flavoring token vocabulary, the sharded, precompressed index in
+assets/data/shards/ (with the search, facet filter and token indexes) and the facet cubes
+for graphs.html in assets/data/facets/. Detail shard records carry each blend's precomputed
+similar blends (blend_similar.py). A build state file remembers each blend's
+(mtime, size, content hash) and its pre-serialised outputs, so after a small edit only
+the changed blends are re-read and the outputs are patched instead of rebuilt from a
+full corpus scan.
+
+    python scripts/build_site_data.py                 # incremental
+    python scripts/build_site_data.py --full          # ignore the build state
+    python scripts/build_site_data.py --changed "blend_data/X - Y.json"
+"""
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Union
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "site_tools"))
+
+from blend_corpus import (BLEND_DATA_DIR, list_blend_files, parse_blend, map_chunks,
+                          cache_path_for, read_pickle, write_pickle)
+from blend_ratings import published_blend
+from blend_index import index_entry, metadata_values, dump_index_fragment, METADATA_FIELDS
+from blend_shards import (DEFAULT_BUCKETS, HEAD_FILE, SHARD_MAP_FILE, SEARCH_FILE, FACET_FILE,
+                          TOKEN_FILE, shard_bucket, detail_file, head_row, detail_fragment, with_similar,
+                          render_head, render_detail, render_shard_map, siblings_missing,
+                          write_compressed_siblings)
+from blend_search import doc_grams, build_search_index
+from blend_facets import facet_values, build_facet_index
+from blend_vocab import VOCAB_FILE, Vocabulary, blend_tokens, build_token_index, render_token_index
+from blend_similar import feature_matrix, similarity_input, top_k, update_top_k
+from blend_pack import read_raw, update_pack
+from blend_snapshot import load_snapshot
+from facet_cubes import FACET_DIR_NAME, render_facets
+
+OUTPUT_DIR = ROOT_DIR / "assets" / "data"
+SHARD_DIR_NAME = "shards"
+
+# Bump whenever derive_products changes shape so old states trigger a full rebuild
+STATE_VERSION = 7
+
+# Dropdown vocab files: (filename, blend field, curated, indent, ensure_ascii).
+# Curated lists are hand-edited and never written here (blend_validator.py checks the
+# corpus against them); the build only reports corpus values none of their entries match.
+VOCAB_FILES = [
+    ("blenders.json", "blender", False, 4, True),
+    ("blended_by.json", "blendedBy", False, 2, False),
+    ("manufactured_by.json", "manufacturedBy", False, 2, False),
+    ("countries.json", "country", True, 4, True),
+    ("cut_types.json", "cut", True, 4, True),
+    ("blend_types.json", "blendType", True, 4, True),
+]
+
+
+def file_digest(path: Path) -> str:
+    """Content hash used to tell real edits from mtime-only changes (e.g. fresh checkouts)."""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def derive_products(filename: str, blend_key: str, blend: Dict[str, Any]) -> Dict[str, Any]:
+    """Everything the outputs need from one blend, pre-serialised where possible."""
+    # From the raw record: the published one has derived distributions instead of counts
+    similarity = similarity_input(blend)
+    blend = published_blend(blend)
+    entry = index_entry(blend)
+    return {
+        "key": blend_key,
+        "index": dump_index_fragment(entry),
+        "meta": metadata_values(blend),
+        "head": head_row(filename, entry),
+        "detail": detail_fragment(blend),
+        "search": (entry["n"], entry["b"], doc_grams(blend)),
+        "facets": facet_values(entry),
+        "tokens": blend_tokens(blend),
+        "similarity": similarity,
+    }
+
+
+def _derive_chunk(blend_dir: str, filenames: List[str]) -> List[tuple]:
+    """Worker: read, hash, parse and derive a chunk of blend files."""
+    results = []
+    for filename in filenames:
+        try:
+            raw_bytes, _ = read_raw(blend_dir, filename)
+            blend_key, blend = parse_blend(raw_bytes.decode('utf-8'))
+            products = derive_products(filename, blend_key, blend)
+            results.append((filename, hashlib.sha1(raw_bytes).hexdigest(), products, None))
+        except Exception as e:
+            results.append((filename, None, None, str(e)))
+    return results
+
+
+def find_changes(stats: Dict[str, tuple], files: Dict[str, Dict[str, Any]], blend_dir: Path,
+                 changed: Optional[set] = None) -> List[str]:
+    """
+    Return the filenames that need re-deriving.
+
+    With `changed` given, only those files (plus any the state has never seen) are checked;
+    otherwise every file whose stat differs from the state is re-hashed, and only files whose
+    content hash also differs are re-read.
+    """
+    stale = []
+    for filename, stat in stats.items():
+        entry = files.get(filename)
+        if entry is None:
+            stale.append(filename)
+            continue
+        if changed is not None:
+            if filename in changed:
+                stale.append(filename)
+            continue
+        if entry["stat"] == stat:
+            continue
+        if file_digest(blend_dir / filename) == entry["digest"]:
+            entry["stat"] = stat
+        else:
+            stale.append(filename)
+    return stale
+
+
+def render_index(stats: Dict[str, tuple], files: Dict[str, Dict[str, Any]]) -> str:
+    """Assemble blend_index.json from the per-blend fragments."""
+    parts = [
+        f"  {json.dumps(filename, ensure_ascii=False)}: {files[filename]['index']}"
+        for filename in stats if filename in files
+    ]
+    return "{\n" + ",\n".join(parts) + "\n}" if parts else "{}"
+
+
+def collect_metadata(files: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Rebuild blend_metadata.json's sorted value lists from the per-blend contributions."""
+    value_sets = [set() for _ in METADATA_FIELDS]
+    for entry in files.values():
+        for values, value in zip(value_sets, entry["meta"]):
+            if value:
+                values.add(value)
+    return {name: sorted(values) for name, values in zip(METADATA_FIELDS, value_sets)}
+
+
+def curated_vocab(output_dir: Path, filename: str) -> List[str]:
+    """A curated vocab list as it is on disk ([] if it is missing)."""
+    try:
+        with open(output_dir / filename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return []
+
+
+def unknown_vocab(curated: List[str], values: List[str]) -> List[str]:
+    """Corpus values no curated entry matches case-insensitively."""
+    known = {value.lower() for value in curated}
+    return [value for value in values if value.lower() not in known]
+
+
+def output_missing(path: Path, compress: bool = False) -> bool:
+    """Whether an output (or, for compressed ones, one of its siblings) is gone from disk."""
+    return not path.exists() or (compress and siblings_missing(path))
+
+
+def write_output(path: Path, text: Union[str, bytes], outputs: Dict[str, str],
+                 compress: bool = False) -> bool:
+    """Write an output atomically, skipping it when its content hash is unchanged and it is on disk."""
+    data = text.encode('utf-8') if isinstance(text, str) else text
+    digest = hashlib.sha1(data).hexdigest()
+    if outputs.get(str(path)) == digest and not output_missing(path, compress):
+        return False
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    if compress:
+        write_compressed_siblings(path, data)
+    outputs[str(path)] = digest
+    return True
+
+
+def write_shards(stats: Dict[str, tuple], files: Dict[str, Dict[str, Any]], shard_dir: Path,
+                 outputs: Dict[str, str], buckets: int, dirty: set, search_dirty: bool) -> List[str]:
+    """
+    Write the head shard, the dirty detail shards, the search, facet and token indexes and
+    the shard map. New tokens are appended to the vocabulary next to the shard directory.
+    """
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+    present = [filename for filename in stats if filename in files]
+
+    if write_output(shard_dir / HEAD_FILE, render_head(files[f]["head"] for f in present),
+                    outputs, compress=True):
+        written.append(f"{SHARD_DIR_NAME}/{HEAD_FILE}")
+
+    members = {bucket: [] for bucket in dirty}
+    for filename in present:
+        bucket = files[filename]["bucket"]
+        if bucket in members:
+            members[bucket].append((filename, with_similar(files[filename]["detail"], files[filename].get("similar"))))
+    for bucket, items in sorted(members.items()):
+        if write_output(shard_dir / detail_file(bucket), render_detail(items), outputs, compress=True):
+            written.append(f"{SHARD_DIR_NAME}/{detail_file(bucket)}")
+
+    if search_dirty:
+        search_index = build_search_index((f, *files[f]["search"]) for f in present)
+        if write_output(shard_dir / SEARCH_FILE, search_index, outputs, compress=True):
+            written.append(f"{SHARD_DIR_NAME}/{SEARCH_FILE}")
+
+    # A few milliseconds to rebuild; write_output skips it when no facet value moved
+    facet_index = build_facet_index(files[f]["facets"] for f in present)
+    if write_output(shard_dir / FACET_FILE, facet_index, outputs, compress=True):
+        written.append(f"{SHARD_DIR_NAME}/{FACET_FILE}")
+
+    vocabulary = Vocabulary.load(shard_dir.parent)
+    token_index = build_token_index(vocabulary, (files[f]["tokens"] for f in present))
+    if write_output(shard_dir.parent / VOCAB_FILE, vocabulary.render(), outputs):
+        written.append(VOCAB_FILE)
+    if write_output(shard_dir / TOKEN_FILE, render_token_index(token_index), outputs, compress=True):
+        written.append(f"{SHARD_DIR_NAME}/{TOKEN_FILE}")
+
+    versions = {}
+    for name in [HEAD_FILE, SEARCH_FILE, FACET_FILE, TOKEN_FILE] + [detail_file(bucket) for bucket in range(buckets)]:
+        versions[name] = outputs.get(str(shard_dir / name), "")[:10]
+    if write_output(shard_dir / SHARD_MAP_FILE, render_shard_map(buckets, len(present), versions), outputs):
+        written.append(f"{SHARD_DIR_NAME}/{SHARD_MAP_FILE}")
+    return written
+
+
+def update_similar(stats: Dict[str, tuple], files: Dict[str, Dict[str, Any]], state: Dict[str, Any],
+                   rederived: List[str]) -> set:
+    """
+    Bring every blend's similar blends up to date; returns the buckets whose lists changed.
+    With the same blends as the last build, only the re-derived ones and the blends whose
+    lists held them are rescored; otherwise every blend is.
+    """
+    present = [filename for filename in stats if filename in files]
+    features = feature_matrix([files[filename]["similarity"] for filename in present])
+    previous = state.get("similar")
+    if previous is not None and previous["filenames"] == present:
+        rows = {filename: row for row, filename in enumerate(present)}
+        neighbours, scores, touched = update_top_k(features, previous["neighbours"], previous["scores"],
+                                                   [rows[filename] for filename in rederived])
+    else:
+        neighbours, scores = top_k(features)
+        touched = range(len(present))
+    state["similar"] = {"filenames": present, "neighbours": neighbours, "scores": scores}
+
+    changed = set()
+    for row in touched:
+        filename = present[row]
+        # Name and blender (from the search products) so pages can list them without fetching each one
+        similar = json.dumps([[present[i], *files[present[i]]["search"][:2]] for i in neighbours[row] if i >= 0],
+                             ensure_ascii=False, separators=(",", ":"))
+        if files[filename].get("similar") != similar:
+            files[filename]["similar"] = similar
+            changed.add(files[filename]["bucket"])
+    return changed
+
+
+def write_facets(blend_dir: Path, output_dir: Path, outputs: Dict[str, str]) -> List[str]:
+    """Write the facet cubes graphs.html draws from."""
+    facet_dir = output_dir / FACET_DIR_NAME
+    facet_dir.mkdir(parents=True, exist_ok=True)
+    rendered = render_facets(load_snapshot(blend_dir), curated_vocab(output_dir, "contents.json"),
+                             curated_vocab(output_dir, "flavorings.json"))
+    return [f"{FACET_DIR_NAME}/{filename}" for filename, text in rendered.items()
+            if write_output(facet_dir / filename, text, outputs)]
+
+
+def build(blend_dir: Path = BLEND_DATA_DIR, output_dir: Path = OUTPUT_DIR, full: bool = False,
+          changed: Optional[List[str]] = None, workers: Optional[int] = None,
+          buckets: int = DEFAULT_BUCKETS) -> Dict[str, Any]:
+    """Run the build and return a small summary of what was done."""
+    blend_dir, output_dir = Path(blend_dir), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    state_file = cache_path_for(blend_dir, "build_state")
+
+    state = None if full else read_pickle(state_file, STATE_VERSION)
+    if (state is None or state.get("output_dir") != str(output_dir.resolve())
+            or state.get("buckets") != buckets):
+        state = {"version": STATE_VERSION, "output_dir": str(output_dir.resolve()),
+                 "buckets": buckets, "files": {}, "outputs": {}}
+    files = state["files"]
+    # The state only records what was written; anything deleted from disk since is rebuilt
+    shard_dir = output_dir / SHARD_DIR_NAME
+    first_build = (not state["outputs"] or output_missing(output_dir / "blend_index.json")
+                   or output_missing(shard_dir / HEAD_FILE, compress=True))
+
+    stats = list_blend_files(blend_dir)
+    removed = [filename for filename in files if filename not in stats]
+    dirty = set(range(buckets)) if first_build else {
+        bucket for bucket in range(buckets) if output_missing(shard_dir / detail_file(bucket), compress=True)}
+    for filename in removed:
+        dirty.add(files.pop(filename)["bucket"])
+    # Rating-only edits leave the search index untouched
+    search_dirty = first_build or bool(removed) or output_missing(shard_dir / SEARCH_FILE, compress=True)
+    similar_dirty = False
+
+    changed_names = {Path(p).name for p in changed} if changed is not None else None
+    stale = find_changes(stats, files, blend_dir, changed_names)
+    # Refresh the packed corpus first, so the blends re-derived below are read from it.
+    # Edits are appended to it; a full build also compacts it
+    if stale:
+        update_pack(blend_dir, force=full)
+
+    errors, rederived = [], []
+    for filename, digest, products, error in map_chunks(_derive_chunk, blend_dir, stale, workers):
+        if error is not None:
+            errors.append((filename, error))
+            if filename in files:
+                dirty.add(files.pop(filename)["bucket"])
+                search_dirty = True
+            print(f"Error processing {blend_dir / filename}: {error}", file=sys.stderr)
+            continue
+        products.update(stat=stats[filename], digest=digest, bucket=shard_bucket(filename, buckets))
+        previous = files.get(filename)
+        if previous is None or previous["search"] != products["search"]:
+            search_dirty = True
+        if previous is None or previous["similarity"] != products["similarity"]:
+            similar_dirty = True
+        elif "similar" in previous:
+            products["similar"] = previous["similar"]
+        files[filename] = products
+        rederived.append(filename)
+        dirty.add(products["bucket"])
+
+    written, unknown = [], {}
+    if stale or removed or first_build or dirty or search_dirty:
+        outputs = state["outputs"]
+        metadata = collect_metadata(files)
+        rendered = {
+            "blend_manifest.json": json.dumps(list(stats), indent=2),
+            "blend_index.json": render_index(stats, files),
+            "blend_metadata.json": json.dumps(metadata, indent=2, ensure_ascii=False),
+        }
+        for filename, field, curated, indent, ensure_ascii in VOCAB_FILES:
+            metadata_key = next(k for k, v in METADATA_FIELDS.items() if v == field)
+            values = metadata[metadata_key]
+            if curated:
+                unknown[filename] = unknown_vocab(curated_vocab(output_dir, filename), values)
+            else:
+                rendered[filename] = json.dumps(values, indent=indent, ensure_ascii=ensure_ascii)
+        for filename, text in rendered.items():
+            if write_output(output_dir / filename, text, outputs):
+                written.append(filename)
+        # Similar lists show neighbours' names, so anything that moves the search index redoes them too
+        if similar_dirty or search_dirty:
+            dirty |= update_similar(stats, files, state, rederived)
+        written += write_shards(stats, files, shard_dir, outputs, buckets, dirty, search_dirty)
+        written += write_facets(blend_dir, output_dir, outputs)
+
+    write_pickle(state_file, state)
+    return {"blends": len(stats), "rebuilt": len(stale) - len(errors), "removed": len(removed),
+            "errors": errors, "written": written, "unknown_vocab": unknown}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build assets/data/ from blend_data/.")
+    parser.add_argument("--full", action="store_true", help="ignore the build state and rebuild everything")
+    parser.add_argument("--changed", nargs="+", metavar="FILE",
+                        help="only re-check these blend files (e.g. from git diff --name-only)")
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="process pool size for large rebuilds")
+    parser.add_argument("--buckets", type=int, default=DEFAULT_BUCKETS, help="number of detail shards")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = build(args.blend_dir, args.output_dir, full=args.full, changed=args.changed,
+                    workers=args.workers, buckets=args.buckets)
+    elapsed = time.perf_counter() - start
+
+    print(f"Re-read {summary['rebuilt']} of {summary['blends']} blends "
+          f"({summary['removed']} removed) in {elapsed:.2f}s")
+    for filename in summary["written"]:
+        print(f"  wrote {args.output_dir / filename}")
+    for filename, values in summary["unknown_vocab"].items():
+        if values:
+            print(f"{len(values)} values not in {filename} (see site_tools/blend_validator.py): "
+                  f"{', '.join(values[:5])}{', ...' if len(values) > 5 else ''}")
+    if summary["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Time the site tooling on synthetic corpora of increasing size.
+
+Each size gets its own corpus from site_tools/synthetic_corpus.py (generated once and
+reused while its settings match) and runs every benchmark against it:
+
+    load_cold / load_warm        blend_corpus.load_blends without / with its cache
+    validate_cold / _warm        blend_validator.validate (full / incremental)
+    build_full                   build_site_data.build --full: manifest, index, shards,
+                                 search/facet/token indexes, similar blends, facet cubes
+    build_incremental            build_site_data.build after editing one blend
+    ratings_record               rating_log.record of a batch of ratings (as process_ratings)
+    ratings_replay               rating_log.replay of genesis + the whole log
+    search                       SearchIndex.search over the built search index
+    images                       image_pipeline.build_images of every source picture
+
+Results go to site_tools_output/benchmarks/<commit>.json with the best and median of
+--repeat runs per benchmark, so two commits can be compared:
+
+    python scripts/run_benchmarks.py                               # 10k blends
+    python scripts/run_benchmarks.py --sizes 10000 100000 1000000 --skip build_full
+    python scripts/run_benchmarks.py --compare site_tools_output/benchmarks/1a2b3c4d.json
+    python scripts/run_benchmarks.py --compare old.json new.json   # no run, just compare
+
+With --compare the exit status is 1 when any benchmark got slower by more than --threshold.
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, Callable, List, Optional, NamedTuple
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "site_tools"))
+
+from blend_corpus import CACHE_DIR, load_blends, update_blend_file
+from blend_ratings import PROFILE_SCALES, STAR_VALUES
+from blend_search import SearchIndex
+from blend_validator import validate
+from build_site_data import SHARD_DIR_NAME, build
+from blend_shards import SEARCH_FILE
+from image_pipeline import build_images
+from rating_log import record, replay
+from synthetic_corpus import generate
+
+RESULTS_DIR = ROOT_DIR / "site_tools_output" / "benchmarks"
+WORK_DIR = CACHE_DIR / "benchmarks"
+
+# Bump whenever a benchmark's meaning changes, so results from before aren't compared
+RESULTS_VERSION = 1
+
+DEFAULT_SIZES = [10000]
+RATING_BATCH = 1000
+SEARCH_QUERIES = 200
+
+
+class Benchmark(NamedTuple):
+    name: str
+    run: Callable[["Corpus"], int]                        # timed; returns the items processed
+    setup: Optional[Callable[["Corpus"], None]] = None    # untimed, before every run
+
+
+class Corpus(NamedTuple):
+    root: Path
+    blends: int
+    workers: Optional[int]
+    seed: int
+
+    @property
+    def blend_dir(self) -> Path:
+        return self.root / "blend_data"
+
+    @property
+    def pictures_dir(self) -> Path:
+        return self.root / "blend_pictures"
+
+    @property
+    def output_dir(self) -> Path:
+        return self.root / "site_data"
+
+    @property
+    def log_dir(self) -> Path:
+        return self.root / "rating_log"
+
+
+def drop_caches(*dirs: Path) -> None:
+    """Delete everything in site_tools_output/cache/ that belongs to these directories."""
+    for directory in dirs:
+        digest = hashlib.sha1(str(Path(directory).resolve()).encode("utf-8")).hexdigest()[:12]
+        for path in CACHE_DIR.glob(f"*-{digest}.*"):
+            path.unlink()
+
+
+def ensure_built(corpus: Corpus) -> None:
+    if not (corpus.output_dir / SHARD_DIR_NAME / SEARCH_FILE).exists():
+        build(corpus.blend_dir, corpus.output_dir, workers=corpus.workers)
+
+
+def edit_one_blend(corpus: Corpus) -> None:
+    ensure_built(corpus)
+    target = sorted(corpus.blend_dir.glob("*.json"))[0]
+
+    def touch_description(blend: Dict[str, Any]) -> None:
+        blend["description"] = f"Edited for a benchmark at {time.time_ns()}."
+
+    update_blend_file(target, touch_description)
+
+
+def rating_batch(corpus: Corpus, size: int = RATING_BATCH) -> List[Dict[str, Any]]:
+    """Valid ratings for random blends, the way the rating worker submits them."""
+    rng = random.Random(time.time_ns())
+    stems = [path.stem for path in sorted(corpus.blend_dir.glob("*.json"))]
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    return [{
+        "blendId": rng.choice(stems),
+        "rating": rng.choice(STAR_VALUES),
+        "profiles": {profile_type: rng.choice(levels) for profile_type, (_, levels) in PROFILE_SCALES.items()},
+        "id": f"bench-{rng.getrandbits(64):016x}",
+        "timestamp": now,
+    } for _ in range(size)]
+
+
+def search_queries(corpus: Corpus, count: int = SEARCH_QUERIES) -> List[str]:
+    """Names, name prefixes, blenders and misspelt names of random blends."""
+    rng = random.Random(corpus.seed)
+    records = list(load_blends(corpus.blend_dir, workers=corpus.workers).values())
+    queries = []
+    for record in rng.sample(records, min(count, len(records))):
+        name, blender = record.data["name"], record.data["blender"]
+        kind = len(queries) % 4
+        if kind == 0:
+            queries.append(name)
+        elif kind == 1:
+            queries.append(name[:rng.randint(2, max(2, len(name) // 2))])
+        elif kind == 2:
+            queries.append(f"{blender} {name.split()[0]}")
+        else:
+            i = rng.randrange(max(1, len(name) - 1))
+            queries.append(name[:i] + name[i + 1:i + 2] + name[i:i + 1] + name[i + 2:])
+    return queries
+
+
+def run_load(corpus: Corpus) -> int:
+    return len(load_blends(corpus.blend_dir, workers=corpus.workers))
+
+
+def run_validate(corpus: Corpus, full: bool) -> int:
+    return len(validate(corpus.blend_dir, pictures_dir=corpus.pictures_dir, full=full, workers=corpus.workers))
+
+
+def run_build(corpus: Corpus, full: bool) -> int:
+    summary = build(corpus.blend_dir, corpus.output_dir, full=full, workers=corpus.workers)
+    return summary["blends"] if full else max(summary["rebuilt"], 1)
+
+
+_pending: Dict[str, Any] = {}
+
+
+def prepare_ratings(corpus: Corpus) -> None:
+    _pending["ratings"] = rating_batch(corpus)
+
+
+def run_ratings_record(corpus: Corpus) -> int:
+    ratings = _pending.pop("ratings")
+    record(ratings, corpus.blend_dir, corpus.log_dir)
+    return len(ratings)
+
+
+def run_ratings_replay(corpus: Corpus) -> int:
+    counters, _, _ = replay(corpus.blend_dir, corpus.log_dir)
+    return len(counters.filenames)
+
+
+def prepare_search(corpus: Corpus) -> None:
+    ensure_built(corpus)
+    if "queries" not in _pending:
+        _pending["queries"] = search_queries(corpus)
+
+
+def run_search(corpus: Corpus) -> int:
+    index = SearchIndex.load(corpus.output_dir / SHARD_DIR_NAME / SEARCH_FILE)
+    queries = _pending["queries"]
+    for query in queries:
+        index.search(query)
+    return len(queries)
+
+
+def run_images(corpus: Corpus) -> int:
+    summary = build_images(corpus.pictures_dir, corpus.root / "pictures_out", force=True, workers=corpus.workers)
+    return summary["rendered"]
+
+
+BENCHMARKS = [
+    Benchmark("load_cold", run_load, setup=lambda corpus: drop_caches(corpus.blend_dir)),
+    Benchmark("load_warm", run_load, setup=lambda corpus: load_blends(corpus.blend_dir, workers=corpus.workers)),
+    Benchmark("validate_cold", lambda corpus: run_validate(corpus, True)),
+    Benchmark("validate_warm", lambda corpus: run_validate(corpus, False)),
+    Benchmark("build_full", lambda corpus: run_build(corpus, True)),
+    Benchmark("build_incremental", lambda corpus: run_build(corpus, False), setup=edit_one_blend),
+    Benchmark("ratings_record", run_ratings_record, setup=prepare_ratings),
+    Benchmark("ratings_replay", run_ratings_replay),
+    Benchmark("search", run_search, setup=prepare_search),
+    Benchmark("images", run_images),
+]
+BENCHMARK_NAMES = [benchmark.name for benchmark in BENCHMARKS]
+
+
+def time_benchmark(benchmark: Benchmark, corpus: Corpus, repeat: int) -> Dict[str, Any]:
+    runs, items = [], 0
+    for _ in range(repeat):
+        if benchmark.setup is not None:
+            benchmark.setup(corpus)
+        start = time.perf_counter()
+        items = benchmark.run(corpus)
+        runs.append(time.perf_counter() - start)
+    best = min(runs)
+    return {"best": round(best, 6), "median": round(statistics.median(runs), 6),
+            "runs": [round(run, 6) for run in runs], "items": items,
+            "per_item_us": round(best / items * 1e6, 3) if items else None}
+
+
+def git_commit() -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        result = subprocess.run(["git", *args], cwd=ROOT_DIR, capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else ""
+    return {"commit": git("rev-parse", "HEAD"),
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def run_suite(sizes: List[int], images: int, selected: List[str], repeat: int, work_dir: Path,
+              workers: Optional[int], seed: int, fresh: bool) -> Dict[str, Any]:
+    results = {"version": RESULTS_VERSION, **git_commit(),
+               "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+               "python": platform.python_version(), "platform": platform.platform(),
+               "cpus": os.cpu_count(), "workers": workers, "repeat": repeat,
+               "corpora": {}, "results": {}}
+    for size in sizes:
+        corpus = Corpus(work_dir / f"corpus-{size}", size, workers, seed)
+        if fresh:
+            shutil.rmtree(corpus.root, ignore_errors=True)
+        start = time.perf_counter()
+        info = generate(corpus.root, size, min(images, size), seed, workers=workers)
+        info["ready_seconds"] = round(time.perf_counter() - start, 3)
+        results["corpora"][str(size)] = info
+        print(f"{size:,} blends ({info['images']} pictures) ready in {info['ready_seconds']:.1f}s")
+
+        # Runs on a copy of the rating log and site data from earlier runs would drift
+        for directory in (corpus.output_dir, corpus.log_dir, corpus.root / "pictures_out"):
+            shutil.rmtree(directory, ignore_errors=True)
+        drop_caches(corpus.blend_dir, corpus.log_dir, corpus.output_dir, corpus.root / "pictures_out")
+        _pending.clear()
+
+        timings = results["results"].setdefault(str(size), {})
+        for benchmark in BENCHMARKS:
+            if benchmark.name not in selected:
+                continue
+            timings[benchmark.name] = timing = time_benchmark(benchmark, corpus, repeat)
+            per_item = f"{timing['per_item_us']:>10.1f} us/item" if timing["per_item_us"] is not None else ""
+            print(f"  {benchmark.name:<18} {timing['best']:>9.3f}s {per_item}")
+    return results
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], threshold: float) -> List[str]:
+    """Print old vs new best times; returns the benchmarks slower than old by more than threshold."""
+    if old.get("version") != new.get("version"):
+        print("Warning: the result files come from different benchmark versions", file=sys.stderr)
+    print(f"{'size':>9} {'benchmark':<18} {old.get('commit', '')[:8]:>10} {new.get('commit', '')[:8]:>10}  change")
+    regressions = []
+    for size, timings in new["results"].items():
+        for name, timing in timings.items():
+            before = old.get("results", {}).get(size, {}).get(name)
+            if before is None:
+                continue
+            change = timing["best"] / before["best"] - 1 if before["best"] else 0.0
+            flag = ""
+            if change > threshold:
+                flag = "  SLOWER"
+                regressions.append(f"{size}/{name}")
+            print(f"{int(size):>9,} {name:<18} {before['best']:>9.3f}s {timing['best']:>9.3f}s  {change:+7.1%}{flag}")
+    return regressions
+
+
+def read_results(path: Path) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the site tooling on synthetic corpora.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="blends per corpus")
+    parser.add_argument("--images", type=int, default=200, help="source pictures per corpus")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARK_NAMES, default=None)
+    parser.add_argument("--skip", nargs="+", choices=BENCHMARK_NAMES, default=[])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--work-dir", type=Path, default=WORK_DIR, help="where the corpora are generated")
+    parser.add_argument("--fresh", action="store_true", help="regenerate the corpora even if they match")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="results file (default: site_tools_output/benchmarks/<commit>.json)")
+    parser.add_argument("--compare", type=Path, nargs="+", metavar="FILE",
+                        help="results to compare against; with two files, compare them without running")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="slowdown that counts as a regression (default: 0.10 = 10%%)")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes one or two result files")
+    if args.compare and len(args.compare) == 2:
+        regressions = compare(read_results(args.compare[0]), read_results(args.compare[1]), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    selected = [name for name in (args.only or BENCHMARK_NAMES) if name not in args.skip]
+    results = run_suite(args.sizes, args.images, selected, args.repeat, args.work_dir, args.workers,
+                        args.seed, args.fresh)
+
+    output = args.output
+    if output is None:
+        name = (results["commit"][:12] or "unknown") + ("-dirty" if results["dirty"] else "")
+        output = RESULTS_DIR / f"{name}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        regressions = compare(read_results(args.compare[0]), results, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmarks slower by more than {args.threshold:.0%}: "
+                  + ", ".join(regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+from pathlib import Path
+from typing import Dict, List, Tuple
+import io
+import json
+
+from PIL import Image, ImageOps
+
+from blend_shards import fnv1a32
+
+# Sheets share the index's FNV-1a filename hash; with a count that divides the detail shard
+# count (128), each sheet holds exactly the blends of 8 whole detail shards
+ATLAS_SHEETS = 16
+
+TILE_SIZE = 64
+COLUMNS = 24
+JPEG_QUALITY = 80
+ATLAS_MAP_FILE = "atlas_map.json"
+
+
+def atlas_sheet(filename: str, sheets: int = ATLAS_SHEETS) -> int:
+    """Atlas sheet a blend's thumbnail lives on (shard_bucket() % sheets when sheets divides it)."""
+    return fnv1a32(filename) % sheets
+
+
+def sheet_file(sheet: int) -> str:
+    return f"atlas-{sheet:02d}.jpg"
+
+
+def tile_position(index: int, tile: int = TILE_SIZE, columns: int = COLUMNS) -> Tuple[int, int]:
+    """Pixel offset of the index-th tile on a sheet."""
+    return (index % columns) * tile, (index // columns) * tile
+
+
+def load_thumbnail(picture: Path, tile: int = TILE_SIZE) -> Image.Image:
+    """Decode a blend picture straight at thumbnail scale and crop it to a square tile."""
+    with Image.open(picture) as img:
+        # JPEG decoders can downscale by 1/2-1/8 while decoding, far cheaper than a full decode
+        img.draft("RGB", (tile, tile))
+        return ImageOps.fit(img.convert("RGB"), (tile, tile), method=Image.Resampling.LANCZOS)
+
+
+def render_sheet(pictures: List[Path], tile: int = TILE_SIZE, columns: int = COLUMNS) -> bytes:
+    """Pack pictures, in order, into one JPEG sheet."""
+    rows = max(1, -(-len(pictures) // columns))
+    sheet = Image.new("RGB", (columns * tile, rows * tile), (36, 30, 28))
+    for index, picture in enumerate(pictures):
+        sheet.paste(load_thumbnail(picture, tile), tile_position(index, tile, columns))
+    buffer = io.BytesIO()
+    sheet.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def render_atlas_map(members: Dict[int, List[str]], versions: Dict[str, str],
+                     sheets: int = ATLAS_SHEETS, tile: int = TILE_SIZE, columns: int = COLUMNS) -> str:
+    """
+    Coordinate map: {filename: [sheet, tile index]} plus each sheet's file and cache-busting
+    version. Tile i sits at column i % columns, row i // columns.
+    """
+    tiles = {}
+    for sheet, filenames in members.items():
+        for index, filename in enumerate(filenames):
+            tiles[filename] = [sheet, index]
+    atlas_map = {
+        "version": 1,
+        "hash": "fnv1a32-utf8",
+        "tile": tile,
+        "columns": columns,
+        "sheets": [
+            {"file": sheet_file(sheet), "v": versions.get(sheet_file(sheet), ""),
+             "width": columns * tile, "height": max(1, -(-len(members.get(sheet, [])) // columns)) * tile}
+            for sheet in range(sheets)
+        ],
+        "tiles": dict(sorted(tiles.items())),
+    }
+    return json.dumps(atlas_map, ensure_ascii=False, separators=(",", ":"))
+
@@ -0,0 +1,317 @@
+from pathlib import Path, PurePosixPath
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple, NamedTuple
+import hashlib
+import json
+import os
+import pickle
+import sys
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from blend_sparse import expand_blend, dump_sparse, is_sparse_dir
+
+# Define paths relative to root
+ROOT_DIR = Path(__file__).resolve().parent.parent
+BLEND_DATA_DIR = ROOT_DIR / "blend_data"
+PICTURES_DIR = ROOT_DIR / "blend_pictures"
+CACHE_DIR = ROOT_DIR / "site_tools_output" / "cache"
+# Lock files for blend files and the rating log, kept out of the tracked directories
+LOCK_DIR = CACHE_DIR / "locks"
+
+# Bump whenever the cached record layout changes so stale caches are ignored
+CACHE_VERSION = 1
+
+# Below this many stale files a process pool costs more than it saves
+PARALLEL_THRESHOLD = 256
+CHUNK_SIZE = 128
+
+
+class BlendRecord(NamedTuple):
+    """One parsed blend file, already unwrapped from its single top-level key."""
+    filename: str
+    key: str
+    data: Dict[str, Any]
+
+    @property
+    def stem(self) -> str:
+        return self.filename[:-len(".json")] if self.filename.endswith(".json") else self.filename
+
+
+def unwrap_blend(raw: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Return the (blend_key, blend_data) pair of a blend file's single top-level key."""
+    blend_key = next(iter(raw))
+    return blend_key, raw[blend_key]
+
+
+def parse_blend(text: str) -> Tuple[str, Dict[str, Any]]:
+    """(blend_key, dense blend_data) from a blend file's text, in either storage format."""
+    blend_key, blend_data = unwrap_blend(json.loads(text))
+    return blend_key, expand_blend(blend_data) if isinstance(blend_data, dict) else blend_data
+
+
+def read_blend_file(file_path: Path) -> BlendRecord:
+    """Parse a single blend file; sparse files are expanded to the full record."""
+    file_path = Path(file_path)
+    with open(file_path, 'r', encoding='utf-8') as f:
+        blend_key, blend_data = parse_blend(f.read())
+    return BlendRecord(file_path.name, blend_key, blend_data)
+
+
+def dump_blend(blend_key: str, blend_data: Dict[str, Any]) -> str:
+    """Serialise a blend file in the dense format."""
+    return json.dumps({blend_key: blend_data}, indent=4, ensure_ascii=False)
+
+
+def dump_blend_for(blend_dir: Path, blend_key: str, blend_data: Dict[str, Any]) -> str:
+    """Serialise a blend file in the format blend_dir is stored in."""
+    if is_sparse_dir(blend_dir):
+        return dump_sparse(blend_key, blend_data)
+    return dump_blend(blend_key, blend_data)
+
+
+class BlendConflict(Exception):
+    """A blend file changed on disk between being read and written back."""
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock on `path` (created if missing) for the with-block, waiting for it if taken."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def lock_path_for(path: Path) -> Path:
+    """The lock file guarding `path`; every process locking the same file uses the same one."""
+    digest = hashlib.sha1(str(Path(path).resolve()).encode("utf-8")).hexdigest()[:16]
+    return LOCK_DIR / f"{Path(path).name[:40]}-{digest}.lock"
+
+
+def blend_lock(file_path: Path):
+    """Lock one blend file against other writers, in this process or any other."""
+    return file_lock(lock_path_for(file_path))
+
+
+def blend_version(file_path: Path) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of a blend file, or None if it doesn't exist; changes with every write."""
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def atomic_write(file_path: Path, text: str) -> None:
+    """
+    Replace a file in one step: write a uniquely named temp file beside it, fsync it and
+    rename it over the original, so readers and crashes see the old or the new file whole.
+    """
+    file_path = Path(file_path)
+    fd, tmp_name = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp")
+    try:
+        # mkstemp creates the file private to its owner; keep the mode the file had
+        try:
+            mode = os.stat(file_path).st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp_name, mode)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, file_path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    if fcntl is not None:
+        # Make the rename itself durable (directories can't be opened this way on Windows)
+        dir_fd = os.open(file_path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def write_blend_file(file_path: Path, blend_key: str, blend_data: Dict[str, Any],
+                     expected: Optional[Tuple[int, int]] = None) -> None:
+    """
+    Write a blend file (in its directory's format) atomically, under its lock. With
+    `expected` (a blend_version() taken when the file was read), raise BlendConflict
+    instead if someone else has written it since.
+    """
+    file_path = Path(file_path)
+    with blend_lock(file_path):
+        if expected is not None and blend_version(file_path) != expected:
+            raise BlendConflict(f"{file_path.name} changed on disk since it was read")
+        atomic_write(file_path, dump_blend_for(file_path.parent, blend_key, blend_data))
+
+
+def update_blend_file(file_path: Path, mutate: Callable[[Dict[str, Any]], Optional[bool]]) -> bool:
+    """
+    Read, change and write back one blend file while holding its lock, so concurrent
+    updates to the same blend never lose each other's changes. `mutate` edits the blend
+    data in place and may return False to leave the file untouched. Returns whether the
+    file was written.
+    """
+    file_path = Path(file_path)
+    with blend_lock(file_path):
+        record = read_blend_file(file_path)
+        if mutate(record.data) is False:
+            return False
+        atomic_write(file_path, dump_blend_for(file_path.parent, record.key, record.data))
+        return True
+
+
+def list_blend_files(blend_dir: Path = BLEND_DATA_DIR) -> Dict[str, Tuple[int, int]]:
+    """Return {filename: (mtime_ns, size)} for every blend file, sorted by filename."""
+    stats = {}
+    with os.scandir(blend_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json") and entry.is_file():
+                st = entry.stat()
+                stats[entry.name] = (st.st_mtime_ns, st.st_size)
+    return dict(sorted(stats.items()))
+
+
+def picture_for(image_path: Optional[str], pictures_dir: Path = PICTURES_DIR) -> Optional[Path]:
+    """The file under blend_pictures/ an imagePath ("../blend_pictures/...") points at, or None if missing."""
+    if not image_path:
+        return None
+    parts = PurePosixPath(image_path).parts
+    relative = parts[parts.index("blend_pictures") + 1:] if "blend_pictures" in parts else parts[-1:]
+    picture = Path(pictures_dir).joinpath(*relative)
+    return picture if relative and picture.is_file() else None
+
+
+def cache_path_for(blend_dir: Path, name: str = "blend_corpus") -> Path:
+    """Cache file for a given blend directory, so separate corpora never share a cache."""
+    digest = hashlib.sha1(str(Path(blend_dir).resolve()).encode("utf-8")).hexdigest()[:12]
+    return CACHE_DIR / f"{name}-{digest}.pickle"
+
+
+def read_pickle(path: Path, version: int) -> Optional[Dict[str, Any]]:
+    """Load a versioned pickle written by write_pickle, or None if missing or stale."""
+    try:
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if not isinstance(payload, dict) or payload.get("version") != version:
+        return None
+    return payload
+
+
+def write_pickle(path: Path, payload: Dict[str, Any]) -> None:
+    """Write a pickle next to its destination and rename it into place."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _parse_chunk(blend_dir: str, filenames: List[str]) -> List[Tuple[str, Optional[str], Any]]:
+    """Parse a chunk of files in a worker; returns (filename, key, data) or (filename, None, error)."""
+    results = []
+    for filename in filenames:
+        try:
+            record = read_blend_file(Path(blend_dir) / filename)
+            results.append((filename, record.key, record.data))
+        except json.JSONDecodeError as e:
+            results.append((filename, None, f"Could not parse JSON file: {e}"))
+        except Exception as e:
+            results.append((filename, None, str(e)))
+    return results
+
+
+def map_chunks(func, blend_dir: Path, filenames: List[str], workers: Optional[int] = None,
+               threshold: int = PARALLEL_THRESHOLD, chunk_size: int = CHUNK_SIZE) -> List[Any]:
+    """
+    Run func(blend_dir, chunk) over chunks of filenames and concatenate the results.
+
+    Batches smaller than `threshold` run in-process; larger ones are spread over a process
+    pool, so func must be a module-level function (or a partial of one) returning a list.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(filenames) < threshold:
+        return func(str(blend_dir), filenames)
+
+    chunks = [filenames[i:i + chunk_size] for i in range(0, len(filenames), chunk_size)]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk_results in executor.map(func, [str(blend_dir)] * len(chunks), chunks):
+            results.extend(chunk_results)
+    return results
+
+
+def load_blends(blend_dir: Path = BLEND_DATA_DIR,
+                use_cache: bool = True,
+                workers: Optional[int] = None,
+                errors: Optional[List[Tuple[str, str]]] = None) -> Dict[str, BlendRecord]:
+    """
+    Load every blend in blend_dir as {filename: BlendRecord}, sorted by filename.
+
+    Files whose (mtime, size) match the on-disk cache are served from it; everything else
+    is parsed, on a process pool when there is enough of it. Files that fail to parse are
+    appended to `errors` as (filename, message), or reported on stderr if no list is given.
+    """
+    blend_dir = Path(blend_dir)
+    stats = list_blend_files(blend_dir)
+    cache_file = cache_path_for(blend_dir)
+
+    cached = {}
+    if use_cache:
+        payload = read_pickle(cache_file, CACHE_VERSION)
+        if payload is not None:
+            cached = payload["entries"]
+
+    entries = {}
+    stale = []
+    for filename, stat in stats.items():
+        hit = cached.get(filename)
+        if hit is not None and hit[0] == stat:
+            entries[filename] = hit
+        else:
+            stale.append(filename)
+
+    for filename, blend_key, result in map_chunks(_parse_chunk, blend_dir, stale, workers):
+        if blend_key is None:
+            if errors is not None:
+                errors.append((filename, result))
+            else:
+                print(f"Error processing {blend_dir / filename}: {result}", file=sys.stderr)
+            continue
+        entries[filename] = (stats[filename], blend_key, result)
+
+    if use_cache and (stale or len(cached) != len(entries)):
+        write_pickle(cache_file, {"version": CACHE_VERSION, "entries": entries})
+
+    return {
+        filename: BlendRecord(filename, entries[filename][1], entries[filename][2])
+        for filename in stats if filename in entries
+    }
+
+
+def iter_blends(blend_dir: Path = BLEND_DATA_DIR, **kwargs):
+    """Iterate over BlendRecords in filename order."""
+    return iter(load_blends(blend_dir, **kwargs).values())
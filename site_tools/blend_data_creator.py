@@ -1,8 +1,9 @@
 import os
-import json
 from collections import OrderedDict
 from typing import Dict, Any
-from PIL import Image, ImageOps
+from blend_corpus import write_blend_file
+from blend_ratings import empty_ratings
+from image_pipeline import render_variants
 
 # Define paths
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -13,60 +14,6 @@ def generate_image_path(brand: str, blend_name: str) -> str:
     """Generates the standardized image path for a blend."""
     return f"../blend_pictures/{brand} - {blend_name}.jpg"
 
-def resize_and_crop(input_path, output_path, size=(262, 262)):
-    """Resize image to fill the given size while maintaining aspect ratio (crop excess)."""
-    with Image.open(input_path) as img:
-        img = img.convert("RGB")
-        img = ImageOps.fit(img, size, method=Image.Resampling.LANCZOS)
-        img.save(output_path, "JPEG", quality=85, optimize=True)
-
-def detailed_ratings_data(level: str, scale: str, distribution: Dict[str, float]) -> OrderedDict:
-    """Returns detailed rating data."""
-    return OrderedDict({
-        "level": level,
-        "scale": scale,
-        "distribution": distribution
-    })
-
-def extract_ratings_data() -> OrderedDict:
-    """Returns fully detailed rating data."""
-    return OrderedDict({
-        "strength": detailed_ratings_data(
-            level="0",
-            scale="Extremely Mild -> Overwhelming",
-            distribution={
-                "Extremely Mild": 0.0, "Very Mild": 0.0, "Mild": 0.0, "Mild to Medium": 0.0, "Medium": 0.0,
-                "Medium to Strong": 0.0, "Strong": 0.0, "Very Strong": 0.0, "Extremely Strong": 0.0, "Overwhelming": 0.0
-            }
-        ),
-        "flavoring": detailed_ratings_data(
-            level="0",
-            scale="None Detected -> Extra Strong",
-            distribution={
-                "None Detected": 0.0, "Extremely Mild": 0.0, "Very Mild": 0.0, "Mild": 0.0, "Mild to Medium": 0.0,
-                "Medium": 0.0, "Medium to Strong": 0.0, "Strong": 0.0, "Very Strong": 0.0, "Extra Strong": 0.0
-            }
-        ),
-        "roomNote": detailed_ratings_data(
-            level="0",
-            scale="Unnoticeable -> Overwhelming",
-            distribution={
-                "Unnoticeable": 0.0, "Pleasant": 0.0, "Very Pleasant": 0.0, "Pleasant to Tolerable": 0.0,
-                "Tolerable": 0.0, "Tolerable to Strong": 0.0, "Strong": 0.0, "Very Strong": 0.0,
-                "Extra Strong": 0.0, "Overwhelming": 0.0
-            }
-        ),
-        "taste": detailed_ratings_data(
-            level="0",
-            scale="Extremely Mild (Flat) -> Overwhelming",
-            distribution={
-                "Extremely Mild (Flat)": 0.0, "Very Mild": 0.0, "Mild": 0.0, "Mild to Medium": 0.0,
-                "Medium": 0.0, "Medium to Full": 0.0, "Full": 0.0, "Very Full": 0.0,
-                "Extra Full": 0.0, "Overwhelming": 0.0
-            }
-        )
-    })
-
 def transform_blend_data(data: Dict[str, Any], image_filename: str) -> OrderedDict:
     """Transforms raw blend data into standardized format."""
     blend_key = data["blend_name"].replace(" ", "").lower()
@@ -98,7 +45,7 @@ def transform_blend_data(data: Dict[str, Any], image_filename: str) -> OrderedDi
                 "2_star": 0,
                 "1_star": 0
             },
-            "ratings": extract_ratings_data()
+            "ratings": empty_ratings()
         })
     })
 
@@ -170,10 +117,9 @@ def process_blend_input():
     if image_path:
         # Save the image with the constructed file_basename
         image_filename = f"{file_basename}.jpg"
-        output_image_path = os.path.join(OUTPUT_DIR, image_filename)
         try:
-            resize_and_crop(image_path, output_image_path)
-            print(f"✅ Image processed and saved to: {output_image_path}")
+            for output_name in render_variants(image_path, OUTPUT_DIR, file_basename):
+                print(f"✅ Image processed and saved to: {os.path.join(OUTPUT_DIR, output_name)}")
         except Exception as e:
             print(f"Error processing image: {e}")
             image_filename = ""
@@ -186,8 +132,8 @@ def process_blend_input():
     
     # Save the JSON with the same file_basename.
     output_json_path = os.path.join(OUTPUT_DIR, f"{file_basename}.json")
-    with open(output_json_path, "w", encoding="utf-8") as outfile:
-        json.dump(transformed_data, outfile, indent=4)
+    blend_key = next(iter(transformed_data))
+    write_blend_file(output_json_path, blend_key, transformed_data[blend_key])
 
     print(f"✅ Blend data saved to: {output_json_path}")
 
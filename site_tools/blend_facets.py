@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Compressed bitmap index over the listing's facet filters.
+
+For every value of every facet (blender, country, blendType, cut, production, and each
+contents / flavoring token from blend_vocab.tokenize()) the build stores the set of blend ordinals carrying it, as a
+roaring-style bitmap: ordinals are split into chunks of 65,536 and each chunk is kept as
+whichever container is smallest - a sorted u16 array, a bitset, or (start, length - 1)
+runs. A combined filter is then a few ORs (every value a dropdown choice matches) and
+ANDs (across filters), and the count next to each remaining option is a popcount.
+
+Ordinals are positions in the blend_manifest.json built alongside, the same order as the head shard and the
+search index. The build writes assets/data/shards/facet_index.bin, which this module and
+assets/js/blend-facets.js read directly:
+
+    'TWFB' | u32 version | u32 docs | u32 values | u32 containers | u32 payload words | u32 table bytes
+    u32[values + 1] first container of each value
+    u32[containers] chunk << 2 | container kind
+    u32[containers + 1] payload offsets, in u16 words
+    u16[payload words] container payloads (padded to 4 bytes)
+    UTF-8 JSON table {"facets": [{"name", "key", "match", "values": [...]}, ...]}
+
+Each facet's "match" is how the listing compares a chosen option with stored values
+(case-insensitively): "equals", or "contains" for the dropdowns it substring-matches.
+
+    python site_tools/blend_facets.py --where country=Germany contents=Latakia --counts cut
+    python site_tools/blend_facets.py --build
+"""
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable, Tuple, NamedTuple
+from array import array
+import argparse
+import json
+import struct
+import sys
+import time
+
+from blend_corpus import ROOT_DIR, BLEND_DATA_DIR, load_blends
+from blend_index import index_entry
+from blend_ratings import published_blend
+from blend_shards import FACET_FILE
+from blend_vocab import tokenize
+
+FACET_INDEX_PATH = ROOT_DIR / "assets" / "data" / "shards" / FACET_FILE
+
+MAGIC = b"TWFB"
+VERSION = 1
+HEADER = struct.Struct("<4s6I")
+
+CHUNK_BITS = 16
+ARRAY, BITSET, RUNS = 0, 1, 2
+
+
+class Facet(NamedTuple):
+    name: str
+    key: str        # blend_index.json / head shard key
+    match: str      # "equals" or "contains"
+    tokens: bool    # multi-valued, indexed per canonical token
+
+
+# Mirrors the filters in main.html's applyFiltersToResults()
+FACETS = [
+    Facet("blender", "b", "contains", False),
+    Facet("country", "y", "contains", False),
+    Facet("blendType", "t", "equals", False),
+    Facet("cut", "ct", "equals", False),
+    Facet("production", "pr", "equals", False),
+    Facet("contents", "c", "equals", True),
+    Facet("flavoring", "f", "equals", True),
+]
+
+
+def facet_values(entry: Dict[str, Any]) -> Tuple[List[str], ...]:
+    """The values a blend_index.json entry contributes to each facet, in FACETS order."""
+    values = []
+    for facet in FACETS:
+        text = entry.get(facet.key) or ""
+        if facet.tokens:
+            values.append(tokenize(facet.name, text))
+        else:
+            values.append([text] if text else [])
+    return tuple(values)
+
+
+def _runs(lows: List[int]) -> List[Tuple[int, int]]:
+    runs = []
+    for low in lows:
+        if runs and runs[-1][1] == low - 1:
+            runs[-1][1] = low
+        else:
+            runs.append([low, low])
+    return [(start, end - start) for start, end in runs]
+
+
+def encode_containers(ordinals: List[int]) -> List[Tuple[int, int, List[int]]]:
+    """(chunk, kind, u16 payload) for each chunk of a sorted ordinal list, smallest kind first."""
+    chunks: Dict[int, List[int]] = {}
+    for ordinal in ordinals:
+        chunks.setdefault(ordinal >> CHUNK_BITS, []).append(ordinal & 0xffff)
+    containers = []
+    for chunk, lows in chunks.items():
+        runs = _runs(lows)
+        words = (lows[-1] >> 4) + 1
+        sizes = {ARRAY: len(lows), RUNS: 2 * len(runs), BITSET: words}
+        kind = min(sizes, key=lambda k: (sizes[k], k))
+        if kind == ARRAY:
+            payload = lows
+        elif kind == RUNS:
+            payload = [value for run in runs for value in run]
+        else:
+            bitset = [0] * words
+            for low in lows:
+                bitset[low >> 4] |= 1 << (low & 15)
+            payload = bitset
+        containers.append((chunk, kind, payload))
+    return containers
+
+
+def build_facet_index(rows: Iterable[Tuple[List[str], ...]]) -> bytes:
+    """Pack facet_values() tuples, in blend ordinal order, into the index."""
+    postings: List[Dict[str, List[int]]] = [{} for _ in FACETS]
+    docs = 0
+    for ordinal, row in enumerate(rows):
+        docs += 1
+        for by_value, values in zip(postings, row):
+            for value in values:
+                by_value.setdefault(value, []).append(ordinal)
+
+    value_starts = array("I", [0])
+    keys = array("I")
+    offsets = array("I", [0])
+    payload = array("H")
+    table = []
+    for facet, by_value in zip(FACETS, postings):
+        values = sorted(by_value)
+        for value in values:
+            for chunk, kind, words in encode_containers(by_value[value]):
+                keys.append(chunk << 2 | kind)
+                payload.extend(words)
+                offsets.append(len(payload))
+            value_starts.append(len(keys))
+        table.append({"name": facet.name, "key": facet.key, "match": facet.match, "values": values})
+
+    for arr in (value_starts, keys, offsets, payload):
+        if sys.byteorder != "little":
+            arr.byteswap()
+    table_bytes = json.dumps({"facets": table}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    payload_bytes = payload.tobytes()
+    return b"".join([
+        HEADER.pack(MAGIC, VERSION, docs, len(value_starts) - 1, len(keys), len(payload), len(table_bytes)),
+        value_starts.tobytes(),
+        keys.tobytes(),
+        offsets.tobytes(),
+        payload_bytes + b"\0" * (-len(payload_bytes) % 4),
+        table_bytes,
+    ])
+
+
+def popcount(bits: int) -> int:
+    return bits.bit_count()
+
+
+class FacetIndex:
+    """
+    Read-only view over a packed facet index. Bitmaps are handed out as Python ints with
+    bit i set for blend ordinal i, so AND/OR/popcount are the int operators.
+    """
+
+    def __init__(self, data: bytes):
+        magic, version, docs, n_values, n_containers, n_words, table_len = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a TabacWiki facet index (or an unsupported version)")
+        pos = HEADER.size
+        self.value_starts = self._array("I", data, pos, n_values + 1)
+        pos += (n_values + 1) * 4
+        self.keys = self._array("I", data, pos, n_containers)
+        pos += n_containers * 4
+        self.offsets = self._array("I", data, pos, n_containers + 1)
+        pos += (n_containers + 1) * 4
+        self.payload = self._array("H", data, pos, n_words)
+        pos += n_words * 2 + (-(n_words * 2) % 4)
+        table = json.loads(data[pos:pos + table_len].decode("utf-8"))
+
+        self.size = docs
+        self.all = (1 << docs) - 1
+        self.facets: Dict[str, Dict[str, Any]] = {}
+        base = 0
+        for facet in table["facets"]:
+            self.facets[facet["name"]] = dict(facet, base=base)
+            base += len(facet["values"])
+        self._bitmaps: Dict[int, int] = {}
+
+    @staticmethod
+    def _array(typecode: str, data: bytes, pos: int, count: int) -> array:
+        arr = array(typecode)
+        arr.frombytes(data[pos:pos + count * arr.itemsize])
+        if sys.byteorder != "little":
+            arr.byteswap()
+        return arr
+
+    @classmethod
+    def load(cls, path: Path = FACET_INDEX_PATH) -> "FacetIndex":
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _decode(self, value_index: int) -> int:
+        bits = self._bitmaps.get(value_index)
+        if bits is not None:
+            return bits
+        bits = 0
+        for i in range(self.value_starts[value_index], self.value_starts[value_index + 1]):
+            chunk, kind = self.keys[i] >> 2, self.keys[i] & 3
+            words = self.payload[self.offsets[i]:self.offsets[i + 1]]
+            if kind == ARRAY:
+                buffer = bytearray((words[-1] >> 3) + 1)
+                for low in words:
+                    buffer[low >> 3] |= 1 << (low & 7)
+                container = int.from_bytes(buffer, "little")
+            elif kind == BITSET:
+                if sys.byteorder != "little":
+                    words = array("H", words)
+                    words.byteswap()
+                container = int.from_bytes(words.tobytes(), "little")
+            else:
+                container = 0
+                for start, length in zip(words[::2], words[1::2]):
+                    container |= ((1 << (length + 1)) - 1) << start
+            bits |= container << (chunk << CHUNK_BITS)
+        self._bitmaps[value_index] = bits
+        return bits
+
+    def values(self, facet: str) -> List[str]:
+        return self.facets[facet]["values"]
+
+    def value_bitmaps(self, facet: str) -> List[Tuple[str, int]]:
+        """(stored value, blends storing it) for every value of a facet."""
+        info = self.facets[facet]
+        return [(value, self._decode(info["base"] + i)) for i, value in enumerate(info["values"])]
+
+    def bitmap(self, facet: str, value: str) -> int:
+        """Blends storing exactly this value (0 if none do)."""
+        info = self.facets[facet]
+        try:
+            return self._decode(info["base"] + info["values"].index(value))
+        except ValueError:
+            return 0
+
+    def matching_values(self, facet: str, option: str) -> List[str]:
+        """Stored values the listing treats as matching a chosen option."""
+        info = self.facets[facet]
+        wanted = option.lower()
+        if info["match"] == "contains":
+            return [value for value in info["values"] if wanted in value.lower()]
+        return [value for value in info["values"] if value.lower() == wanted]
+
+    def option_bitmap(self, facet: str, option: str) -> int:
+        """Blends a chosen option lets through: the OR of every value it matches."""
+        info = self.facets[facet]
+        bits = 0
+        for value in self.matching_values(facet, option):
+            bits |= self._decode(info["base"] + info["values"].index(value))
+        return bits
+
+    def query(self, terms: Iterable[Tuple[str, str]], within: Optional[int] = None) -> int:
+        """Blends passing every (facet, option) term (ANDed), optionally restricted to `within`."""
+        bits = self.all if within is None else within
+        for facet, option in terms:
+            bits &= self.option_bitmap(facet, option)
+            if not bits:
+                break
+        return bits
+
+    def option_counts(self, facet: str, options: Iterable[str], terms: List[Tuple[str, str]],
+                      within: Optional[int] = None, exclusive: bool = True) -> Dict[str, int]:
+        """
+        How many blends each option would leave on top of the current terms. For exclusive
+        (single-choice) facets the facet's own term is dropped first, so every option is
+        counted against the other filters only.
+        """
+        if exclusive:
+            terms = [term for term in terms if term[0] != facet]
+        base = self.query(terms, within)
+        return {option: popcount(self.option_bitmap(facet, option) & base) for option in options}
+
+    @staticmethod
+    def ordinals(bits: int) -> List[int]:
+        result = []
+        while bits:
+            low = bits & -bits
+            result.append(low.bit_length() - 1)
+            bits ^= low
+        return result
+
+
+def build_from_corpus(blend_dir: Path = BLEND_DATA_DIR) -> bytes:
+    """Build an index straight from blend_data/ (the site build uses its own incremental path)."""
+    records = load_blends(blend_dir)
+    return build_facet_index(facet_values(index_entry(published_blend(r.data))) for r in records.values())
+
+
+def parse_terms(pairs: List[str]) -> List[Tuple[str, str]]:
+    terms = []
+    for pair in pairs:
+        facet, sep, option = pair.partition("=")
+        if not sep or facet not in {f.name for f in FACETS}:
+            raise ValueError(f"expected FACET=OPTION with FACET one of {', '.join(f.name for f in FACETS)}; got {pair!r}")
+        terms.append((facet, option))
+    return terms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the blend facet bitmap index.")
+    parser.add_argument("--where", nargs="+", metavar="FACET=OPTION", default=[],
+                        help="filters, ANDed the way main.html combines them")
+    parser.add_argument("--counts", metavar="FACET", help="print how many blends each value of FACET would leave")
+    parser.add_argument("--limit", type=int, default=20, help="blends to list (default 20)")
+    parser.add_argument("--index", type=Path, default=FACET_INDEX_PATH)
+    parser.add_argument("--build", action="store_true", help="(re)build the index from blend_data/ first")
+    args = parser.parse_args()
+
+    if args.build:
+        args.index.parent.mkdir(parents=True, exist_ok=True)
+        args.index.write_bytes(build_from_corpus())
+        print(f"Facet index written to {args.index} ({args.index.stat().st_size / 1024:.0f} KB)")
+        if not args.where and not args.counts:
+            return
+
+    try:
+        terms = parse_terms(args.where)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    index = FacetIndex.load(args.index)
+    start = time.perf_counter()
+    bits = index.query(terms)
+    counts = None
+    if args.counts:
+        counts = index.option_counts(args.counts, index.values(args.counts), terms,
+                                     exclusive=args.counts != "contents")
+    elapsed = (time.perf_counter() - start) * 1000
+
+    try:
+        # The manifest written by the same build (assets/data/ for the default index)
+        with open(args.index.parent.parent / "blend_manifest.json", "r", encoding="utf-8") as f:
+            filenames = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        filenames = None
+    ordinals = index.ordinals(bits)
+    for ordinal in ordinals[:args.limit]:
+        print(filenames[ordinal] if filenames and len(filenames) == len(index) else ordinal)
+    if counts:
+        for value, count in sorted(counts.items(), key=lambda item: -item[1]):
+            if count:
+                print(f"  {count:>6}  {value}")
+    print(f"\n{len(ordinals)} of {len(index)} blends match, in {elapsed:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
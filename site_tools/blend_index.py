@@ -0,0 +1,102 @@
+from typing import Dict, Any, Optional
+import json
+
+from blend_ratings import derive_profile
+
+# Short keys used by assets/data/blend_index.json for each rating profile's levels
+PROFILE_ABBREVIATIONS = {
+    "strength": ("s", "Medium", {
+        "Extremely Mild": "EM", "Very Mild": "VM", "Mild": "M", "Mild to Medium": "MM", "Medium": "Med",
+        "Medium to Strong": "MS", "Strong": "S", "Very Strong": "VS", "Extremely Strong": "ES", "Overwhelming": "O"
+    }),
+    "flavoring": ("f", "Medium", {
+        "None Detected": "ND", "Extremely Mild": "EM", "Very Mild": "VM", "Mild": "M", "Mild to Medium": "MM",
+        "Medium": "Med", "Medium to Strong": "MS", "Strong": "S", "Very Strong": "VS", "Extra Strong": "ES"
+    }),
+    "roomNote": ("r", "Very Pleasant", {
+        "Unnoticeable": "UN", "Pleasant": "P", "Very Pleasant": "VP", "Pleasant to Tolerable": "PT",
+        "Tolerable": "T", "Tolerable to Strong": "TS", "Strong": "S", "Very Strong": "VS",
+        "Extra Strong": "ES", "Overwhelming": "O"
+    }),
+    "taste": ("t", "Mild to Medium", {
+        "Extremely Mild (Flat)": "EMF", "Very Mild": "VM", "Mild": "M", "Mild to Medium": "MM",
+        "Medium": "Med", "Medium to Full": "MF", "Full": "F", "Very Full": "VF",
+        "Extra Full": "EF", "Overwhelming": "O"
+    }),
+}
+
+# blend_metadata.json key -> blend field, in output order
+METADATA_FIELDS = {
+    "blenders": "blender",
+    "blendedBy": "blendedBy",
+    "manufacturedBy": "manufacturedBy",
+    "countries": "country",
+    "blendTypes": "blendType",
+    "contents": "contents",
+    "cuts": "cut",
+    "packagings": "packaging",
+    "flavorings": "flavoring",
+    "productionTypes": "production",
+}
+
+
+def js_number(value: Any) -> Any:
+    """Render whole floats the way JSON.stringify does (100.0 -> 100)."""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def compact_profile(profile: Optional[Dict[str, Any]], default_level: str,
+                    abbreviations: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """Compact one ratings profile into {l: level, d: {abbrev: value}}."""
+    if not profile:
+        return None
+    if "counts" in profile:
+        profile = derive_profile(profile)
+    distribution = profile.get("distribution") or {}
+    return {
+        "l": profile.get("level") or default_level,
+        "d": {abbreviations.get(k, k): js_number(v) for k, v in distribution.items()},
+    }
+
+
+def index_entry(blend: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the compact blend_index.json entry for one blend."""
+    ratings = blend.get("ratings") or {}
+    distribution = blend.get("ratingDistribution")
+    return {
+        "n": blend.get("name") or "",
+        "b": blend.get("blender") or "",
+        "bb": blend.get("blendedBy") or "",
+        "mb": blend.get("manufacturedBy") or "",
+        "t": blend.get("blendType") or "",
+        "c": blend.get("contents") or "",
+        "ct": blend.get("cut") or "",
+        "y": blend.get("country") or "",
+        "p": blend.get("packaging") or "",
+        "f": blend.get("flavoring") or "",
+        "pr": blend.get("production") or "",
+        "r": js_number(blend.get("averageRating") or 0),
+        "mr": js_number(blend.get("maxRating") or 5),
+        "rc": blend.get("reviewCount") or 0,
+        "rd": {
+            star: (distribution.get(f"{star}_star") or 0) if distribution else 0
+            # Integer-like keys come out ascending from JSON.stringify; keep that order
+            for star in ("1", "2", "3", "4")
+        },
+        "rt": {
+            short: compact_profile(ratings.get(profile), default_level, abbreviations)
+            for profile, (short, default_level, abbreviations) in PROFILE_ABBREVIATIONS.items()
+        },
+    }
+
+
+def metadata_values(blend: Dict[str, Any]) -> tuple:
+    """Values this blend contributes to each blend_metadata.json list (falsy values skipped)."""
+    return tuple(blend.get(field) or None for field in METADATA_FIELDS.values())
+
+
+def dump_index_fragment(entry: Dict[str, Any]) -> str:
+    """Serialise an index entry as it appears nested one level deep in blend_index.json."""
+    return json.dumps(entry, indent=2, ensure_ascii=False).replace("\n", "\n  ")
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Packed copy of blend_data/ for fast whole-corpus reads and random access.
+
+The pack is one data file holding every blend file's exact bytes back to back (each
+followed by a newline), plus a JSON sidecar index:
+
+    {"version": 1, "size": <data file size>,
+     "files": {filename: [offset, length, mtime_ns, size, sha1, blend_key], ...}}
+
+PackedCorpus memory-maps the data file and decodes records only when asked for them, so
+one blend costs a dictionary lookup and a slice instead of a directory walk, and the
+whole corpus costs one open instead of 8,000. Because the bytes are the files' own, a
+record read from the pack is indistinguishable from one read from disk; read_raw() serves
+each file from the pack when its (mtime, size) still matches and from disk otherwise.
+
+update_pack() keeps the pack current incrementally: new and edited files are appended to
+the data file and the index is rewritten to point at them, so a one-blend edit costs one
+file's bytes rather than a copy of the corpus. The bytes they replace stay behind as dead
+space until it reaches DEAD_SHARE of the file (or --force), when the pack is rewritten
+compactly. Both files live next to the other build caches in site_tools_output/cache/.
+
+    python site_tools/blend_pack.py                  # bring the pack up to date
+    python site_tools/blend_pack.py --get "X - Y"    # print one blend from the pack
+    python site_tools/blend_pack.py --key bostonian  # look a blend up by its key
+"""
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import sys
+import time
+
+from blend_corpus import (BLEND_DATA_DIR, BlendRecord, list_blend_files, parse_blend, unwrap_blend,
+                          cache_path_for)
+
+PACK_VERSION = 1
+
+# Rewrite the pack compactly once this share of the data file is superseded records
+DEAD_SHARE = 0.25
+
+# Index entry columns
+OFFSET, LENGTH, MTIME, SIZE, SHA1, KEY = range(6)
+
+
+@lru_cache(maxsize=None)
+def _pack_paths(blend_dir: str) -> Tuple[Path, Path]:
+    base = cache_path_for(Path(blend_dir), "blend_pack")
+    return base.with_suffix(".pack"), base.with_suffix(".idx.json")
+
+
+def pack_paths(blend_dir: Path = BLEND_DATA_DIR) -> Tuple[Path, Path]:
+    """(data file, index file) of the pack for a blend directory."""
+    return _pack_paths(str(blend_dir))
+
+
+def read_index(index_path: Path) -> Optional[Dict[str, Any]]:
+    """Load a pack index, or None if it is missing, unreadable or from another version."""
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return index if isinstance(index, dict) and index.get("version") == PACK_VERSION else None
+
+
+class PackedCorpus:
+    """Read-only, memory-mapped view of a pack."""
+
+    def __init__(self, blend_dir: Path = BLEND_DATA_DIR):
+        self.blend_dir = Path(blend_dir)
+        data_path, index_path = pack_paths(self.blend_dir)
+        index = read_index(index_path)
+        if index is None:
+            raise FileNotFoundError(f"No pack for {self.blend_dir}; run site_tools/blend_pack.py")
+        self.files: Dict[str, list] = index["files"]
+        self.size = index["size"]
+        with open(data_path, 'rb') as f:
+            # Bytes past the indexed size are an append whose index was never written
+            if os.fstat(f.fileno()).st_size < self.size:
+                raise ValueError(f"{data_path} does not match its index; rebuild the pack")
+            self._data = mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_READ) if self.size else b""
+        self._keys: Optional[Dict[str, List[str]]] = None
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self.files
+
+    def __iter__(self) -> Iterator[BlendRecord]:
+        for filename in self.files:
+            yield self.get(filename)
+
+    def dead_bytes(self) -> int:
+        """Bytes of the data file no index entry points at any more."""
+        return self.size - sum(entry[LENGTH] + 1 for entry in self.files.values())
+
+    def is_fresh(self, filename: str, stat: Tuple[int, int]) -> bool:
+        """Does the packed copy still match a file with this (mtime_ns, size)?"""
+        entry = self.files.get(filename)
+        return entry is not None and (entry[MTIME], entry[SIZE]) == tuple(stat)
+
+    def raw(self, filename: str) -> bytes:
+        entry = self.files[filename]
+        return self._data[entry[OFFSET]:entry[OFFSET] + entry[LENGTH]]
+
+    def get(self, filename: str) -> BlendRecord:
+        """Decode one blend (expanded to the dense record, as read_blend_file would)."""
+        blend_key, blend_data = parse_blend(self.raw(filename).decode('utf-8'))
+        return BlendRecord(filename, blend_key, blend_data)
+
+    def by_key(self, blend_key: str) -> List[BlendRecord]:
+        """Every blend stored under a top-level key (keys are not guaranteed unique)."""
+        if self._keys is None:
+            self._keys = {}
+            for filename, entry in self.files.items():
+                self._keys.setdefault(entry[KEY], []).append(filename)
+        return [self.get(filename) for filename in self._keys.get(blend_key, [])]
+
+
+# One open pack per process, so pool workers don't re-read the index for every chunk
+_open_packs: Dict[str, Tuple[Tuple[int, int], Optional[PackedCorpus]]] = {}
+
+
+def open_pack(blend_dir: Path = BLEND_DATA_DIR) -> Optional[PackedCorpus]:
+    """The pack for blend_dir, or None if there is none; reopened when the pack is rebuilt."""
+    _, index_path = pack_paths(blend_dir)
+    try:
+        st = os.stat(index_path)
+        version = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+    cached = _open_packs.get(str(index_path))
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    try:
+        pack = PackedCorpus(blend_dir)
+    except (OSError, ValueError):
+        pack = None
+    if cached is not None and cached[1] is not None:
+        cached[1].close()
+    _open_packs[str(index_path)] = (version, pack)
+    return pack
+
+
+def read_raw(blend_dir: Path, filename: str) -> Tuple[bytes, Tuple[int, int]]:
+    """A blend file's bytes and (mtime_ns, size): from the pack when it is up to date, else from disk."""
+    path = os.path.join(blend_dir, filename)
+    st = os.stat(path)
+    stat = (st.st_mtime_ns, st.st_size)
+    pack = open_pack(blend_dir)
+    if pack is not None and pack.is_fresh(filename, stat):
+        return pack.raw(filename), stat
+    with open(path, 'rb') as f:
+        return f.read(), stat
+
+
+def _read_record(blend_dir: Path, filename: str) -> Tuple[bytes, list]:
+    """A blend file's bytes and its index entry (offset left at 0)."""
+    with open(blend_dir / filename, 'rb') as f:
+        raw = f.read()
+        # The stat of what was actually read, in case the file changed since the listing
+        st = os.fstat(f.fileno())
+    blend_key, _ = unwrap_blend(json.loads(raw.decode('utf-8')))
+    return raw, [0, len(raw), st.st_mtime_ns, st.st_size, hashlib.sha1(raw).hexdigest(), blend_key]
+
+
+def _write_index(index_path: Path, size: int, files: Dict[str, list]) -> None:
+    index = {"version": PACK_VERSION, "size": size, "files": files}
+    tmp_index = index_path.with_name(index_path.name + ".tmp")
+    with open(tmp_index, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_index, index_path)
+
+
+def update_pack(blend_dir: Path = BLEND_DATA_DIR, force: bool = False) -> Dict[str, Any]:
+    """
+    Bring the pack in line with blend_dir, reading only new or changed files: appended
+    to the pack, or the whole pack rewritten when forced or when too much of it is dead.
+    """
+    blend_dir = Path(blend_dir)
+    data_path, index_path = pack_paths(blend_dir)
+    old = open_pack(blend_dir)
+    stats = list_blend_files(blend_dir)
+
+    fresh = set()
+    if old is not None and not force:
+        fresh = {filename for filename, stat in stats.items() if old.is_fresh(filename, stat)}
+    if old is not None and not force and len(fresh) == len(stats) == len(old):
+        return {"blends": len(stats), "read": 0, "removed": 0, "errors": []}
+
+    errors = []
+    changed = {}
+    for filename in stats:
+        if filename in fresh:
+            continue
+        try:
+            changed[filename] = _read_record(blend_dir, filename)
+        except Exception as e:
+            errors.append((filename, str(e)))
+
+    removed = len(old.files.keys() - stats.keys()) if old is not None else 0
+    summary = {"blends": len(fresh) + len(changed), "read": len(changed), "removed": removed, "errors": errors}
+
+    if old is not None and not force:
+        superseded = sum(old.files[filename][LENGTH] + 1 for filename in old.files if filename not in fresh)
+        appended = sum(len(raw) + 1 for raw, _ in changed.values())
+        if old.dead_bytes() + superseded <= DEAD_SHARE * (old.size + appended):
+            # Listing order, with the changed entries filled in below
+            files = {filename: old.files.get(filename) for filename in stats if filename in fresh or filename in changed}
+            offset = old.size
+            old.close()
+            _open_packs.pop(str(index_path), None)
+            with open(data_path, 'r+b') as out:
+                # Drop the tail of an append that never got its index
+                out.truncate(offset)
+                out.seek(offset)
+                for filename, (raw, entry) in changed.items():
+                    out.write(raw)
+                    out.write(b"\n")
+                    entry[OFFSET] = offset
+                    files[filename] = entry
+                    offset += len(raw) + 1
+                out.flush()
+                os.fsync(out.fileno())
+            # Index last: until it is replaced, readers only see the records it already indexed
+            _write_index(index_path, offset, files)
+            return summary
+
+    files = {}
+    offset = 0
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_data = data_path.with_name(data_path.name + ".tmp")
+    with open(tmp_data, 'wb') as out:
+        for filename in stats:
+            if filename in fresh:
+                raw, entry = old.raw(filename), list(old.files[filename])
+            elif filename in changed:
+                raw, entry = changed[filename]
+            else:
+                continue
+            out.write(raw)
+            out.write(b"\n")
+            entry[OFFSET] = offset
+            files[filename] = entry
+            offset += len(raw) + 1
+
+    if old is not None:
+        # Some platforms refuse to replace a file that is still mapped
+        old.close()
+        _open_packs.pop(str(index_path), None)
+
+    # Data first: a reader that sees the new index always finds a data file of the size it expects
+    os.replace(tmp_data, data_path)
+    _write_index(index_path, offset, files)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the packed blend corpus.")
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    parser.add_argument("--force", action="store_true", help="rebuild from scratch")
+    parser.add_argument("--get", metavar="NAME", help="print one blend by filename (with or without .json)")
+    parser.add_argument("--key", metavar="KEY", help="print every blend stored under this key")
+    args = parser.parse_args()
+
+    if args.get or args.key:
+        pack = open_pack(args.blend_dir)
+        if pack is None:
+            print(f"No pack for {args.blend_dir}; run without --get/--key first", file=sys.stderr)
+            sys.exit(1)
+        if args.get:
+            filename = args.get if args.get.endswith(".json") else args.get + ".json"
+            records = [pack.get(filename)] if filename in pack else []
+        else:
+            records = pack.by_key(args.key)
+        for record in records:
+            print(json.dumps({record.filename: record.data}, indent=4, ensure_ascii=False))
+        sys.exit(0 if records else 1)
+
+    start = time.perf_counter()
+    summary = update_pack(args.blend_dir, args.force)
+    elapsed = time.perf_counter() - start
+    data_path, _ = pack_paths(args.blend_dir)
+    print(f"Packed {summary['blends']} blends ({summary['read']} read, {summary['removed']} removed) "
+          f"into {data_path} in {elapsed:.2f}s")
+    for filename, error in summary["errors"]:
+        print(f"Error processing {args.blend_dir / filename}: {error}", file=sys.stderr)
+    if summary["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
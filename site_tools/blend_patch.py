@@ -0,0 +1,195 @@
+"""
+Transactional batch edits for blend files.
+
+A patch stream is JSONL, one edit per line:
+
+    {"file": "X - Y.json", "field": "description", "old": "current text", "new": "new text"}
+
+"old" is a guard: when present, the field must hold exactly that value (null for an
+absent field) at the moment the edit is applied, or the whole batch is rejected. Edits to
+the same file are applied in stream order, so a later guard sees earlier edits.
+
+Files are patched in memory (on a process pool for large batches) and nothing is written
+until every guard has passed. Each touched file is then written once to a temp file and
+renamed into place; if anything fails part-way, the files already replaced are restored.
+"""
+from functools import partial
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, NamedTuple
+import json
+
+from blend_corpus import BLEND_DATA_DIR, BlendConflict, atomic_write, blend_lock, blend_version, map_chunks, parse_blend, \
+    dump_blend_for
+from blend_pack import read_raw
+
+# Fields a patch may change; ratings and counters are owned by process_ratings.py
+EDITABLE_FIELDS = [
+    "blendedBy",
+    "manufacturedBy",
+    "production",
+    "country",
+    "blendType",
+    "contents",
+    "cut",
+    "packaging",
+    "flavoring",
+    "description",
+    "notes",
+]
+
+# Guard value meaning "the field is absent"; distinct from a patch with no guard
+ABSENT = None
+
+
+class Patch(NamedTuple):
+    line: int
+    file: str
+    field: str
+    new: Any
+    guarded: bool
+    old: Any = ABSENT
+
+
+class FileChange(NamedTuple):
+    """Result of patching one file in memory."""
+    filename: str
+    stat: Optional[Tuple[int, int]]
+    original: Optional[str]
+    patched: Optional[str]              # None when the patches left the file as it was
+    changed: List[Tuple[str, Any, Any]]  # (field, old, new) for every edit that changed a value
+    errors: List[str]
+
+
+class PatchError(Exception):
+    """The batch was rejected; `errors` lists every problem found."""
+    def __init__(self, errors: List[str]):
+        super().__init__(f"{len(errors)} patch errors")
+        self.errors = errors
+
+
+def parse_patches(lines, editable: List[str] = EDITABLE_FIELDS) -> List[Patch]:
+    """Parse a JSONL patch stream; raises PatchError listing every malformed line."""
+    patches = []
+    errors = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError as e:
+            errors.append(f"line {number}: invalid JSON ({e})")
+            continue
+        if not isinstance(entry, dict) or not {"file", "field", "new"} <= entry.keys():
+            errors.append(f"line {number}: expected an object with file, field and new")
+            continue
+        filename = Path(str(entry["file"])).name
+        if not filename.endswith(".json"):
+            filename += ".json"
+        if entry["field"] not in editable:
+            errors.append(f"line {number}: {entry['field']!r} is not an editable field")
+            continue
+        patches.append(Patch(number, filename, entry["field"], entry["new"], "old" in entry, entry.get("old")))
+    if errors:
+        raise PatchError(errors)
+    return patches
+
+
+def apply_patches(blend: Dict[str, Any], patches: List[Patch]) -> Tuple[List[Tuple[str, Any, Any]], List[str]]:
+    """Apply patches to one blend in order; returns (changes, guard failures)."""
+    changed = []
+    errors = []
+    for patch in patches:
+        current = blend.get(patch.field, ABSENT)
+        if patch.guarded and current != patch.old:
+            errors.append(f"line {patch.line}: {patch.file} {patch.field} is {current!r}, expected {patch.old!r}")
+            continue
+        if current != patch.new:
+            blend[patch.field] = patch.new
+            changed.append((patch.field, current, patch.new))
+    return changed, errors
+
+
+def _patch_chunk(blend_dir: str, filenames: List[str], patches: Dict[str, List[Patch]]) -> List[FileChange]:
+    """Worker: read and patch a chunk of files without writing anything."""
+    results = []
+    for filename in filenames:
+        try:
+            raw, stat = read_raw(blend_dir, filename)
+            original = raw.decode('utf-8')
+            blend_key, blend = parse_blend(original)
+        except FileNotFoundError:
+            lines = ", ".join(str(patch.line) for patch in patches[filename])
+            results.append(FileChange(filename, None, None, None, [], [f"line {lines}: no blend file {filename}"]))
+            continue
+        except Exception as e:
+            results.append(FileChange(filename, None, None, None, [], [f"{filename}: {e}"]))
+            continue
+        changed, errors = apply_patches(blend, patches[filename])
+        patched = dump_blend_for(blend_dir, blend_key, blend) if changed else None
+        results.append(FileChange(filename, stat, original, patched, changed, errors))
+    return results
+
+
+def plan(patches: List[Patch], blend_dir: Path = BLEND_DATA_DIR, workers: Optional[int] = None) -> List[FileChange]:
+    """Patch every touched file in memory; raises PatchError if any guard or file fails."""
+    by_file: Dict[str, List[Patch]] = {}
+    for patch in patches:
+        by_file.setdefault(patch.file, []).append(patch)
+    worker = partial(_patch_chunk, patches=by_file)
+    changes = map_chunks(worker, blend_dir, sorted(by_file), workers)
+    errors = [error for change in changes for error in change.errors]
+    if errors:
+        raise PatchError(errors)
+    return changes
+
+
+def commit(changes: List[FileChange], blend_dir: Path = BLEND_DATA_DIR) -> List[str]:
+    """
+    Write every patched file, all or nothing. Files modified since they were planned abort
+    the commit; a conflict or failure part way through puts back the files already replaced.
+    Returns the filenames written.
+    """
+    blend_dir = Path(blend_dir)
+    pending = [change for change in changes if change.patched is not None]
+
+    # Cheap first pass so a stale batch fails before anything is written
+    errors = [f"{change.filename} changed on disk while the batch was being prepared"
+              for change in pending if blend_version(blend_dir / change.filename) != change.stat]
+    if errors:
+        raise PatchError(errors)
+
+    replaced = []
+    try:
+        for change in pending:
+            file_path = blend_dir / change.filename
+            # Checked again under the lock: a rating sync may have written it since
+            with blend_lock(file_path):
+                if blend_version(file_path) != change.stat:
+                    raise BlendConflict(f"{change.filename} changed on disk while the batch was being written")
+                atomic_write(file_path, change.patched)
+                replaced.append((change, blend_version(file_path)))
+    except (BlendConflict, OSError) as e:
+        for done, written in replaced:
+            with blend_lock(blend_dir / done.filename):
+                # Only undo our own write, not a newer one made after it
+                if blend_version(blend_dir / done.filename) == written:
+                    atomic_write(blend_dir / done.filename, done.original)
+        raise PatchError([f"could not replace {change.filename}: {e}; {len(replaced)} files restored"])
+    return [change.filename for change in pending]
+
+
+def diff_summary(patches: List[Patch], changes: List[FileChange]) -> Dict[str, Any]:
+    """Counts of edits, files touched and values changed per field."""
+    per_field: Dict[str, int] = {}
+    for change in changes:
+        for field, _, _ in change.changed:
+            per_field[field] = per_field.get(field, 0) + 1
+    edits = sum(len(change.changed) for change in changes)
+    return {
+        "patches": len(patches),
+        "files": len(changes),
+        "filesChanged": sum(change.patched is not None for change in changes),
+        "edits": edits,
+        "unchanged": len(patches) - edits,
+        "fields": dict(sorted(per_field.items())),
+    }
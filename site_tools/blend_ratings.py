@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Rating profile counters for blend files.
+
+Each profile in a blend's "ratings" (strength, flavoring, roomNote, taste) stores raw
+integer counts per level:
+
+    "strength": {"scale": "Extremely Mild -> Overwhelming", "counts": {"Extremely Mild": 0, ...}}
+
+The counts are the source of truth. The displayed `level` (the most common level) and the
+`distribution` (each count as a percentage of the largest) are derived from them when the
+site data is built, so adding a rating is a single increment and replaying the same ratings
+always gives identical files.
+
+A migrated profile whose most common levels tie may also store the level the legacy file
+showed, "tiebreak": "Medium", so migrating doesn't change what the site shows. It decides
+the tie for as long as it is one of the tied levels and is dropped once a rating breaks
+the tie.
+
+    python site_tools/blend_ratings.py --migrate    # convert legacy distribution files in place
+    python site_tools/blend_ratings.py --check      # exit 1 if any file still needs migrating
+    python site_tools/blend_ratings.py --remigrate /tmp/legacy/blend_data   # redo counts from a pre-migration copy
+    python site_tools/blend_ratings.py --check --against /tmp/legacy/blend_data   # ...and levels it showed
+"""
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+import argparse
+import math
+import sys
+
+# profile -> (scale description, levels from mildest to strongest)
+PROFILE_SCALES = OrderedDict({
+    "strength": ("Extremely Mild -> Overwhelming", [
+        "Extremely Mild", "Very Mild", "Mild", "Mild to Medium", "Medium",
+        "Medium to Strong", "Strong", "Very Strong", "Extremely Strong", "Overwhelming"
+    ]),
+    "flavoring": ("None Detected -> Extra Strong", [
+        "None Detected", "Extremely Mild", "Very Mild", "Mild", "Mild to Medium",
+        "Medium", "Medium to Strong", "Strong", "Very Strong", "Extra Strong"
+    ]),
+    "roomNote": ("Unnoticeable -> Overwhelming", [
+        "Unnoticeable", "Pleasant", "Very Pleasant", "Pleasant to Tolerable", "Tolerable",
+        "Tolerable to Strong", "Strong", "Very Strong", "Extra Strong", "Overwhelming"
+    ]),
+    "taste": ("Extremely Mild (Flat) -> Overwhelming", [
+        "Extremely Mild (Flat)", "Very Mild", "Mild", "Mild to Medium", "Medium",
+        "Medium to Full", "Full", "Very Full", "Extra Full", "Overwhelming"
+    ]),
+})
+
+# ratingDistribution keys and the star value each one counts
+STAR_KEYS = ["4_star", "3half_star", "3_star", "2half_star", "2_star", "1half_star", "1_star", "half_star"]
+STAR_VALUES = [4.0, 3.5, 3.0, 2.5, 2.0, 1.5, 1.0, 0.5]
+
+# Level shown for a profile nobody has rated yet
+UNRATED_LEVEL = "0"
+
+# Larger multipliers than this are treated as drift when recovering legacy counts
+MAX_RECOVERED_COUNT = 1000
+
+
+def empty_profile(profile_type: str) -> OrderedDict:
+    """An unrated profile in the counts format."""
+    scale, levels = PROFILE_SCALES[profile_type]
+    return OrderedDict({"scale": scale, "counts": OrderedDict((level, 0) for level in levels)})
+
+
+def empty_ratings() -> OrderedDict:
+    """The ratings block of a new blend."""
+    return OrderedDict((profile_type, empty_profile(profile_type)) for profile_type in PROFILE_SCALES)
+
+
+def star_key(rating_value: float) -> str:
+    """ratingDistribution key for a 0.5-4 star rating."""
+    return STAR_KEYS[STAR_VALUES.index(float(rating_value))]
+
+
+def average_rating(rating_distribution: Dict[str, int]) -> float:
+    """Mean star rating over the star counts, rounded half up to 2 decimals as on the source site."""
+    reviews = sum(rating_distribution.get(key) or 0 for key in STAR_KEYS)
+    if not reviews:
+        return 0.0
+    stars = sum(value * (rating_distribution.get(key) or 0) for key, value in zip(STAR_KEYS, STAR_VALUES))
+    return math.floor(stars * 100 / reviews + 0.5) / 100
+
+
+def legacy_ratios(distribution: Dict[str, float]) -> Optional[Dict[str, int]]:
+    """
+    The smallest whole counts in the proportions of a legacy max-normalised (0-100)
+    distribution, or None if there are none: distributions that drifted under the old
+    re-normalising update no longer turn back into whole numbers.
+    """
+    values = [float(v or 0) for v in distribution.values()]
+    for top in range(1, MAX_RECOVERED_COUNT + 1):
+        scaled = [v * top / 100 for v in values]
+        if all(abs(s - round(s)) < 1e-6 for s in scaled):
+            return {level: int(round(s)) for level, s in zip(distribution, scaled)}
+    return None
+
+
+def counts_from_distribution(distribution: Dict[str, float], total_reviews: int = 0) -> Dict[str, int]:
+    """
+    Recover integer counts from a legacy max-normalised (0-100) distribution.
+
+    The percentages only fix the counts up to a common factor, so the counts are the
+    multiple of legacy_ratios() whose total is closest to total_reviews. Drifted
+    distributions are scaled so the counts add up to total_reviews instead.
+    """
+    values = [float(v or 0) for v in distribution.values()]
+    if not any(values):
+        return {level: 0 for level in distribution}
+
+    ratios = legacy_ratios(distribution)
+    if ratios is not None:
+        base = sum(ratios.values())
+        # Of the two multiples either side of total_reviews, the closer (ties: the smaller)
+        factor = min({max(1, total_reviews // base), max(1, -(-total_reviews // base))},
+                     key=lambda k: (abs(k * base - total_reviews), k))
+        return {level: count * factor for level, count in ratios.items()}
+
+    top = max(1, total_reviews) * 100 / sum(values)
+    return {level: max(int(round(v * top / 100)), 1 if v else 0) for level, v in zip(distribution, values)}
+
+
+def profile_counts(profile: Dict[str, Any], total_reviews: int = 0) -> Dict[str, int]:
+    """Counts for a profile in either format."""
+    if "counts" in profile:
+        return profile["counts"]
+    return counts_from_distribution(profile.get("distribution") or {}, total_reviews)
+
+
+def profile_level(counts: Dict[str, int], tiebreak: Optional[str] = None) -> str:
+    """
+    The most common level. Ties go to `tiebreak` if it is one of the tied levels, else to
+    the tied level closest to the average rating, then to the milder one.
+    """
+    top = max(counts.values(), default=0)
+    if top <= 0:
+        return UNRATED_LEVEL
+    if tiebreak is not None and counts.get(tiebreak) == top:
+        return tiebreak
+    levels = list(counts)
+    total = sum(counts.values())
+    mean = sum(i * counts[level] for i, level in enumerate(levels)) / total
+    tied = [i for i, level in enumerate(levels) if counts[level] == top]
+    return levels[min(tied, key=lambda i: (abs(i - mean), i))]
+
+
+def settle_tiebreak(profile: Dict[str, Any]) -> None:
+    """Drop a profile's stored tiebreak once it no longer decides a tie."""
+    counts = profile.get("counts") or {}
+    tiebreak = profile.get("tiebreak")
+    if tiebreak is None:
+        return
+    top = max(counts.values(), default=0)
+    if top <= 0 or counts.get(tiebreak) != top or sum(1 for count in counts.values() if count == top) < 2:
+        del profile["tiebreak"]
+
+
+def legacy_tiebreak(counts: Dict[str, int], level: Any) -> Optional[str]:
+    """The tiebreak that makes recovered counts show a legacy profile's `level`, if one is needed and can."""
+    if not isinstance(level, str) or profile_level(counts) == level:
+        return None
+    top = max(counts.values(), default=0)
+    return level if top > 0 and counts.get(level) == top else None
+
+
+def profile_distribution(counts: Dict[str, int]) -> Dict[str, float]:
+    """Each level's count as a percentage of the most common level's count (14 significant digits)."""
+    top = max(counts.values(), default=0)
+    if top <= 0:
+        return {level: 0.0 for level in counts}
+    return {level: float(f"{count * 100 / top:.14g}") for level, count in counts.items()}
+
+
+def derive_profile(profile: Dict[str, Any], total_reviews: int = 0) -> Dict[str, Any]:
+    """The published {level, scale, distribution} view of a stored profile."""
+    counts = profile_counts(profile, total_reviews)
+    return {
+        "level": profile_level(counts, profile.get("tiebreak")),
+        "scale": profile.get("scale", ""),
+        "distribution": profile_distribution(counts),
+    }
+
+
+def published_blend(blend: Dict[str, Any]) -> Dict[str, Any]:
+    """A shallow copy of a blend with its ratings replaced by their derived view."""
+    ratings = blend.get("ratings")
+    if not isinstance(ratings, dict):
+        return blend
+    total_reviews = blend.get("totalReviews") or 0
+    published = dict(blend)
+    published["ratings"] = {
+        profile_type: derive_profile(profile, total_reviews) if isinstance(profile, dict) else profile
+        for profile_type, profile in ratings.items()
+    }
+    return published
+
+
+def add_profile_rating(profile: Dict[str, Any], level: str) -> None:
+    """Record one rating at `level`."""
+    profile["counts"][level] += 1
+    settle_tiebreak(profile)
+
+
+def migrate_ratings(blend: Dict[str, Any]) -> bool:
+    """Convert a blend's legacy profiles to counts in place; returns True if anything changed."""
+    ratings = blend.get("ratings")
+    if not isinstance(ratings, dict):
+        return False
+    changed = False
+    total_reviews = blend.get("totalReviews") or 0
+    for profile_type, profile in ratings.items():
+        if not isinstance(profile, dict) or "counts" in profile:
+            continue
+        counts = profile_counts(profile, total_reviews)
+        ratings[profile_type] = OrderedDict({"scale": profile.get("scale", ""), "counts": counts})
+        tiebreak = legacy_tiebreak(counts, profile.get("level"))
+        if tiebreak is not None:
+            ratings[profile_type]["tiebreak"] = tiebreak
+        changed = True
+    return changed
+
+
+def remigrate_ratings(blend: Dict[str, Any], legacy: Dict[str, Any]) -> bool:
+    """
+    Redo what an earlier migration got wrong from the legacy record `legacy`, keeping any
+    ratings added since: counts recovered as bare legacy_ratios() are scaled up to the
+    review count, and tied profiles get the tiebreak that shows the legacy level again.
+    Running it twice changes nothing. Returns True if anything changed.
+    """
+    ratings = blend.get("ratings") or {}
+    total_reviews = legacy.get("totalReviews") or 0
+    changed = False
+    for profile_type, profile in (legacy.get("ratings") or {}).items():
+        stored = ratings.get(profile_type) or {}
+        current = stored.get("counts")
+        if not isinstance(profile, dict) or "distribution" not in profile or current is None:
+            continue
+        ratios = legacy_ratios(profile["distribution"] or {})
+        counts = counts_from_distribution(profile["distribution"], total_reviews)
+        # Still at the ratios (plus any new ratings), not yet at the recovered counts
+        if ratios is not None and any(ratios.values()) and counts != ratios \
+                and all((current.get(level) or 0) >= count for level, count in ratios.items()) \
+                and not all((current.get(level) or 0) >= count for level, count in counts.items()):
+            for level, count in counts.items():
+                current[level] = (current.get(level) or 0) + count - ratios[level]
+            changed = True
+        # Only while no rating has moved the counts since the migration
+        tiebreak = legacy_tiebreak(current, profile.get("level")) if current == counts else None
+        if tiebreak is not None and stored.get("tiebreak") != tiebreak:
+            stored["tiebreak"] = tiebreak
+            changed = True
+    return changed
+
+
+def level_changes(blend: Dict[str, Any], legacy: Dict[str, Any]) -> List[str]:
+    """
+    Profiles whose derived level differs from the level the legacy record showed,
+    among those no rating has changed since the migration.
+    """
+    ratings = blend.get("ratings") or {}
+    changes = []
+    for profile_type, profile in (legacy.get("ratings") or {}).items():
+        stored = ratings.get(profile_type) or {}
+        if not isinstance(profile, dict) or "distribution" not in profile or "counts" not in stored:
+            continue
+        if stored["counts"] != counts_from_distribution(profile["distribution"], legacy.get("totalReviews") or 0):
+            continue
+        level = derive_profile(stored)["level"]
+        if level != profile.get("level", level):
+            changes.append(f"{profile_type}: {profile.get('level')} -> {level}")
+    return changes
+
+
+def main():
+    # Imported here: blend_corpus reads files through blend_sparse, which builds on this module
+    from blend_corpus import BLEND_DATA_DIR, read_blend_file, update_blend_file
+
+    parser = argparse.ArgumentParser(description="Migrate blend rating profiles to integer counts.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--migrate", action="store_true", help="rewrite legacy files in place")
+    group.add_argument("--check", action="store_true", help="list legacy files and exit 1 if there are any")
+    group.add_argument("--remigrate", type=Path, metavar="LEGACY_DIR",
+                       help="redo counts migrated from LEGACY_DIR, a pre-migration copy of blend_data/ "
+                            "(git archive <commit> blend_data | tar -x -C <dir>)")
+    parser.add_argument("--against", type=Path, metavar="LEGACY_DIR",
+                        help="with --check, also fail if a level differs from what LEGACY_DIR showed")
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    args = parser.parse_args()
+    if args.against and not args.check:
+        parser.error("--against needs --check")
+
+    if args.remigrate:
+        redone = 0
+        for legacy_path in sorted(args.remigrate.glob("*.json")):
+            file_path = args.blend_dir / legacy_path.name
+            if not file_path.exists():
+                continue
+            legacy_data = read_blend_file(legacy_path).data
+            if update_blend_file(file_path, lambda data: remigrate_ratings(data, legacy_data)):
+                redone += 1
+        print(f"Recounted profiles in {redone} blend files")
+        return
+
+    legacy: List[str] = []
+    for file_path in sorted(args.blend_dir.glob("*.json")):
+        if args.migrate:
+            # Migrated under the blend's lock so a rating written meanwhile isn't lost
+            if update_blend_file(file_path, lambda data: bool(migrate_ratings(data))):
+                legacy.append(file_path.name)
+        elif migrate_ratings(read_blend_file(file_path).data):
+            legacy.append(file_path.name)
+
+    if args.check:
+        for filename in legacy:
+            print(filename)
+        print(f"{len(legacy)} blend files still use normalised distributions", file=sys.stderr)
+        changed_levels = 0
+        if args.against:
+            for legacy_path in sorted(args.against.glob("*.json")):
+                file_path = args.blend_dir / legacy_path.name
+                if not file_path.exists():
+                    continue
+                for change in level_changes(read_blend_file(file_path).data, read_blend_file(legacy_path).data):
+                    print(f"{file_path.name}: {change}")
+                    changed_levels += 1
+            print(f"{changed_levels} profiles show a different level than in {args.against}", file=sys.stderr)
+        sys.exit(1 if legacy or changed_levels else 0)
+    print(f"Migrated {len(legacy)} blend files")
+
+
+if __name__ == "__main__":
+    main()
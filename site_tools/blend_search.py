@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Trigram search index over blend names, blenders and the other lookup fields.
+
+The build writes it to assets/data/shards/search_index.bin as packed arrays that both
+this module and assets/js/blend-search.js read directly:
+
+    'TWSI' | u32 version | u32 docs | u32 grams | u32 postings | u32 doc table bytes
+    u16[grams] sorted trigram codes        (padded to 4 bytes)
+    u32[grams + 1] posting offsets
+    u32[postings] blend ordinals           (ascending within each gram)
+    u8[postings] field bitmask per posting (padded to 4 bytes)
+    UTF-8 JSON doc table {"fields": [...], "docs": [[filename, name, blender], ...]}
+
+Text is lowercased, accent-folded and reduced to [a-z0-9 ], so every trigram fits in a
+u16 (37 ** 3 < 65536).
+
+    python site_tools/blend_search.py "early morning"
+    python site_tools/blend_search.py --build
+"""
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable, Tuple, NamedTuple
+from array import array
+from bisect import bisect_left
+import argparse
+import json
+import math
+import struct
+import sys
+import time
+import unicodedata
+
+try:
+    import numpy as np
+except ImportError:  # scoring falls back to plain Python loops
+    np = None
+
+from blend_corpus import ROOT_DIR, BLEND_DATA_DIR, load_blends
+
+SEARCH_INDEX_PATH = ROOT_DIR / "assets" / "data" / "shards" / "search_index.bin"
+
+MAGIC = b"TWSI"
+VERSION = 1
+HEADER = struct.Struct("<4s5I")
+
+ALPHABET = " 0123456789abcdefghijklmnopqrstuvwxyz"
+_CODE = {ch: i for i, ch in enumerate(ALPHABET)}
+
+# (blend field, bit, ranking weight). blendType and contents are indexed too so the site's
+# free-text box, which also matches on them, can use the index as a prefilter.
+SEARCH_FIELDS = [
+    ("name", 1, 4.0),
+    ("blender", 2, 3.0),
+    ("blendedBy", 4, 1.5),
+    ("manufacturedBy", 8, 1.5),
+    ("flavoring", 16, 1.0),
+    ("blendType", 32, 0.5),
+    ("contents", 64, 0.5),
+]
+ALL_FIELDS = sum(bit for _, bit, _ in SEARCH_FIELDS)
+FIELD_BITS = {field: bit for field, bit, _ in SEARCH_FIELDS}
+
+# Best field weight for every possible mask, so scoring is one table lookup per posting
+_MASK_WEIGHT = [max((w for _, bit, w in SEARCH_FIELDS if mask & bit), default=0.0) for mask in range(256)]
+
+
+class SearchHit(NamedTuple):
+    filename: str
+    name: str
+    blender: str
+    score: float
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and collapse everything outside [a-z0-9] to single spaces."""
+    folded = unicodedata.normalize("NFKD", (text or "").lower())
+    chars = [ch if ch in _CODE else " " for ch in folded if not unicodedata.combining(ch)]
+    return " ".join("".join(chars).split())
+
+
+def trigram_codes(normalized: str, pad: bool = True) -> List[int]:
+    """u16 codes of every trigram in an already-normalized string (padded with word boundaries)."""
+    text = f" {normalized} " if pad and normalized else normalized
+    return [
+        _CODE[text[i]] * 1369 + _CODE[text[i + 1]] * 37 + _CODE[text[i + 2]]
+        for i in range(len(text) - 2)
+    ]
+
+
+def doc_grams(blend: Dict[str, Any]) -> List[int]:
+    """A blend's trigrams packed as (code << 8 | field mask), sorted by code."""
+    masks = {}
+    for field, bit, _ in SEARCH_FIELDS:
+        for code in trigram_codes(normalize(blend.get(field) or "")):
+            masks[code] = masks.get(code, 0) | bit
+    return sorted(code << 8 | mask for code, mask in masks.items())
+
+
+def build_search_index(docs: Iterable[Tuple[str, str, str, List[int]]]) -> bytes:
+    """Pack (filename, name, blender, doc_grams) tuples, in blend ordinal order, into the index."""
+    doc_table = []
+    packed_lists = []
+    for filename, name, blender, packed in docs:
+        doc_table.append([filename, name, blender])
+        packed_lists.append(packed)
+
+    if np is not None:
+        grams, offsets, doc_ids, masks = _postings_numpy(packed_lists)
+    else:
+        grams, offsets, doc_ids, masks = _postings_python(packed_lists)
+
+    table_bytes = json.dumps({"fields": [f for f, _, _ in SEARCH_FIELDS], "docs": doc_table},
+                             ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    parts = [
+        HEADER.pack(MAGIC, VERSION, len(doc_table), len(grams) // 2, len(doc_ids) // 4, len(table_bytes)),
+        _pad4(grams),
+        offsets,
+        doc_ids,
+        _pad4(masks),
+        table_bytes,
+    ]
+    return b"".join(parts)
+
+
+def _postings_numpy(packed_lists: List[List[int]]) -> Tuple[bytes, bytes, bytes, bytes]:
+    """Sort every (gram, blend) pair at once; returns little-endian grams/offsets/ids/masks."""
+    lengths = np.fromiter((len(p) for p in packed_lists), dtype=np.int64, count=len(packed_lists))
+    packed = np.fromiter((v for p in packed_lists for v in p), dtype=np.int64, count=int(lengths.sum()))
+    ordinals = np.repeat(np.arange(len(packed_lists), dtype=np.int64), lengths)
+    # gram code in the high bits, then blend ordinal, then the field mask
+    keys = np.sort((packed >> 8) << 40 | ordinals << 8 | (packed & 0xff))
+    codes = keys >> 40
+    grams, starts = np.unique(codes, return_index=True)
+    offsets = np.append(starts, len(keys))
+    return (grams.astype("<u2").tobytes(), offsets.astype("<u4").tobytes(),
+            ((keys >> 8) & 0xffffffff).astype("<u4").tobytes(), (keys & 0xff).astype("u1").tobytes())
+
+
+def _postings_python(packed_lists: List[List[int]]) -> Tuple[bytes, bytes, bytes, bytes]:
+    postings_by_code = {}
+    for ordinal, packed in enumerate(packed_lists):
+        for value in packed:
+            postings_by_code.setdefault(value >> 8, []).append(ordinal << 8 | (value & 0xff))
+
+    grams = array("H", sorted(postings_by_code))
+    offsets = array("I", [0])
+    doc_ids = array("I")
+    masks = bytearray()
+    for code in grams:
+        for value in postings_by_code[code]:
+            doc_ids.append(value >> 8)
+            masks.append(value & 0xff)
+        offsets.append(len(doc_ids))
+    for arr in (grams, offsets, doc_ids):
+        if sys.byteorder != "little":
+            arr.byteswap()
+    return grams.tobytes(), offsets.tobytes(), doc_ids.tobytes(), bytes(masks)
+
+
+def _pad4(data: bytes) -> bytes:
+    return data + b"\0" * (-len(data) % 4)
+
+
+class SearchIndex:
+    """Read-only view over a packed search index."""
+
+    def __init__(self, data: bytes):
+        magic, version, n_docs, n_grams, n_postings, table_len = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a TabacWiki search index (or an unsupported version)")
+        pos = HEADER.size
+        self.grams = self._array("H", data, pos, n_grams)
+        pos += n_grams * 2 + (-(n_grams * 2) % 4)
+        self.offsets = self._array("I", data, pos, n_grams + 1)
+        pos += (n_grams + 1) * 4
+        self.doc_ids = self._array("I", data, pos, n_postings)
+        pos += n_postings * 4
+        self.masks = self._array("B", data, pos, n_postings)
+        pos += n_postings + (-n_postings % 4)
+        table = json.loads(data[pos:pos + table_len].decode("utf-8"))
+        self.docs = table["docs"]
+        self._names = [normalize(doc[1]) for doc in self.docs]
+        if np is not None:
+            self._weights = np.array(_MASK_WEIGHT, dtype=np.float32)
+
+    @staticmethod
+    def _array(typecode: str, data: bytes, pos: int, count: int):
+        size = array(typecode).itemsize
+        chunk = data[pos:pos + count * size]
+        if np is not None:
+            return np.frombuffer(chunk, dtype=np.dtype(typecode).newbyteorder("<"))
+        arr = array(typecode)
+        arr.frombytes(chunk)
+        if sys.byteorder != "little":
+            arr.byteswap()
+        return arr
+
+    @classmethod
+    def load(cls, path: Path = SEARCH_INDEX_PATH) -> "SearchIndex":
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def _postings(self, code: int):
+        if np is not None:
+            i = int(np.searchsorted(self.grams, code))
+        else:
+            i = bisect_left(self.grams, code)
+        if i == len(self.grams) or self.grams[i] != code:
+            return None
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self.doc_ids[start:end], self.masks[start:end]
+
+    def candidates(self, query: str, fields: int = ALL_FIELDS) -> Optional[set]:
+        """
+        Ordinals of blends whose `fields` contain every trigram of the query.
+
+        A superset of the blends whose raw field text contains the query, so callers can
+        verify substrings on just these. Returns None when the query is too short to filter.
+        """
+        codes = sorted(set(trigram_codes(normalize(query), pad=False)))
+        if not codes:
+            return None
+        lists = []
+        for code in codes:
+            postings = self._postings(code)
+            if postings is None:
+                return set()
+            lists.append(postings)
+        lists.sort(key=lambda p: len(p[0]))
+        result = None
+        for ids, masks in lists:
+            if np is not None:
+                matched = ids[(masks & fields) != 0]
+                result = matched if result is None else np.intersect1d(result, matched, assume_unique=True)
+            else:
+                matched = {d for d, m in zip(ids, masks) if m & fields}
+                result = matched if result is None else result & matched
+            if len(result) == 0:
+                break
+        return {int(d) for d in result}
+
+    def search(self, query: str, limit: int = 20, fields: int = ALL_FIELDS,
+               min_match: float = 0.5) -> List[SearchHit]:
+        """Ranked lookup: blends sharing at least min_match of the query's trigrams, best first."""
+        normalized = normalize(query)
+        codes = sorted(set(trigram_codes(normalized)))
+        if not normalized:
+            return []
+        if len(normalized) < 2:
+            # Too short for meaningful trigrams: rank name prefixes directly
+            ordinals = [i for i, name in enumerate(self._names) if name.startswith(normalized)]
+            scores = {i: 1.0 for i in ordinals}
+        else:
+            scores = self._score(codes, fields, max(1, math.ceil(min_match * len(codes))))
+
+        hits = []
+        for ordinal, base in scores.items():
+            name = self._names[ordinal]
+            boost = 3.0 if name == normalized else 2.0 if name.startswith(normalized) else \
+                1.0 if normalized in name else 0.0
+            filename, display_name, blender = self.docs[ordinal]
+            hits.append(SearchHit(filename, display_name, blender, round(base + boost, 4)))
+        hits.sort(key=lambda h: (-h.score, h.name.lower(), h.filename))
+        return hits[:limit]
+
+    def _score(self, codes: List[int], fields: int, threshold: int) -> Dict[int, float]:
+        """Per-blend score (average best field weight per matched trigram) above the threshold."""
+        found = [p for p in (self._postings(code) for code in codes) if p is not None]
+        if not found:
+            return {}
+        if np is not None:
+            ids = np.concatenate([p[0] for p in found])
+            masks = np.concatenate([p[1] for p in found]) & fields
+            keep = masks != 0
+            ids, masks = ids[keep], masks[keep]
+            weights = self._weights[masks]
+            totals = np.bincount(ids, weights=weights, minlength=len(self.docs))
+            counts = np.bincount(ids, minlength=len(self.docs))
+            ordinals = np.nonzero(counts >= threshold)[0]
+            # Boosts only reorder near the top; keep the candidate set bounded
+            if len(ordinals) > 500:
+                ordinals = ordinals[np.argpartition(-totals[ordinals], 500)[:500]]
+            return {int(i): float(totals[i]) / len(codes) for i in ordinals}
+
+        totals, counts = {}, {}
+        for ids, masks in found:
+            for doc, mask in zip(ids, masks):
+                mask &= fields
+                if mask:
+                    totals[doc] = totals.get(doc, 0.0) + _MASK_WEIGHT[mask]
+                    counts[doc] = counts.get(doc, 0) + 1
+        ranked = sorted((doc for doc, count in counts.items() if count >= threshold),
+                        key=lambda doc: -totals[doc])[:500]
+        return {doc: totals[doc] / len(codes) for doc in ranked}
+
+
+def build_from_corpus(blend_dir: Path = BLEND_DATA_DIR) -> bytes:
+    """Build an index straight from blend_data/ (the site build uses its own incremental path)."""
+    records = load_blends(blend_dir)
+    return build_search_index(
+        (r.filename, r.data.get("name") or "", r.data.get("blender") or "", doc_grams(r.data))
+        for r in records.values()
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the blend search index.")
+    parser.add_argument("query", nargs="?", help="text to search for")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--index", type=Path, default=SEARCH_INDEX_PATH)
+    parser.add_argument("--field", action="append", choices=list(FIELD_BITS),
+                        help="restrict to these fields (repeatable)")
+    parser.add_argument("--build", action="store_true", help="(re)build the index from blend_data/ first")
+    args = parser.parse_args()
+
+    if args.build:
+        args.index.parent.mkdir(parents=True, exist_ok=True)
+        args.index.write_bytes(build_from_corpus())
+        print(f"Search index written to {args.index}")
+    if not args.query:
+        return
+
+    try:
+        index = SearchIndex.load(args.index)
+    except FileNotFoundError:
+        print(f"No search index at {args.index}; run scripts/build_site_data.py (or pass --build) first",
+              file=sys.stderr)
+        sys.exit(1)
+    fields = sum(FIELD_BITS[f] for f in args.field) if args.field else ALL_FIELDS
+    start = time.perf_counter()
+    hits = index.search(args.query, limit=args.limit, fields=fields)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    for hit in hits:
+        print(f"{hit.score:7.3f}  {hit.blender} - {hit.name}")
+    print(f"\n{len(hits)} results in {elapsed:.2f} ms over {len(index)} blends")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Local query server over an in-memory blend index.
+
+Loads blend_data/ once (through the corpus cache / pack) and answers
+
+    GET /api/blends?blender=&type=&country=&cut=&production=&contents=&flavoring=&q=&sort=&page=&perPage=
+
+with one page of listing rows (the head shard's fields), the total, and facet counts for
+every filter: how many blends each value would leave given the other filters. Filters
+match the way main.html's do: blender and country by substring, the rest exactly
+(case-insensitively); contents and flavoring may repeat and are ANDed; q is a substring of
+name, blender, blend type or contents; sort takes the listing's sort options. Filtering
+runs on the facet bitmaps of blend_facets.py. Responses carry a strong ETag and are
+answered with 304 when the client already has them.
+
+Every other path is a static file under the site root. When the client accepts it, a
+precompressed .br / .gz sibling written by the build is served instead; requests carrying
+a ?v= version (as the shard map's are) get an immutable one-year cache lifetime, the rest
+revalidate against an ETag.
+
+blend_data/ is polled for changed files, which are re-read and swapped in without a
+restart. Only the standard library is needed, so the server runs anywhere the site tools
+do, locally or behind the static site.
+
+    python site_tools/blend_server.py --port 8000
+    curl 'http://localhost:8000/api/blends?country=germany&sort=averageRating'
+"""
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, NamedTuple
+from urllib.parse import parse_qs, unquote, urlsplit
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import sys
+import time
+
+from blend_corpus import ROOT_DIR, BLEND_DATA_DIR, list_blend_files, load_blends, parse_blend
+from blend_facets import FACETS, FacetIndex, build_facet_index, facet_values, popcount
+from blend_index import index_entry
+from blend_pack import read_raw
+from blend_ratings import published_blend
+from blend_shards import HEAD_FIELDS
+
+API_PATH = "/api/blends"
+DEFAULT_PER_PAGE = 48
+MAX_PER_PAGE = 500
+RELOAD_INTERVAL = 2.0
+KEEPALIVE_TIMEOUT = 15
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Query parameter -> facet; "type" is the listing's name for blendType
+FACET_PARAMS = {"blender": "blender", "type": "blendType", "country": "country", "cut": "cut",
+                "production": "production", "contents": "contents", "flavoring": "flavoring"}
+# Facets whose options are ANDed (checkboxes) rather than chosen one at a time
+MULTI_FACETS = {facet.name for facet in FACETS if facet.tokens}
+
+# sort option -> (key over a listing row, descending); mirrors main.html's sort dropdown
+SORTS = {
+    "averageRating": (lambda row: row["r"] or 0, True),
+    "ratingLowToHigh": (lambda row: row["r"] or 0, False),
+    "reviewCount": (lambda row: row["rc"] or 0, True),
+    "reviewCountLowToHigh": (lambda row: row["rc"] or 0, False),
+    "blenderAsc": (lambda row: row["b"].casefold(), False),
+    "blenderDesc": (lambda row: row["b"].casefold(), True),
+    "alphaAsc": (lambda row: row["n"].casefold(), False),
+    "alphaDesc": (lambda row: row["n"].casefold(), True),
+}
+
+
+class Response(NamedTuple):
+    status: int
+    headers: Dict[str, str]
+    body: bytes = b""
+
+
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+def bits_of(ordinals: List[int]) -> int:
+    """Bitmap (as an int) with the given ordinals set."""
+    if not ordinals:
+        return 0
+    buffer = bytearray(max(ordinals) // 8 + 1)
+    for ordinal in ordinals:
+        buffer[ordinal >> 3] |= 1 << (ordinal & 7)
+    return int.from_bytes(buffer, "little")
+
+
+class BlendView:
+    """One immutable generation of the in-memory index; reloads build a new one and swap it in."""
+
+    def __init__(self, rows: List[Dict[str, Any]], generation: int):
+        self.rows = rows
+        self.generation = generation
+        self.facets = FacetIndex(build_facet_index(facet_values(row) for row in rows))
+        # main.html's search box fields, separated so a term can't straddle two of them
+        self.haystacks = ["\n".join((row["n"], row["b"], row["t"], row["c"])).lower() for row in rows]
+        self.ranks = {}
+        for sort, (key, descending) in SORTS.items():
+            order = sorted(range(len(rows)), key=lambda i: key(rows[i]), reverse=descending)
+            # sorted(reverse=True) keeps ties in their original order, like the page's sort
+            rank = [0] * len(rows)
+            for position, ordinal in enumerate(order):
+                rank[ordinal] = position
+            self.ranks[sort] = rank
+
+    def search_bits(self, text: str) -> Optional[int]:
+        if not text:
+            return None
+        text = text.lower()
+        return bits_of([i for i, haystack in enumerate(self.haystacks) if text in haystack])
+
+    def facet_counts(self, terms: List[Tuple[str, str]], within: Optional[int]) -> Dict[str, Dict[str, int]]:
+        """{facet: {value: blends}} over stored values, largest first, zeros left out."""
+        counts = {}
+        for facet in FACETS:
+            own = [term for term in terms if facet.name not in MULTI_FACETS and term[0] == facet.name]
+            base = self.facets.query([term for term in terms if term not in own], within)
+            values = {}
+            for value, bits in self.facets.value_bitmaps(facet.name):
+                count = popcount(bits & base)
+                if count:
+                    values[value] = count
+            counts[facet.name] = dict(sorted(values.items(), key=lambda item: (-item[1], item[0])))
+        return counts
+
+    def query(self, params: Dict[str, List[str]]) -> Dict[str, Any]:
+        """Answer one /api/blends request; raises ValueError for bad parameters."""
+        terms = []
+        for param, facet in FACET_PARAMS.items():
+            for value in params.get(param, []):
+                if value and value.lower() != "all availabilities":
+                    terms.append((facet, value))
+        sort = params.get("sort", [""])[0]
+        if sort and sort not in SORTS:
+            raise ValueError(f"unknown sort {sort!r}; expected one of {', '.join(SORTS)}")
+        try:
+            page = int(params.get("page", ["1"])[0])
+            per_page = min(int(params.get("perPage", [str(DEFAULT_PER_PAGE)])[0]), MAX_PER_PAGE)
+        except ValueError:
+            page = per_page = 0
+        if page < 1 or per_page < 1:
+            raise ValueError("page and perPage must be positive integers")
+
+        within = self.search_bits(params.get("q", [""])[0])
+        matched = FacetIndex.ordinals(self.facets.query(terms, within))
+        if sort:
+            matched.sort(key=self.ranks[sort].__getitem__)
+        start = (page - 1) * per_page
+        return {
+            "total": len(matched),
+            "page": page,
+            "perPage": per_page,
+            "pages": (len(matched) + per_page - 1) // per_page,
+            "results": [self.rows[i] for i in matched[start:start + per_page]],
+            "facets": self.facet_counts(terms, within),
+            "generation": self.generation,
+        }
+
+
+def listing_row(filename: str, blend: Dict[str, Any]) -> Dict[str, Any]:
+    """The head shard's fields for one blend_data record."""
+    entry = index_entry(published_blend(blend))
+    return {"filename": filename, **{field: entry[field] for field in HEAD_FIELDS[1:]}}
+
+
+class BlendStore:
+    """The current BlendView plus what is needed to refresh it from blend_data/."""
+
+    def __init__(self, blend_dir: Path = BLEND_DATA_DIR):
+        self.blend_dir = Path(blend_dir)
+        self.stats: Dict[str, Tuple[int, int]] = {}
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self.view: Optional[BlendView] = None
+
+    def refresh(self) -> int:
+        """Re-read new and changed files; returns how many blends changed (0 keeps the view)."""
+        stats = list_blend_files(self.blend_dir)
+        if self.view is None:
+            records = load_blends(self.blend_dir)
+            self.rows = {filename: listing_row(filename, record.data) for filename, record in records.items()}
+            changed = len(records)
+        else:
+            stale = [filename for filename, stat in stats.items() if self.stats.get(filename) != stat]
+            removed = [filename for filename in self.stats if filename not in stats]
+            for filename in stale:
+                try:
+                    raw, _ = read_raw(self.blend_dir, filename)
+                    _, blend = parse_blend(raw.decode("utf-8"))
+                except Exception as e:
+                    # Keep serving the last good version of a file caught mid-edit
+                    print(f"Error processing {self.blend_dir / filename}: {e}", file=sys.stderr)
+                    stats[filename] = self.stats.get(filename)
+                    continue
+                self.rows[filename] = listing_row(filename, blend)
+            for filename in removed:
+                self.rows.pop(filename, None)
+            changed = len(stale) + len(removed)
+            if not changed:
+                return 0
+        self.stats = stats
+        generation = self.view.generation + 1 if self.view is not None else 1
+        self.view = BlendView([self.rows[filename] for filename in stats if filename in self.rows], generation)
+        return changed
+
+
+def strong_etag(body: bytes, suffix: str = "") -> str:
+    return f'"{hashlib.sha1(body).hexdigest()[:20]}{suffix}"'
+
+
+def not_modified(headers: Dict[str, str], etag: str) -> bool:
+    return etag in [tag.strip() for tag in headers.get("if-none-match", "").split(",")]
+
+
+def accepted_encodings(headers: Dict[str, str]) -> set:
+    return {part.split(";")[0].strip() for part in headers.get("accept-encoding", "").split(",")}
+
+
+class BlendServer:
+    def __init__(self, store: BlendStore, root: Path = ROOT_DIR):
+        self.store = store
+        self.root = Path(root).resolve()
+
+    def api(self, query: str, headers: Dict[str, str]) -> Response:
+        try:
+            payload = self.store.view.query(parse_qs(query))
+        except ValueError as e:
+            body = json.dumps({"error": str(e)}).encode("utf-8")
+            return Response(400, {"Content-Type": "application/json"}, body)
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        response_headers = {"Content-Type": "application/json; charset=utf-8", "Cache-Control": "no-cache",
+                            "Vary": "Accept-Encoding"}
+        suffix = ""
+        if "gzip" in accepted_encodings(headers) and len(body) > 1024:
+            body = gzip.compress(body, compresslevel=6, mtime=0)
+            response_headers["Content-Encoding"] = "gzip"
+            suffix = "-gz"
+        response_headers["ETag"] = strong_etag(body, suffix)
+        if not_modified(headers, response_headers["ETag"]):
+            return Response(304, response_headers)
+        return Response(200, response_headers, body)
+
+    def static(self, path: str, query: str, headers: Dict[str, str]) -> Response:
+        relative = unquote(path).lstrip("/")
+        if any(part.startswith(".") for part in Path(relative).parts):
+            return Response(404, {})
+        # normpath rather than resolve(): ".." can't escape the root, symlinks inside it still work
+        file_path = Path(os.path.normpath(self.root / relative))
+        if file_path.is_dir():
+            file_path = file_path / "index.html"
+        if not file_path.is_relative_to(self.root) or not file_path.is_file():
+            return Response(404, {})
+
+        content_type = mimetypes.guess_type(file_path.name)[0] or "application/octet-stream"
+        response_headers = {"Content-Type": content_type, "Vary": "Accept-Encoding",
+                            "Cache-Control": IMMUTABLE if "v" in parse_qs(query) else "no-cache"}
+        serve = file_path
+        st = serve.stat()
+        accepted = accepted_encodings(headers)
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            sibling = file_path.with_name(file_path.name + suffix)
+            if encoding in accepted and sibling.is_file():
+                sibling_st = sibling.stat()
+                # The build writes siblings after their source; an older one is stale
+                if sibling_st.st_mtime_ns >= st.st_mtime_ns:
+                    serve, st = sibling, sibling_st
+                    response_headers["Content-Encoding"] = encoding
+                    break
+        response_headers["ETag"] = f'"{st.st_mtime_ns:x}-{st.st_size:x}{serve.suffix if serve != file_path else ""}"'
+        if not_modified(headers, response_headers["ETag"]):
+            return Response(304, response_headers)
+        return Response(200, response_headers, serve.read_bytes())
+
+    async def respond(self, method: str, target: str, headers: Dict[str, str]) -> Response:
+        if method not in ("GET", "HEAD"):
+            return Response(405, {"Allow": "GET, HEAD"})
+        url = urlsplit(target)
+        if url.path == API_PATH:
+            return self.api(url.query, headers)
+        # Static files can be large (blend_index.json); read them off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, self.static, url.path, url.query, headers)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+                    break
+                request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                    if int(headers.get("content-length") or 0):
+                        await reader.readexactly(int(headers["content-length"]))
+                    response = await self.respond(method, target, headers)
+                except ValueError:
+                    method, version, response = "GET", "HTTP/1.0", Response(400, {})
+                except Exception as e:
+                    print(f"Error serving {request_line}: {e}", file=sys.stderr)
+                    response = Response(500, {})
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                lines = [f"HTTP/1.1 {response.status} {REASONS.get(response.status, '')}"]
+                response_headers = dict(response.headers, **{
+                    "Content-Length": str(len(response.body)),
+                    "Connection": "keep-alive" if keep_alive else "close",
+                })
+                lines += [f"{name}: {value}" for name, value in response_headers.items()]
+                writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+                if method != "HEAD":
+                    writer.write(response.body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def watch(self, interval: float) -> None:
+        """Poll blend_data/ and swap in a new view when files change."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                start = time.perf_counter()
+                changed = await loop.run_in_executor(None, self.store.refresh)
+            except OSError as e:
+                print(f"Reload failed: {e}", file=sys.stderr)
+                continue
+            if changed:
+                print(f"Reloaded {changed} blends in {time.perf_counter() - start:.2f}s "
+                      f"(generation {self.store.view.generation})")
+
+
+async def serve(host: str, port: int, blend_dir: Path, root: Path, reload_interval: float) -> None:
+    store = BlendStore(blend_dir)
+    start = time.perf_counter()
+    store.refresh()
+    print(f"Loaded {len(store.view.rows)} blends in {time.perf_counter() - start:.2f}s")
+    server = BlendServer(store, root)
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"Serving {server.root} on http://{host}:{port} ({API_PATH} for queries)")
+    async with listener:
+        tasks = [listener.serve_forever()]
+        if reload_interval > 0:
+            tasks.append(server.watch(reload_interval))
+        await asyncio.gather(*tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the site and a blend query API from memory.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    parser.add_argument("--root", type=Path, default=ROOT_DIR, help="site root for static files")
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL,
+                        help="seconds between blend_data/ checks (0 disables hot reload)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.blend_dir, args.root, args.reload_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+from pathlib import Path
+from typing import Dict, Any, List, Iterable, Optional
+import gzip
+import json
+import os
+
+try:
+    import brotli
+except ImportError:  # .br siblings are skipped without the optional brotli package
+    brotli = None
+
+# Fields kept in the head shard: everything the listing cards, filters and sorting use.
+# Ratings distributions, descriptions and the rest of each record live in detail shards.
+HEAD_FIELDS = ["filename", "n", "b", "bb", "mb", "t", "c", "ct", "y", "p", "f", "pr", "r", "rc"]
+
+DEFAULT_BUCKETS = 128
+# Quality 11 is several times slower for a ~3% smaller file; 9 keeps one-blend rebuilds quick
+BROTLI_QUALITY = 9
+# gzip 9 is ~3x slower than 6 on the multi-MB search index for a ~5% smaller file
+GZIP_LEVEL = 6
+HEAD_FILE = "head.json"
+SHARD_MAP_FILE = "shard_map.json"
+SEARCH_FILE = "search_index.bin"
+FACET_FILE = "facet_index.bin"
+TOKEN_FILE = "token_index.json"
+
+
+def fnv1a32(text: str) -> int:
+    """32-bit FNV-1a over UTF-8 bytes; mirrored by shardBucket() in assets/js/blend-shards.js."""
+    h = 0x811c9dc5
+    for byte in text.encode("utf-8"):
+        h ^= byte
+        h = (h * 0x01000193) & 0xffffffff
+    return h
+
+
+def shard_bucket(filename: str, buckets: int = DEFAULT_BUCKETS) -> int:
+    """Detail shard a blend file belongs to."""
+    return fnv1a32(filename) % buckets
+
+
+def detail_file(bucket: int) -> str:
+    return f"detail-{bucket:03d}.json"
+
+
+def head_row(filename: str, entry: Dict[str, Any]) -> str:
+    """Serialise one head-shard row from a blend_index.json entry."""
+    row = [filename] + [entry[field] for field in HEAD_FIELDS[1:]]
+    return json.dumps(row, ensure_ascii=False, separators=(",", ":"))
+
+
+def detail_fragment(blend: Dict[str, Any]) -> str:
+    """Serialise one full blend record for its detail shard."""
+    return json.dumps(blend, ensure_ascii=False, separators=(",", ":"))
+
+
+def with_similar(fragment: str, similar: Optional[str]) -> str:
+    """A detail fragment with its precomputed "similar" list (already serialised) added."""
+    if not similar or similar == "[]":
+        return fragment
+    return fragment[:-1] + ("," if fragment != "{}" else "") + '"similar":' + similar + "}"
+
+
+def render_head(rows: Iterable[str]) -> str:
+    return '{"fields":' + json.dumps(HEAD_FIELDS, separators=(",", ":")) + ',"rows":[\n' + ",\n".join(rows) + "\n]}"
+
+
+def render_detail(items: Iterable[tuple]) -> str:
+    """Render a detail shard from (filename, fragment) pairs."""
+    parts = [f"{json.dumps(filename, ensure_ascii=False)}:{fragment}" for filename, fragment in items]
+    return "{\n" + ",\n".join(parts) + "\n}"
+
+
+def render_shard_map(buckets: int, count: int, versions: Dict[str, str]) -> str:
+    """Shard map: where the head and detail shards live and a cache-busting version for each."""
+    shard_map = {
+        "version": 1,
+        "hash": "fnv1a32-utf8",
+        "buckets": buckets,
+        "count": count,
+        "head": {"file": HEAD_FILE, "v": versions.get(HEAD_FILE, "")},
+        "search": {"file": SEARCH_FILE, "v": versions.get(SEARCH_FILE, "")},
+        "facets": {"file": FACET_FILE, "v": versions.get(FACET_FILE, "")},
+        "tokens": {"file": TOKEN_FILE, "v": versions.get(TOKEN_FILE, "")},
+        "detail": [
+            {"file": detail_file(bucket), "v": versions.get(detail_file(bucket), "")}
+            for bucket in range(buckets)
+        ],
+    }
+    return json.dumps(shard_map, indent=2)
+
+
+def write_compressed_siblings(path: Path, data: bytes) -> List[str]:
+    """Write .gz and (when brotli is installed) .br siblings next to path."""
+    written = []
+    gz_path = path.with_name(path.name + ".gz")
+    _replace_bytes(gz_path, gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+    written.append(gz_path.name)
+
+    br_path = path.with_name(path.name + ".br")
+    if brotli is not None:
+        _replace_bytes(br_path, brotli.compress(data, quality=BROTLI_QUALITY))
+        written.append(br_path.name)
+    elif br_path.exists():
+        # A stale .br would be served in place of the fresh .json
+        br_path.unlink()
+    return written
+
+
+def siblings_missing(path: Path) -> bool:
+    """Whether any compressed sibling write_compressed_siblings() would write is missing."""
+    return (not path.with_name(path.name + ".gz").exists()
+            or (brotli is not None and not path.with_name(path.name + ".br").exists()))
+
+
+def _replace_bytes(path: Path, data: bytes) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Precomputed "similar blends": the k nearest neighbours of every blend.
+
+Each blend becomes a feature vector made of weighted blocks:
+
+    profiles     the four rating profile distributions (strength, flavoring, roomNote,
+                 taste), each level count as a share of the profile's ratings
+    rating       averageRating / 4
+    blendType    one-hot
+    cut          one-hot
+    contents     multi-hot over the canonical tokens of blend_vocab.tokenize()
+    flavoring    multi-hot, likewise
+
+Every block is scaled to unit length and then by the square root of its weight, and each
+row is normalised, so a dot product is a weighted cosine similarity. Neighbours are found
+exactly with batched matrix products over blocks of rows: each block scores its rows
+against the whole corpus at once (X[block] @ X.T) and keeps the top k with argpartition,
+so memory is bounded by BLOCK_SCORES scores rather than an N x N matrix; 100k blends
+take a few hundred blocks. When a few blends change, update_top_k() rescores only them and
+the blends whose lists held them.
+
+scripts/build_site_data.py stores each blend's neighbours in its detail shard record as
+"similar": [[filename, name, blender], ...], best first, so blend pages show them without
+computing anything.
+
+    python site_tools/blend_similar.py "Doctor Pipe - Vanilla Cream.json"
+"""
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, NamedTuple
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from blend_corpus import BLEND_DATA_DIR, load_blends
+from blend_ratings import PROFILE_SCALES, profile_counts
+from blend_vocab import token_key, tokenize
+
+SIMILAR_K = 8
+
+# Scores held in memory at once (float32): 16M is 64 MB, e.g. 160 rows x 100k blends
+BLOCK_SCORES = 1 << 24
+
+# Relative weight of each feature block
+WEIGHTS = {
+    "profiles": 1.0,
+    "rating": 0.5,
+    "blendType": 1.0,
+    "cut": 0.5,
+    "contents": 1.5,
+    "flavoring": 1.0,
+}
+
+
+class SimilarityInput(NamedTuple):
+    """What one blend contributes to its feature vector."""
+    profiles: Tuple[Tuple[int, ...], ...]   # counts per level, PROFILE_SCALES order
+    average: float
+    blend_type: str
+    cut: str
+    contents: Tuple[str, ...]               # token keys
+    flavoring: Tuple[str, ...]
+
+
+def similarity_input(blend: Dict[str, Any]) -> SimilarityInput:
+    """Features of one blend_data record (with raw profile counts)."""
+    ratings = blend.get("ratings") or {}
+    total_reviews = blend.get("totalReviews") or 0
+    profiles = []
+    for profile_type, (_, levels) in PROFILE_SCALES.items():
+        profile = ratings.get(profile_type)
+        counts = profile_counts(profile, total_reviews) if isinstance(profile, dict) else {}
+        profiles.append(tuple(int(counts.get(level) or 0) for level in levels))
+    return SimilarityInput(
+        profiles=tuple(profiles),
+        average=float(blend.get("averageRating") or 0),
+        blend_type=token_key(str(blend.get("blendType") or "")),
+        cut=token_key(str(blend.get("cut") or "")),
+        contents=tuple(token_key(token) for token in tokenize("contents", blend.get("contents"))),
+        flavoring=tuple(token_key(token) for token in tokenize("flavoring", blend.get("flavoring"))),
+    )
+
+
+def _one_hot(rows: List[Tuple[str, ...]]) -> np.ndarray:
+    """Multi-hot matrix for rows of (possibly empty) value tuples; "" is no value."""
+    vocab = sorted({value for row in rows for value in row if value})
+    lookup = {value: column for column, value in enumerate(vocab)}
+    matrix = np.zeros((len(rows), len(vocab)), dtype=np.float32)
+    for row, values in enumerate(rows):
+        for value in values:
+            if value:
+                matrix[row, lookup[value]] = 1
+    return matrix
+
+
+def _unit_rows(block: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    return block / np.where(norms > 0, norms, 1)
+
+
+def feature_matrix(inputs: List[SimilarityInput]) -> np.ndarray:
+    """blends x features, float32, each row of unit length (or zero for a featureless blend)."""
+    n = len(inputs)
+    profiles = []
+    for p in range(len(PROFILE_SCALES)):
+        counts = np.array([item.profiles[p] for item in inputs], dtype=np.float32).reshape(n, -1)
+        totals = counts.sum(axis=1, keepdims=True)
+        profiles.append(counts / np.where(totals > 0, totals, 1))
+    blocks = {
+        "profiles": np.hstack(profiles) if n else np.zeros((0, 0), dtype=np.float32),
+        "rating": np.array([[item.average / 4] for item in inputs], dtype=np.float32).reshape(n, 1),
+        "blendType": _one_hot([(item.blend_type,) for item in inputs]),
+        "cut": _one_hot([(item.cut,) for item in inputs]),
+        "contents": _one_hot([item.contents for item in inputs]),
+        "flavoring": _one_hot([item.flavoring for item in inputs]),
+    }
+    features = np.hstack([_unit_rows(blocks[name]) * np.float32(np.sqrt(weight))
+                          for name, weight in WEIGHTS.items()])
+    return _unit_rows(features).astype(np.float32)
+
+
+def _score_rows(features: np.ndarray, rows: np.ndarray, k: int,
+                block_rows: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """(neighbours, scores) of the given rows against the whole corpus, len(rows) x k."""
+    n = len(features)
+    neighbours = np.full((len(rows), k), -1, dtype=np.int32)
+    scores = np.zeros((len(rows), k), dtype=np.float32)
+    if k == 0:
+        return neighbours, scores
+    block_rows = block_rows or max(1, BLOCK_SCORES // n)
+    for start in range(0, len(rows), block_rows):
+        end = min(start + block_rows, len(rows))
+        positions = np.arange(end - start)
+        block = features[rows[start:end]] @ features.T
+        block[positions, rows[start:end]] = -np.inf
+        # Everything scoring at least each row's k-th best, ordered by score and then by
+        # position, so ties always go the same way however the rest of the row looks
+        kth = np.partition(block, n - k, axis=1)[:, n - k]
+        hit_rows, hit_cols = np.nonzero((block >= kth[:, None]) & (block > 0))
+        hit_scores = block[hit_rows, hit_cols]
+        order = np.lexsort((hit_cols, -hit_scores, hit_rows))
+        hit_rows, hit_cols, hit_scores = hit_rows[order], hit_cols[order], hit_scores[order]
+        rank = np.arange(len(hit_rows)) - np.searchsorted(hit_rows, hit_rows)
+        keep = rank < k
+        neighbours[start + hit_rows[keep], rank[keep]] = hit_cols[keep]
+        scores[start + hit_rows[keep], rank[keep]] = hit_scores[keep]
+    return neighbours, scores
+
+
+def top_k(features: np.ndarray, k: int = SIMILAR_K,
+          block_rows: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (neighbours, scores), both blends x k, best first. Rows with fewer than k blends
+    scoring above zero are padded with -1 / 0.
+    """
+    k = min(k, max(len(features) - 1, 0))
+    return _score_rows(features, np.arange(len(features)), k, block_rows)
+
+
+def update_top_k(features: np.ndarray, neighbours: np.ndarray, scores: np.ndarray, changed: List[int],
+                 block_rows: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, List[int]]:
+    """
+    Bring top_k() results for the same blends up to date after the `changed` rows'
+    features moved. Those rows and every row that listed one of them are rescored against
+    the whole corpus; any other row can only gain a changed row that now beats its k-th
+    neighbour, so it just merges those in. Returns (neighbours, scores, rows touched).
+    """
+    n, k = neighbours.shape
+    neighbours, scores = neighbours.copy(), scores.copy()
+    changed = np.asarray(sorted(set(changed)), dtype=np.int64)
+    if k == 0 or not len(changed):
+        return neighbours, scores, []
+    is_changed = np.zeros(n, dtype=bool)
+    is_changed[changed] = True
+    rescore = is_changed | (is_changed[neighbours] & (neighbours >= 0)).any(axis=1)
+    rows = np.flatnonzero(rescore)
+    neighbours[rows], scores[rows] = _score_rows(features, rows, k, block_rows)
+
+    # How every changed row now scores against each blend; similarity is symmetric
+    against = features[changed] @ features.T
+    threshold = np.where(neighbours[:, -1] >= 0, scores[:, -1], 0)
+    gains = ((against > threshold) | ((against == threshold) & (changed[:, None] < neighbours[:, -1]))) & ~rescore
+    touched = rows.tolist()
+    for row in np.flatnonzero(gains.any(axis=0)):
+        candidates = [(-float(s), int(i)) for s, i in zip(scores[row], neighbours[row]) if i >= 0]
+        candidates += [(-float(against[c, row]), int(changed[c])) for c in np.flatnonzero(gains[:, row])]
+        best = sorted(candidates)[:k]
+        neighbours[row] = [i for _, i in best] + [-1] * (k - len(best))
+        scores[row] = [-s for s, _ in best] + [0] * (k - len(best))
+        touched.append(int(row))
+    return neighbours, scores, sorted(touched)
+
+
+def similar_blends(inputs: List[SimilarityInput], k: int = SIMILAR_K,
+                   block_rows: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+    """[(neighbour row, score), ...] for every blend, best first."""
+    neighbours, scores = top_k(feature_matrix(inputs), k, block_rows)
+    return [[(int(i), float(s)) for i, s in zip(row, row_scores) if i >= 0]
+            for row, row_scores in zip(neighbours, scores)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the blends most similar to a blend.")
+    parser.add_argument("blend", help="blend filename (with or without .json)")
+    parser.add_argument("--k", type=int, default=SIMILAR_K)
+    parser.add_argument("--block-rows", type=int, default=None,
+                        help=f"rows scored per matrix product (default: {BLOCK_SCORES:,} scores' worth)")
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    args = parser.parse_args()
+
+    records = load_blends(args.blend_dir)
+    filenames = list(records)
+    target = args.blend if args.blend.endswith(".json") else args.blend + ".json"
+    if target not in records:
+        print(f"Error: no blend file {target}", file=sys.stderr)
+        sys.exit(1)
+
+    start = time.perf_counter()
+    inputs = [similarity_input(record.data) for record in records.values()]
+    neighbours = similar_blends(inputs, args.k, args.block_rows)
+    elapsed = time.perf_counter() - start
+
+    for row, score in neighbours[filenames.index(target)]:
+        print(f"  {score:.3f}  {filenames[row]}")
+    print(f"\nNeighbours for {len(filenames)} blends computed in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
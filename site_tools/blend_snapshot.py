@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Columnar snapshot of the blend database for corpus-wide analysis.
+
+Each categorical field (blender, country, blendType, ...) is dictionary-encoded: its
+distinct values are stored once in a vocabulary and every blend holds an integer code
+into it; comma-separated lists (contents, flavoring) are encoded per token. Star counts, review totals, averages, Bayesian scores and the four rating
+profiles' mode levels sit alongside as NumPy arrays, one row per blend. Questions such as
+"rating by country x blendType" then reduce to a few array operations:
+
+    snapshot = load_snapshot()
+    snapshot.group_by("country", "blendType", mask=snapshot.reviews >= 5)
+    snapshot.count(snapshot.where(country="Germany", cut=["Flake", "Broken Flake"]))
+
+The snapshot is saved as an .npz next to the other build caches together with every
+blend file's (mtime, size). When a few files have changed only their rows are re-read and
+patched in; when many have, or blends were added or removed, it is rebuilt from the
+already cached parsed corpus.
+
+    python site_tools/blend_snapshot.py                                   # bring the snapshot up to date
+    python site_tools/blend_snapshot.py --group-by country blendType --min-reviews 5
+    python site_tools/blend_snapshot.py --group-by cut --where country=Germany --top 10
+"""
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from blend_corpus import BLEND_DATA_DIR, BlendRecord, cache_path_for, list_blend_files, load_blends, read_blend_file
+from blend_ratings import PROFILE_SCALES, STAR_VALUES, UNRATED_LEVEL
+from rating_aggregates import RatingMatrix, aggregate, load_rating_matrix, profile_modes
+from blend_vocab import tokenize
+
+SNAPSHOT_VERSION = 4
+
+# Changed files are patched into the saved snapshot up to this share of the corpus;
+# beyond it a rebuild from the parsed corpus cache is cheaper
+PATCH_SHARE = 0.05
+
+# Dictionary-encoded blend fields
+CATEGORY_FIELDS = ["blender", "country", "blendType", "cut", "production", "packaging", "flavoring"]
+
+# Multi-valued fields, split by blend_vocab.tokenize() and encoded as a vocabulary of
+# tokens plus each blend's token codes (CSR style: offsets_<field> marks where each blend's run of codes starts). A blend
+# counts once towards every token it lists.
+TOKEN_FIELDS = {"contentsToken": "contents", "flavoringToken": "flavoring"}
+
+# Rating profile modes are encoded the same way, under their own names so "flavoring"
+# (the field) and the flavoring profile's level don't collide
+LEVEL_FIELDS = {f"{profile_type}Level": profile_type for profile_type in PROFILE_SCALES}
+
+# Average star rating rounded to this step, as a category ("" for unrated blends)
+RATING_BAND_FIELD = "ratingBand"
+RATING_BAND_STEP = 0.1
+
+
+def snapshot_path(blend_dir: Path = BLEND_DATA_DIR) -> Path:
+    return cache_path_for(blend_dir, "blend_snapshot").with_suffix(".npz")
+
+
+def corpus_digest(stats: Dict[str, Any]) -> str:
+    """Identifies one state of a blend directory: every file's name, mtime and size."""
+    return hashlib.sha1(json.dumps(sorted(stats.items())).encode("utf-8")).hexdigest()
+
+
+def encode(values: Iterable[str]) -> Tuple[List[str], np.ndarray]:
+    """(vocabulary, codes) for a column of strings; the vocabulary is sorted, so codes are stable."""
+    values = list(values)
+    vocab = sorted(set(values))
+    lookup = {value: code for code, value in enumerate(vocab)}
+    return vocab, np.fromiter((lookup[value] for value in values), dtype=np.int32, count=len(values))
+
+
+def encode_tokens(token_lists: List[List[str]]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """(vocabulary, offsets, codes) for a column of token lists."""
+    vocab, codes = encode(token for tokens in token_lists for token in tokens)
+    offsets = np.zeros(len(token_lists) + 1, dtype=np.int64)
+    np.cumsum([len(tokens) for tokens in token_lists], out=offsets[1:])
+    return vocab, offsets, codes
+
+
+def rating_bands(average: np.ndarray, reviews: np.ndarray) -> Tuple[List[str], np.ndarray]:
+    """(vocabulary, codes) for the rating band column."""
+    steps = int(round(4 / RATING_BAND_STEP))
+    vocab = [""] + [f"{i * RATING_BAND_STEP:.1f}" for i in range(steps + 1)]
+    codes = np.where(reviews > 0, np.floor(average / RATING_BAND_STEP + 0.5).astype(np.int32) + 1, 0)
+    return vocab, codes.astype(np.int32)
+
+
+class Snapshot:
+    """Columns for a corpus, one row per blend in `filenames` order."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.filenames: np.ndarray = arrays["filenames"]
+        self.names: np.ndarray = arrays["names"]
+        self.stars: np.ndarray = arrays["stars"]          # blends x 8, STAR_KEYS order
+        self.reviews: np.ndarray = arrays["reviews"]              # star ratings
+        self.review_count: np.ndarray = arrays["reviewCount"]     # stored reviewCount
+        self.average: np.ndarray = arrays["average"]
+        self.bayesian: np.ndarray = arrays["bayesian"]
+        self.file_stats: np.ndarray = arrays["fileStats"]   # blends x 2, (mtime_ns, size)
+        self.vocab: Dict[str, List[str]] = {}
+        self.codes: Dict[str, np.ndarray] = {}
+        self.offsets: Dict[str, np.ndarray] = {}          # token fields only
+        for field in CATEGORY_FIELDS + list(TOKEN_FIELDS) + list(LEVEL_FIELDS) + [RATING_BAND_FIELD]:
+            self.vocab[field] = arrays[f"vocab_{field}"].tolist()
+            self.codes[field] = arrays[f"codes_{field}"]
+            if field in TOKEN_FIELDS:
+                self.offsets[field] = arrays[f"offsets_{field}"]
+        self.digest = str(arrays["digest"])
+
+    def __len__(self) -> int:
+        return len(self.filenames)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {
+            "version": np.array(SNAPSHOT_VERSION),
+            "digest": np.array(self.digest),
+            "filenames": self.filenames,
+            "names": self.names,
+            "stars": self.stars,
+            "reviews": self.reviews,
+            "reviewCount": self.review_count,
+            "average": self.average,
+            "bayesian": self.bayesian,
+            "fileStats": self.file_stats,
+        }
+        for field, vocab in self.vocab.items():
+            arrays[f"vocab_{field}"] = np.array(vocab, dtype=str)
+            arrays[f"codes_{field}"] = self.codes[field]
+        for field, offsets in self.offsets.items():
+            arrays[f"offsets_{field}"] = offsets
+        return arrays
+
+    def _check_field(self, field: str) -> None:
+        if field not in self.codes:
+            raise KeyError(f"{field!r} is not a snapshot category; expected one of {', '.join(self.codes)}")
+
+    def _token_rows(self, field: str) -> np.ndarray:
+        """The blend row each of a token field's codes belongs to."""
+        return np.repeat(np.arange(len(self)), np.diff(self.offsets[field]))
+
+    def where(self, mask: Optional[np.ndarray] = None, **conditions: Union[str, List[str]]) -> np.ndarray:
+        """
+        Boolean mask of the blends whose fields equal the given value (or any of a list of
+        values; for token fields, list any of them), ANDed with `mask`. Unknown values
+        simply match nothing.
+        """
+        result = np.ones(len(self), dtype=bool) if mask is None else mask.copy()
+        for field, wanted in conditions.items():
+            self._check_field(field)
+            values = [wanted] if isinstance(wanted, str) else wanted
+            lookup = {value: code for code, value in enumerate(self.vocab[field])}
+            codes = [lookup[value] for value in values if value in lookup]
+            hits = np.isin(self.codes[field], codes)
+            if field in self.offsets:
+                matched = np.zeros(len(self), dtype=bool)
+                matched[self._token_rows(field)[hits]] = True
+                hits = matched
+            result &= hits
+        return result
+
+    def count(self, mask: Optional[np.ndarray] = None) -> int:
+        return len(self) if mask is None else int(np.count_nonzero(mask))
+
+    def value_counts(self, field: str, mask: Optional[np.ndarray] = None) -> Dict[str, int]:
+        """{value: number of blends}, most common first."""
+        return {row[field]: row["blends"] for row in self.group_by(field, mask=mask)}
+
+    def group_by(self, *fields: str, mask: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """
+        One row per combination of field values present, largest group first:
+        the field values, "blends", "rated" (blends with a star rating), "reviews",
+        "rating" (mean stars over every review in the group) and "meanAverage"
+        (mean of the rated blends' own averages). At most one token field may be used;
+        a blend then falls into the group of each of its tokens.
+        """
+        for field in fields:
+            self._check_field(field)
+        token_fields = [field for field in fields if field in self.offsets]
+        if len(token_fields) > 1:
+            raise ValueError(f"group_by takes at most one token field, got {', '.join(token_fields)}")
+        if not fields:
+            return []
+
+        rows = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+        columns = {}
+        if token_fields:
+            field = token_fields[0]
+            selected = np.ones(len(self), dtype=bool) if mask is None else mask
+            token_rows = self._token_rows(field)
+            keep = selected[token_rows]
+            rows = token_rows[keep]
+            columns[field] = self.codes[field][keep]
+        if not len(rows):
+            return []
+        combined = np.zeros(len(rows), dtype=np.int64)
+        for field in fields:
+            codes = columns[field] if field in columns else self.codes[field][rows]
+            combined = combined * len(self.vocab[field]) + codes
+        groups, inverse = np.unique(combined, return_inverse=True)
+
+        reviews = self.reviews[rows]
+        rated = reviews > 0
+        blends = np.bincount(inverse)
+        rated_blends = np.bincount(inverse, weights=rated)
+        review_totals = np.bincount(inverse, weights=reviews)
+        star_totals = np.bincount(inverse, weights=self.stars[rows] @ np.array(STAR_VALUES))
+        average_totals = np.bincount(inverse, weights=np.where(rated, self.average[rows], 0.0))
+
+        results = []
+        for group in np.argsort(-blends, kind="stable"):
+            row = {}
+            remainder = int(groups[group])
+            for field in reversed(fields):
+                remainder, code = divmod(remainder, len(self.vocab[field]))
+                row[field] = self.vocab[field][code]
+            row = {field: row[field] for field in fields}
+            row["blends"] = int(blends[group])
+            row["rated"] = int(rated_blends[group])
+            row["reviews"] = int(review_totals[group])
+            row["rating"] = round(float(star_totals[group] / review_totals[group]), 4) if review_totals[group] else None
+            row["meanAverage"] = round(float(average_totals[group] / rated_blends[group]), 4) if rated_blends[group] else None
+            results.append(row)
+        return results
+
+
+def file_stats(filenames: Iterable[str], stats: Dict[str, Tuple[int, int]]) -> np.ndarray:
+    """(mtime_ns, size) per filename, (0, 0) for files without stats."""
+    return np.array([stats.get(filename, (0, 0)) for filename in filenames], dtype=np.int64).reshape(-1, 2)
+
+
+def build_snapshot(records: Iterable[BlendRecord], digest: str = "",
+                   stats: Optional[Dict[str, Tuple[int, int]]] = None) -> Snapshot:
+    """Encode a corpus into columns; `stats` are the files' list_blend_files() entries."""
+    records = list(records)
+    matrix = load_rating_matrix(records)
+    aggregates = aggregate(matrix)
+
+    arrays = {
+        "digest": np.array(digest),
+        "filenames": np.array(matrix.filenames, dtype=str),
+        "names": np.array([str(record.data.get("name") or "") for record in records], dtype=str),
+        "stars": matrix.stars.astype(np.int32),
+        "reviews": aggregates.reviews.astype(np.int32),
+        "reviewCount": np.array([int(record.data.get("reviewCount") or 0) for record in records], dtype=np.int32),
+        "average": aggregates.average,
+        "bayesian": aggregates.bayesian,
+        "fileStats": file_stats(matrix.filenames, stats or {}),
+    }
+    for field in CATEGORY_FIELDS:
+        vocab, codes = encode(str(record.data.get(field) or "").strip() for record in records)
+        arrays[f"vocab_{field}"] = np.array(vocab, dtype=str)
+        arrays[f"codes_{field}"] = codes
+    for field, source in TOKEN_FIELDS.items():
+        vocab, offsets, codes = encode_tokens([tokenize(source, record.data.get(source)) for record in records])
+        arrays[f"vocab_{field}"] = np.array(vocab, dtype=str)
+        arrays[f"offsets_{field}"] = offsets
+        arrays[f"codes_{field}"] = codes
+    for field, profile_type in LEVEL_FIELDS.items():
+        # Code 0 is "unrated", then the profile's levels in scale order
+        arrays[f"vocab_{field}"] = np.array([UNRATED_LEVEL] + PROFILE_SCALES[profile_type][1], dtype=str)
+        arrays[f"codes_{field}"] = (aggregates.levels[profile_type] + 1).astype(np.int32)
+    vocab, codes = rating_bands(aggregates.average, aggregates.reviews)
+    arrays[f"vocab_{RATING_BAND_FIELD}"] = np.array(vocab, dtype=str)
+    arrays[f"codes_{RATING_BAND_FIELD}"] = codes
+    return Snapshot(arrays)
+
+
+def changed_rows(snapshot: Snapshot, stats: Dict[str, Tuple[int, int]]) -> Optional[List[int]]:
+    """Rows whose file has changed since the snapshot, or None if blends were added or removed."""
+    if list(stats) != snapshot.filenames.tolist():
+        return None
+    changed = (file_stats(stats, stats) != snapshot.file_stats).any(axis=1)
+    return np.flatnonzero(changed).tolist()
+
+
+def patch_snapshot(snapshot: Snapshot, blend_dir: Path, rows: List[int],
+                   stats: Dict[str, Tuple[int, int]], digest: str) -> Snapshot:
+    """
+    The snapshot with just `rows` re-read from their files. Corpus-wide columns (Bayesian
+    scores, rating bands) are recomputed from the patched star counts, and a category or
+    token column is re-encoded only if one of the rows' values actually changed.
+    """
+    arrays = snapshot.arrays()
+    filenames = snapshot.filenames.tolist()
+    records = [read_blend_file(Path(blend_dir) / filenames[row]) for row in rows]
+    patch = load_rating_matrix(records)
+
+    names = snapshot.names.tolist()
+    for row, record in zip(rows, records):
+        names[row] = str(record.data.get("name") or "")
+    arrays["names"] = np.array(names, dtype=str)
+    arrays["stars"] = snapshot.stars.copy()
+    arrays["stars"][rows] = patch.stars
+    arrays["reviewCount"] = snapshot.review_count.copy()
+    arrays["reviewCount"][rows] = [int(record.data.get("reviewCount") or 0) for record in records]
+    stars = arrays["stars"].astype(np.int64)
+    aggregates = aggregate(RatingMatrix(filenames, stars, {}, np.zeros(len(filenames))))
+    arrays["reviews"] = aggregates.reviews.astype(np.int32)
+    arrays["average"] = aggregates.average
+    arrays["bayesian"] = aggregates.bayesian
+
+    for field in CATEGORY_FIELDS:
+        vocab, codes = snapshot.vocab[field], snapshot.codes[field]
+        values = [str(record.data.get(field) or "").strip() for record in records]
+        if [vocab[code] for code in codes[rows]] != values:
+            column = [vocab[code] for code in codes.tolist()]
+            for row, value in zip(rows, values):
+                column[row] = value
+            vocab, codes = encode(column)
+            arrays[f"vocab_{field}"] = np.array(vocab, dtype=str)
+            arrays[f"codes_{field}"] = codes
+    for field, source in TOKEN_FIELDS.items():
+        vocab, offsets, codes = snapshot.vocab[field], snapshot.offsets[field].tolist(), snapshot.codes[field].tolist()
+        token_lists = [list(tokenize(source, record.data.get(source))) for record in records]
+        if [[vocab[code] for code in codes[offsets[row]:offsets[row + 1]]] for row in rows] != token_lists:
+            column = [[vocab[code] for code in codes[start:end]] for start, end in zip(offsets, offsets[1:])]
+            for row, tokens in zip(rows, token_lists):
+                column[row] = tokens
+            vocab, offsets, codes = encode_tokens(column)
+            arrays[f"vocab_{field}"] = np.array(vocab, dtype=str)
+            arrays[f"offsets_{field}"] = offsets
+            arrays[f"codes_{field}"] = codes
+    for field, profile_type in LEVEL_FIELDS.items():
+        arrays[f"codes_{field}"] = snapshot.codes[field].copy()
+        arrays[f"codes_{field}"][rows] = profile_modes(patch.profiles[profile_type], patch.tiebreaks[profile_type]) + 1
+    vocab, codes = rating_bands(aggregates.average, aggregates.reviews)
+    arrays[f"codes_{RATING_BAND_FIELD}"] = codes
+
+    arrays["digest"] = np.array(digest)
+    arrays["fileStats"] = file_stats(filenames, stats)
+    return Snapshot(arrays)
+
+
+def save_snapshot(snapshot: Snapshot, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp.npz")
+    np.savez(tmp_path, **snapshot.arrays())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: Path) -> Optional[Snapshot]:
+    """Load a saved snapshot, or None if it is missing, unreadable or from another version."""
+    try:
+        with np.load(path, allow_pickle=False) as arrays:
+            if int(arrays["version"]) != SNAPSHOT_VERSION:
+                return None
+            return Snapshot({name: arrays[name] for name in arrays.files})
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def load_snapshot(blend_dir: Path = BLEND_DATA_DIR, rebuild: bool = False) -> Snapshot:
+    """
+    The snapshot for blend_dir, brought up to date first if any blend file has changed
+    since it was saved: patched for a few changed files, rebuilt otherwise.
+    """
+    path = snapshot_path(blend_dir)
+    stats = list_blend_files(blend_dir)
+    digest = corpus_digest(stats)
+    snapshot = None if rebuild else read_snapshot(path)
+    if snapshot is not None and snapshot.digest == digest:
+        return snapshot
+    rows = changed_rows(snapshot, stats) if snapshot is not None else None
+    if rows is not None and len(rows) <= PATCH_SHARE * len(snapshot):
+        snapshot = patch_snapshot(snapshot, blend_dir, rows, stats, digest)
+    else:
+        snapshot = build_snapshot(load_blends(blend_dir).values(), digest, stats)
+    save_snapshot(snapshot, path)
+    return snapshot
+
+
+def parse_conditions(pairs: List[str]) -> Dict[str, List[str]]:
+    """FIELD=VALUE arguments to where() keyword arguments; repeating a field ORs its values."""
+    conditions: Dict[str, List[str]] = {}
+    for pair in pairs:
+        field, sep, value = pair.partition("=")
+        if not sep:
+            raise ValueError(f"expected FIELD=VALUE, got {pair!r}")
+        conditions.setdefault(field, []).append(value)
+    return conditions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the columnar blend snapshot.")
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    parser.add_argument("--rebuild", action="store_true", help="rebuild even if the corpus is unchanged")
+    parser.add_argument("--group-by", nargs="+", metavar="FIELD", default=[],
+                        help=f"fields to group by: {', '.join(CATEGORY_FIELDS + list(TOKEN_FIELDS) + list(LEVEL_FIELDS))}, "
+                             f"{RATING_BAND_FIELD}")
+    parser.add_argument("--where", nargs="+", metavar="FIELD=VALUE", default=[], help="only blends matching these")
+    parser.add_argument("--min-reviews", type=int, default=0)
+    parser.add_argument("--top", type=int, default=25, metavar="N", help="print at most N groups (default 25)")
+    parser.add_argument("--json", action="store_true", help="print the groups as JSON")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    snapshot = load_snapshot(args.blend_dir, args.rebuild)
+    loaded = time.perf_counter()
+    if not args.group_by:
+        print(f"Snapshot of {len(snapshot)} blends at {snapshot_path(args.blend_dir)} ready in {loaded - start:.2f}s")
+        for field in snapshot.vocab:
+            print(f"  {field:<16} {len(snapshot.vocab[field]):>5} values")
+        return
+
+    try:
+        mask = snapshot.where(snapshot.reviews >= args.min_reviews, **parse_conditions(args.where))
+        groups = snapshot.group_by(*args.group_by, mask=mask)
+    except (KeyError, ValueError) as e:
+        print(f"Error: {e.args[0]}", file=sys.stderr)
+        sys.exit(1)
+    queried = time.perf_counter()
+
+    if args.json:
+        print(json.dumps(groups[:args.top], indent=4, ensure_ascii=False))
+    else:
+        for row in groups[:args.top]:
+            label = " x ".join(row[field] or "(none)" for field in args.group_by)
+            rating = f"{row['rating']:.2f}" if row["rating"] is not None else "  - "
+            print(f"  {row['blends']:>6} blends  {row['reviews']:>6} reviews  {rating}  {label}")
+    print(f"{len(groups)} groups over {snapshot.count(mask)} blends in {(queried - loaded) * 1000:.1f} ms "
+          f"(snapshot loaded in {loaded - start:.2f}s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Sparse storage for blend files.
+
+Most blends have never been rated, yet every dense file carries the full template: eight
+zero star counts, four 10-level profiles of zero counts with their scale text, zero review
+counters and empty strings. A sparse file keeps only what differs from that template:
+
+    {"key": {"imagePath": "...", "name": "...", ..., "ratings": {"taste": {"Medium": 1}}}}
+
+A profile's stored tiebreak (see blend_ratings.py) stays next to its counts, as
+{"Mild": 2, "Medium": 2, "tiebreak": "Mild"}; no level is called "tiebreak".
+
+expand_blend() restores the exact dense record, key order included, and is a no-op on
+files that are already dense, so readers accept either format. Writers use whichever
+format the directory is in: a SPARSE_MARKER file in blend_data/ means sparse.
+
+    python site_tools/blend_sparse.py --migrate             # convert blend_data/ to sparse
+    python site_tools/blend_sparse.py --export out/         # dense copies for older tools
+    python site_tools/blend_sparse.py --dense               # convert blend_data/ back in place
+    python site_tools/blend_sparse.py --check               # verify every file round-trips
+"""
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, List
+import argparse
+import json
+import os
+import sys
+
+from blend_ratings import PROFILE_SCALES, STAR_KEYS
+
+SPARSE_MARKER = ".sparse"
+
+# Dense field order and the value each field takes when a blend has no data for it.
+# A stored value is only omitted when it equals its default *and* has the same type, so
+# e.g. an integer 0 averageRating survives the round trip.
+FIELD_DEFAULTS = OrderedDict([
+    ("imagePath", ""),
+    ("name", ""),
+    ("blender", ""),
+    ("blendedBy", ""),
+    ("manufacturedBy", ""),
+    ("production", ""),
+    ("country", ""),
+    ("blendType", ""),
+    ("contents", ""),
+    ("cut", ""),
+    ("packaging", ""),
+    ("flavoring", ""),
+    ("description", ""),
+    ("notes", ""),
+    ("reviewCount", 0),
+    ("totalReviews", 0),
+    ("averageRating", 0.0),
+    ("maxRating", 4.0),
+])
+
+
+STAR_KEY_SET = frozenset(STAR_KEYS)
+PROFILE_SET = frozenset(PROFILE_SCALES)
+
+
+def is_default(value: Any, default: Any) -> bool:
+    return type(value) is type(default) and value == default
+
+
+def is_sparse_dir(blend_dir: Path) -> bool:
+    """Is this blend directory stored in the sparse format?"""
+    return (Path(blend_dir) / SPARSE_MARKER).exists()
+
+
+def compact_profile(profile_type: str, profile: Any) -> Any:
+    """
+    {level: count} for the non-zero counts (then the tiebreak, if any), or the profile
+    unchanged if it is not the standard template.
+    """
+    if profile_type not in PROFILE_SCALES or not isinstance(profile, dict):
+        return profile
+    scale, levels = PROFILE_SCALES[profile_type]
+    counts = profile.get("counts")
+    keys = list(profile)
+    if (keys not in (["scale", "counts"], ["scale", "counts", "tiebreak"]) or profile["scale"] != scale
+            or not isinstance(counts, dict) or list(counts) != levels
+            or not all(type(count) is int for count in counts.values())
+            or profile.get("tiebreak", levels[0]) not in levels):
+        return profile
+    compacted = OrderedDict((level, count) for level, count in counts.items() if count)
+    if "tiebreak" in profile:
+        compacted["tiebreak"] = profile["tiebreak"]
+    return compacted
+
+
+def expand_profile(profile_type: str, profile: Any) -> Any:
+    """Inverse of compact_profile(); full profiles pass through unchanged."""
+    if profile_type not in PROFILE_SCALES or not isinstance(profile, dict) or "counts" in profile or "distribution" in profile:
+        return profile
+    scale, levels = PROFILE_SCALES[profile_type]
+    counts = dict.fromkeys(levels, 0)
+    counts.update((level, count) for level, count in profile.items() if level != "tiebreak")
+    expanded = {"scale": scale, "counts": counts}
+    if "tiebreak" in profile:
+        expanded["tiebreak"] = profile["tiebreak"]
+    return expanded
+
+
+def compact_blend(blend: Dict[str, Any]) -> OrderedDict:
+    """Drop every field, star count and profile count that matches the empty template."""
+    sparse = OrderedDict()
+    for field, value in blend.items():
+        if field in FIELD_DEFAULTS:
+            if not is_default(value, FIELD_DEFAULTS[field]):
+                sparse[field] = value
+        elif field == "ratingDistribution" and isinstance(value, dict) and list(value) == STAR_KEYS \
+                and all(type(count) is int for count in value.values()):
+            counts = OrderedDict((key, count) for key, count in value.items() if count)
+            if counts:
+                sparse[field] = counts
+        elif field == "ratings" and isinstance(value, dict) and list(value) == list(PROFILE_SCALES):
+            profiles = OrderedDict()
+            for profile_type, profile in value.items():
+                compacted = compact_profile(profile_type, profile)
+                if compacted:
+                    profiles[profile_type] = compacted
+            if profiles:
+                sparse[field] = profiles
+        else:
+            sparse[field] = value
+    return sparse
+
+
+def expand_blend(blend: Dict[str, Any]) -> Dict[str, Any]:
+    """The dense record for a sparse (or already dense) blend, in the dense key order."""
+    dense = {field: blend.get(field, default) for field, default in FIELD_DEFAULTS.items()}
+
+    distribution = blend.get("ratingDistribution", {})
+    if isinstance(distribution, dict) and distribution.keys() <= STAR_KEY_SET:
+        counts = dict.fromkeys(STAR_KEYS, 0)
+        counts.update(distribution)
+        distribution = counts
+    dense["ratingDistribution"] = distribution
+
+    ratings = blend.get("ratings", {})
+    if isinstance(ratings, dict) and ratings.keys() <= PROFILE_SET:
+        ratings = {profile_type: expand_profile(profile_type, ratings.get(profile_type, {}))
+                   for profile_type in PROFILE_SCALES}
+    dense["ratings"] = ratings
+
+    if len(blend) > len(dense) or not blend.keys() <= dense.keys():
+        for field, value in blend.items():
+            if field not in dense:
+                dense[field] = value
+    return dense
+
+
+def dump_sparse(blend_key: str, blend_data: Dict[str, Any]) -> str:
+    """Serialise a blend in the sparse format (same indentation as dense files)."""
+    return json.dumps({blend_key: compact_blend(blend_data)}, indent=4, ensure_ascii=False)
+
+
+def convert(blend_dir: Path, out_dir: Path, sparse: bool) -> List[str]:
+    """Rewrite every blend in blend_dir into out_dir in one format; returns the files whose bytes changed."""
+    # Imported here: blend_corpus itself depends on this module
+    from blend_corpus import dump_blend, read_blend_file
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    changed = []
+    for file_path in sorted(Path(blend_dir).glob("*.json")):
+        record = read_blend_file(file_path)
+        text = dump_sparse(record.key, record.data) if sparse else dump_blend(record.key, record.data)
+        target = out_dir / file_path.name
+        if target.exists() and target.read_text(encoding='utf-8') == text:
+            continue
+        tmp_path = target.with_name(target.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, target)
+        changed.append(file_path.name)
+
+    marker = out_dir / SPARSE_MARKER
+    if sparse:
+        marker.write_text("Blend files here omit fields equal to the empty template; see site_tools/blend_sparse.py\n",
+                          encoding='utf-8')
+    else:
+        marker.unlink(missing_ok=True)
+    return changed
+
+
+def check(blend_dir: Path) -> List[str]:
+    """Files whose sparse form does not expand back to exactly the same record."""
+    from blend_corpus import read_blend_file
+
+    failures = []
+    for file_path in sorted(Path(blend_dir).glob("*.json")):
+        record = read_blend_file(file_path)
+        dense = json.dumps(record.data)
+        if json.dumps(expand_blend(json.loads(dump_sparse(record.key, record.data))[record.key])) != dense:
+            failures.append(file_path.name)
+    return failures
+
+
+def main():
+    from blend_corpus import BLEND_DATA_DIR
+
+    parser = argparse.ArgumentParser(description="Convert blend files between the dense and sparse formats.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--migrate", action="store_true", help="rewrite the blend directory as sparse files")
+    group.add_argument("--dense", action="store_true", help="rewrite the blend directory as dense files")
+    group.add_argument("--export", type=Path, metavar="DIR", help="write dense copies of every blend to DIR")
+    group.add_argument("--check", action="store_true", help="exit 1 if any file would not round-trip")
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    args = parser.parse_args()
+
+    if args.check:
+        failures = check(args.blend_dir)
+        for filename in failures:
+            print(filename)
+        print(f"{len(failures)} blend files do not round-trip through the sparse format", file=sys.stderr)
+        sys.exit(1 if failures else 0)
+
+    if args.migrate:
+        failures = check(args.blend_dir)
+        if failures:
+            print(f"Refusing to migrate: {len(failures)} files do not round-trip (see --check)", file=sys.stderr)
+            sys.exit(1)
+        changed = convert(args.blend_dir, args.blend_dir, sparse=True)
+        print(f"Rewrote {len(changed)} blend files as sparse")
+    elif args.dense:
+        changed = convert(args.blend_dir, args.blend_dir, sparse=False)
+        print(f"Rewrote {len(changed)} blend files as dense")
+    else:
+        changed = convert(args.blend_dir, args.export, sparse=False)
+        print(f"Exported {len(changed)} dense blend files to {args.export}")
+
+
+if __name__ == "__main__":
+    main()
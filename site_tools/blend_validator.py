@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Validate every blend file in one pass.
+
+Each field of each blend gets one status: present and valid, missing (absent or empty),
+the wrong type, not in its curated vocab list in assets/data/, or (for imagePath)
+pointing at a picture that does not exist. The results are written as one completeness
+matrix (a CSV with a row per blend and a column per field) plus a JSON report with
+per-field counts and the list of blends behind every non-ok status.
+
+Results are cached per file by (mtime, size) together with a digest of the vocab lists,
+so a re-run only re-validates files that changed. Picture existence is always re-checked.
+The exit code is 1 when any status named in --fail-on occurs, so the script can gate CI.
+
+    python site_tools/blend_validator.py                          # whole corpus
+    python site_tools/blend_validator.py --field description      # list blends missing one field
+    python site_tools/blend_validator.py --changed "blend_data/X - Y.json" --fail-on missing,type
+"""
+from functools import partial
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, NamedTuple
+import argparse
+import csv
+import hashlib
+import json
+import re
+import sys
+import time
+
+from blend_corpus import (BLEND_DATA_DIR, PICTURES_DIR, ROOT_DIR, BlendRecord, list_blend_files, map_chunks,
+                          parse_blend, picture_for, cache_path_for, read_pickle, write_pickle)
+from blend_pack import read_raw
+
+VOCAB_DIR = ROOT_DIR / "assets" / "data"
+REPORT_FILE = ROOT_DIR / "site_tools_output" / "validation_report.json"
+MATRIX_FILE = ROOT_DIR / "site_tools_output" / "validation_matrix.csv"
+
+OK = "ok"
+MISSING = "missing"
+WRONG_TYPE = "type"
+NOT_IN_VOCAB = "vocab"
+NO_PICTURE = "picture"
+UNREADABLE = "unreadable"
+STATUSES = [OK, MISSING, WRONG_TYPE, NOT_IN_VOCAB, NO_PICTURE, UNREADABLE]
+
+# Statuses that fail the run unless --fail-on says otherwise
+DEFAULT_FAIL_ON = [WRONG_TYPE, UNREADABLE]
+
+# Bump whenever the rules change so cached results are thrown away
+STATE_VERSION = 1
+
+
+class FieldRule(NamedTuple):
+    """
+    How one blend field is checked. `vocab_match` says how a value is compared with its
+    vocab file, mirroring the site's filters: "value" (the whole value), "list" (each
+    comma-separated entry), "parts" (each entry split on "," and "/") or "keyword" (any
+    vocab word appears in the value).
+    """
+    field: str
+    types: Tuple[type, ...]
+    required: bool = True
+    vocab_file: Optional[str] = None
+    vocab_match: str = "value"
+
+
+FIELD_RULES = [
+    FieldRule("imagePath", (str,)),
+    FieldRule("name", (str,)),
+    FieldRule("blender", (str,)),
+    FieldRule("blendedBy", (str,)),
+    FieldRule("manufacturedBy", (str,)),
+    FieldRule("production", (str,), vocab_file="production.json"),
+    FieldRule("country", (str,), vocab_file="countries.json"),
+    FieldRule("blendType", (str,), vocab_file="blend_types.json"),
+    FieldRule("contents", (str,), vocab_file="contents.json", vocab_match="list"),
+    FieldRule("cut", (str,), vocab_file="cut_types.json"),
+    FieldRule("packaging", (str,), vocab_file="packaging_types.json", vocab_match="keyword"),
+    FieldRule("flavoring", (str,), vocab_file="flavorings.json", vocab_match="parts"),
+    FieldRule("description", (str,)),
+    FieldRule("notes", (str,), required=False),
+    FieldRule("reviewCount", (int,)),
+    FieldRule("totalReviews", (int,)),
+    FieldRule("averageRating", (int, float)),
+    FieldRule("maxRating", (int, float)),
+    FieldRule("ratingDistribution", (dict,)),
+    FieldRule("ratings", (dict,)),
+]
+FIELDS = [rule.field for rule in FIELD_RULES]
+
+
+def load_vocab(vocab_dir: Path = VOCAB_DIR) -> Dict[str, List[str]]:
+    """Lower-cased vocab words per field; grouped files (packaging synonyms) are flattened."""
+    vocab = {}
+    for rule in FIELD_RULES:
+        if rule.vocab_file is None:
+            continue
+        with open(Path(vocab_dir) / rule.vocab_file, 'r', encoding='utf-8') as f:
+            values = json.load(f)
+        words = []
+        for value in values:
+            words.extend(value if isinstance(value, list) else [value])
+        vocab[rule.field] = sorted({word.lower() for word in words})
+    return vocab
+
+
+def vocab_digest(vocab: Dict[str, List[str]]) -> str:
+    return hashlib.sha1(json.dumps([STATE_VERSION, vocab], sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def in_vocab(value: str, words: List[str], vocab_match: str) -> bool:
+    """Does a field value satisfy its vocab list?"""
+    value = value.lower()
+    if vocab_match == "keyword":
+        return any(word in value for word in words)
+    if vocab_match == "list":
+        entries = value.split(",")
+    elif vocab_match == "parts":
+        entries = re.split(r"[,/]", value)
+    else:
+        entries = [value]
+    known = set(words)
+    return all(entry.strip() in known for entry in entries if entry.strip())
+
+
+def check_blend(blend: Dict[str, Any], vocab: Dict[str, List[str]]) -> Dict[str, str]:
+    """Status of every field of one blend, apart from picture existence."""
+    statuses = {}
+    for rule in FIELD_RULES:
+        value = blend.get(rule.field)
+        if value is None or value == "":
+            statuses[rule.field] = MISSING if rule.required else OK
+        # bool is an int subclass, but never a valid count or rating
+        elif isinstance(value, bool) or not isinstance(value, rule.types):
+            statuses[rule.field] = WRONG_TYPE
+        elif rule.field in vocab and not in_vocab(value, vocab[rule.field], rule.vocab_match):
+            statuses[rule.field] = NOT_IN_VOCAB
+        else:
+            statuses[rule.field] = OK
+    return statuses
+
+
+def _validate_chunk(blend_dir: str, filenames: List[str], vocab: Dict[str, List[str]]) -> List[tuple]:
+    """Worker: (filename, statuses, imagePath, error) for a chunk of blend files."""
+    results = []
+    for filename in filenames:
+        try:
+            raw, _ = read_raw(blend_dir, filename)
+            record = BlendRecord(filename, *parse_blend(raw.decode('utf-8')))
+            if not isinstance(record.data, dict):
+                raise ValueError(f"{record.key!r} does not hold a JSON object")
+        except Exception as e:
+            results.append((filename, None, None, str(e)))
+            continue
+        image_path = record.data.get("imagePath")
+        results.append((filename, check_blend(record.data, vocab), image_path if isinstance(image_path, str) else None, None))
+    return results
+
+
+def validate(blend_dir: Path = BLEND_DATA_DIR, vocab_dir: Path = VOCAB_DIR, pictures_dir: Path = PICTURES_DIR,
+             filenames: Optional[List[str]] = None, full: bool = False,
+             workers: Optional[int] = None) -> Dict[str, Dict[str, str]]:
+    """
+    Return {filename: {field: status}} for every blend file (or just `filenames`).
+    Unreadable files get UNREADABLE for every field plus an "error" entry.
+    """
+    blend_dir = Path(blend_dir)
+    vocab = load_vocab(vocab_dir)
+    digest = vocab_digest(vocab)
+
+    state_file = cache_path_for(blend_dir, "blend_validator")
+    state = None if full else read_pickle(state_file, STATE_VERSION)
+    if state is None or state.get("vocab") != digest:
+        state = {"version": STATE_VERSION, "vocab": digest, "entries": {}}
+    entries = state["entries"]
+
+    stats = list_blend_files(blend_dir)
+    selected = list(stats) if filenames is None else [name for name in filenames if name in stats]
+    stale = [name for name in selected if name not in entries or entries[name][0] != stats[name]]
+
+    worker = partial(_validate_chunk, vocab=vocab)
+    for filename, statuses, image_path, error in map_chunks(worker, blend_dir, stale, workers):
+        if error is not None:
+            statuses = {field: UNREADABLE for field in FIELDS}
+            statuses["error"] = error
+        entries[filename] = (stats[filename], statuses, image_path)
+
+    removed = [name for name in entries if name not in stats]
+    for name in removed:
+        del entries[name]
+    if stale or removed:
+        write_pickle(state_file, state)
+
+    results = {}
+    for filename in selected:
+        _, statuses, image_path = entries[filename]
+        statuses = dict(statuses)
+        if statuses["imagePath"] == OK and picture_for(image_path, pictures_dir) is None:
+            statuses["imagePath"] = NO_PICTURE
+        results[filename] = statuses
+    return results
+
+
+def field_counts(results: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, int]]:
+    """{field: {status: number of blends}}, listing only statuses that occur."""
+    counts = {field: {} for field in FIELDS}
+    for statuses in results.values():
+        for field in FIELDS:
+            counts[field][statuses[field]] = counts[field].get(statuses[field], 0) + 1
+    return {field: {status: by_status[status] for status in STATUSES if status in by_status}
+            for field, by_status in counts.items()}
+
+
+def failures(results: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, List[str]]]:
+    """{field: {status: [blend names]}} for every non-ok status."""
+    lists = {}
+    for filename, statuses in results.items():
+        for field in FIELDS:
+            if statuses[field] != OK:
+                lists.setdefault(field, {}).setdefault(statuses[field], []).append(filename[:-len(".json")])
+    return lists
+
+
+def write_matrix(path: Path, results: Dict[str, Dict[str, str]]) -> None:
+    """One row per blend, one column per field, each cell a status."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["blend"] + FIELDS)
+        for filename, statuses in results.items():
+            writer.writerow([filename[:-len(".json")]] + [statuses[field] for field in FIELDS])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate every field of every blend file in one pass.")
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    parser.add_argument("--vocab-dir", type=Path, default=VOCAB_DIR)
+    parser.add_argument("--pictures-dir", type=Path, default=PICTURES_DIR)
+    parser.add_argument("--changed", nargs="+", metavar="FILE", help="only validate and report these blend files")
+    parser.add_argument("--full", action="store_true", help="ignore cached results")
+    parser.add_argument("--field", choices=FIELDS, help="print the blends whose FIELD is not ok and exit")
+    parser.add_argument("--fail-on", default=",".join(DEFAULT_FAIL_ON),
+                        help=f"comma-separated statuses that make the exit code 1 (default: {','.join(DEFAULT_FAIL_ON)}; "
+                             f"any of: {', '.join(STATUSES[1:])}; empty to never fail)")
+    parser.add_argument("--report", type=Path, default=REPORT_FILE)
+    parser.add_argument("--matrix", type=Path, default=MATRIX_FILE)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    fail_on = [status for status in args.fail_on.split(",") if status]
+    unknown = set(fail_on) - set(STATUSES[1:])
+    if unknown:
+        parser.error(f"unknown statuses: {', '.join(sorted(unknown))}")
+
+    start = time.perf_counter()
+    filenames = [Path(path).name for path in args.changed] if args.changed else None
+    results = validate(args.blend_dir, args.vocab_dir, args.pictures_dir, filenames, args.full, args.workers)
+    elapsed = time.perf_counter() - start
+
+    lists = failures(results)
+    if args.field:
+        for status, names in sorted(lists.get(args.field, {}).items()):
+            for name in names:
+                print(f"{status}\t{name}")
+        return
+
+    counts = field_counts(results)
+    report = {
+        "blends": len(results),
+        "fields": counts,
+        "failures": lists,
+        "errors": {filename[:-len(".json")]: statuses["error"] for filename, statuses in results.items()
+                   if "error" in statuses},
+    }
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    write_matrix(args.matrix, results)
+
+    complete = sum(all(statuses[field] == OK for field in FIELDS) for statuses in results.values())
+    print(f"Validated {len(results)} blends in {elapsed:.2f}s; {complete} have every field complete and valid")
+    for field in FIELDS:
+        problems = ", ".join(f"{n} {status}" for status, n in counts[field].items() if status != OK)
+        if problems:
+            print(f"  {field:<20} {problems}")
+    print(f"Report written to {args.report}, matrix to {args.matrix}")
+
+    failed = {status: sum(status in statuses.values() for statuses in results.values()) for status in fail_on}
+    failed = {status: n for status, n in failed.items() if n}
+    if failed:
+        print("Failing on " + ", ".join(f"{n} blends with {status}" for status, n in failed.items()), file=sys.stderr)
+        for name, error in report["errors"].items():
+            print(f"Error processing {name}: {error}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Canonical token vocabulary for the multi-valued fields, contents and flavoring.
+
+tokenize() is the one place these fields are split and cleaned: contents on ",",
+flavoring on "," and "/", with whitespace collapsed, placeholder entries ("None",
+"Unknown", ...) dropped, and all-lower / all-upper entries title-cased, so
+"Burley,  Virginia" and "virginia, Burley" give the same two tokens. Tokens are
+compared case-insensitively.
+
+Every token gets an integer ID that never changes once assigned. The vocabulary is kept
+in assets/data/token_vocab.json ({field: [spelling by ID]}); it is seeded from the curated
+contents.json / flavorings.json lists, and the build only ever appends to it. From it the
+build writes assets/data/shards/token_index.json:
+
+    {"version": 1, "count": <blends>,
+     "fields": {field: {"tokens": [spelling by ID],
+                        "blends": [[token IDs, ascending] per blend ordinal],
+                        "postings": [[blend ordinals] per token ID]}}}
+
+Ordinals are positions in blend_manifest.json, as for the other shard indexes, so looking
+up an ingredient is a list index instead of a substring scan.
+
+    python site_tools/blend_vocab.py --list flavoring
+    python site_tools/blend_vocab.py --token contents=Latakia
+"""
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable
+import argparse
+import json
+import re
+import sys
+
+from blend_corpus import ROOT_DIR, BLEND_DATA_DIR, load_blends
+
+TOKEN_INDEX_VERSION = 1
+VOCAB_FILE = "token_vocab.json"
+DATA_DIR = ROOT_DIR / "assets" / "data"
+
+# Field -> (separator pattern, curated vocab file seeding the IDs)
+TOKEN_FIELDS = {
+    "contents": (re.compile(r","), "contents.json"),
+    "flavoring": (re.compile(r"[,/]"), "flavorings.json"),
+}
+
+# Entries that mean "nothing here" rather than naming an ingredient
+PLACEHOLDERS = {"none", "unflavored", "unknown"}
+
+
+def token_key(token: str) -> str:
+    """Identity of a token: tokens differing only in case or spacing are the same token."""
+    return " ".join(token.split()).casefold()
+
+
+def tokenize(field: str, value: Any) -> List[str]:
+    """Canonical tokens of one field value, de-duplicated, in the order written."""
+    separator, _ = TOKEN_FIELDS[field]
+    tokens = {}
+    for part in separator.split(str(value or "")):
+        token = " ".join(part.split())
+        if not token or token.casefold() in PLACEHOLDERS:
+            continue
+        if token.islower() or token.isupper():
+            token = token.title()
+        tokens.setdefault(token.casefold(), token)
+    return list(tokens.values())
+
+
+class Vocabulary:
+    """Append-only token spellings per field; a token's ID is its position."""
+
+    def __init__(self, fields: Dict[str, List[str]]):
+        self.fields = {field: list(fields.get(field, [])) for field in TOKEN_FIELDS}
+        self.ids = {field: {} for field in TOKEN_FIELDS}
+        for field, spellings in self.fields.items():
+            for token_id, spelling in enumerate(spellings):
+                self.ids[field].setdefault(token_key(spelling), token_id)
+
+    @classmethod
+    def seeded(cls, data_dir: Path = DATA_DIR) -> "Vocabulary":
+        """A fresh vocabulary whose first IDs are the curated lists, in their order."""
+        fields = {}
+        for field, (_, vocab_file) in TOKEN_FIELDS.items():
+            try:
+                with open(Path(data_dir) / vocab_file, 'r', encoding='utf-8') as f:
+                    fields[field] = [token for value in json.load(f) for token in tokenize(field, value)]
+            except (OSError, json.JSONDecodeError):
+                fields[field] = []
+        vocabulary = cls({})
+        for field, tokens in fields.items():
+            vocabulary.encode(field, tokens)
+        return vocabulary
+
+    @classmethod
+    def load(cls, data_dir: Path = DATA_DIR) -> "Vocabulary":
+        """The saved vocabulary, or a seeded one if there is none yet."""
+        try:
+            with open(Path(data_dir) / VOCAB_FILE, 'r', encoding='utf-8') as f:
+                return cls(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            return cls.seeded(data_dir)
+
+    def render(self) -> str:
+        return json.dumps(self.fields, indent=2, ensure_ascii=False)
+
+    def token_id(self, field: str, token: str, add: bool = True) -> Optional[int]:
+        """ID of a token, assigning the next free one to unseen tokens (unless add=False)."""
+        key = token_key(token)
+        token_id = self.ids[field].get(key)
+        if token_id is None and add:
+            token_id = len(self.fields[field])
+            self.fields[field].append(token)
+            self.ids[field][key] = token_id
+        return token_id
+
+    def encode(self, field: str, tokens: Iterable[str]) -> List[int]:
+        """Sorted, distinct IDs of a blend's tokens, so listing order doesn't matter."""
+        return sorted({self.token_id(field, token) for token in tokens})
+
+
+def blend_tokens(blend: Dict[str, Any]) -> Dict[str, List[str]]:
+    """tokenize() for every token field of one blend."""
+    return {field: tokenize(field, blend.get(field)) for field in TOKEN_FIELDS}
+
+
+def build_token_index(vocabulary: Vocabulary, rows: Iterable[Dict[str, List[str]]]) -> Dict[str, Any]:
+    """Token index for blend_tokens() rows in ordinal order; adds unseen tokens to `vocabulary`."""
+    rows = list(rows)
+    fields = {}
+    for field in TOKEN_FIELDS:
+        blends = [vocabulary.encode(field, row[field]) for row in rows]
+        postings = [[] for _ in vocabulary.fields[field]]
+        for ordinal, token_ids in enumerate(blends):
+            for token_id in token_ids:
+                postings[token_id].append(ordinal)
+        fields[field] = {"tokens": list(vocabulary.fields[field]), "blends": blends, "postings": postings}
+    return {"version": TOKEN_INDEX_VERSION, "count": len(rows), "fields": fields}
+
+
+def render_token_index(index: Dict[str, Any]) -> str:
+    return json.dumps(index, ensure_ascii=False, separators=(",", ":"))
+
+
+def lookup(index: Dict[str, Any], field: str, token: str) -> List[int]:
+    """Ordinals of the blends carrying a token (empty for unknown tokens)."""
+    data = index["fields"][field]
+    key = token_key(token)
+    for token_id, spelling in enumerate(data["tokens"]):
+        if token_key(spelling) == key:
+            return data["postings"][token_id]
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the contents/flavoring token vocabulary.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--list", metavar="FIELD", choices=sorted(TOKEN_FIELDS),
+                       help="print every token of FIELD with its ID and blend count")
+    group.add_argument("--token", metavar="FIELD=TOKEN", help="print the blends carrying a token")
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR,
+                        help="where token_vocab.json lives (default assets/data)")
+    args = parser.parse_args()
+
+    records = load_blends(args.blend_dir)
+    filenames = list(records)
+    index = build_token_index(Vocabulary.load(args.data_dir), (blend_tokens(r.data) for r in records.values()))
+
+    if args.list:
+        data = index["fields"][args.list]
+        for token_id, spelling in enumerate(data["tokens"]):
+            print(f"{token_id:>4}  {len(data['postings'][token_id]):>6}  {spelling}")
+        return
+
+    field, sep, token = args.token.partition("=")
+    if not sep or field not in TOKEN_FIELDS:
+        print(f"Error: expected FIELD=TOKEN with FIELD one of {', '.join(TOKEN_FIELDS)}", file=sys.stderr)
+        sys.exit(1)
+    ordinals = lookup(index, field, token)
+    for ordinal in ordinals:
+        print(filenames[ordinal])
+    print(f"\n{len(ordinals)} blends carry {field} token {token!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,24 @@
+"""
+Edit blend files, interactively or as a batch.
+
+    python site_tools/edit_blend_data.py                                # interactive
+    python site_tools/edit_blend_data.py --patch edits.jsonl --dry-run  # check guards, print the diff summary
+    python site_tools/edit_blend_data.py --patch edits.jsonl            # apply all edits or none
+
+See blend_patch.py for the patch stream format.
+"""
 from pathlib import Path
+import argparse
 import json
 import sys
 import os
+import time
 from typing import List, Dict, Any
 
+from blend_corpus import BLEND_DATA_DIR, BlendConflict, list_blend_files, read_blend_file, update_blend_file
+from blend_patch import EDITABLE_FIELDS, PatchError, parse_patches, plan, commit, diff_summary
+from blend_search import SearchIndex, SEARCH_INDEX_PATH
+
 def clear_screen():
     """Clear the terminal screen."""
     os.system('cls' if os.name == 'nt' else 'clear')
@@ -78,14 +93,34 @@ def get_selection(items: List[str], title: str, current_value: str = None) -> st
         elif key == 'DOWN':
             selected = (selected + 1) % len(items)
 
+_search_index = None
+
+def load_search_index():
+    """Load the prebuilt search index once per session (None if it hasn't been built)."""
+    global _search_index
+    if _search_index is None and SEARCH_INDEX_PATH.exists():
+        try:
+            _search_index = SearchIndex.load(SEARCH_INDEX_PATH)
+        except (OSError, ValueError) as e:
+            print(f"Could not load search index: {str(e)}", file=sys.stderr)
+    return _search_index
+
 def search_blend_files(search_term: str, blend_data_path: Path) -> List[str]:
-    """Search for blend files matching the search term."""
+    """Search for blend files matching the search term, best matches first."""
+    index = load_search_index()
+    if index is not None:
+        # The index is rebuilt by scripts/build_site_data.py, so skip anything deleted since
+        hits = [hit.filename for hit in index.search(search_term, limit=50)
+                if (blend_data_path / hit.filename).exists()]
+        if hits:
+            return hits
+
     matching_files = []
     search_term = search_term.lower()
     
-    for file_path in blend_data_path.glob("*.json"):
-        if search_term in file_path.stem.lower():
-            matching_files.append(file_path.name)
+    for filename in list_blend_files(blend_data_path):
+        if search_term in filename[:-len(".json")].lower():
+            matching_files.append(filename)
     
     return sorted(matching_files)
 
@@ -124,32 +159,13 @@ def confirm_edit(field: str, old_value: str, new_value: str) -> str:
 
 def edit_blend_data(file_path: Path) -> None:
     """Edit the selected blend data file."""
-    # Define allowed fields
-    ALLOWED_FIELDS = [
-        "blendedBy",
-        "manufacturedBy",
-        "production",
-        "country",
-        "blendType",
-        "contents",
-        "cut",
-        "packaging",
-        "flavoring",
-        "description",
-        "notes"
-    ]
-    
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Get the first (and only) key in the JSON object
-        blend_key = next(iter(data))
-        blend_data = data[blend_key]
+        record = read_blend_file(file_path)
+        blend_key, blend_data = record.key, record.data
         
         while True:
             # Filter fields to only show allowed fields
-            available_fields = [field for field in ALLOWED_FIELDS if field in blend_data]
+            available_fields = [field for field in EDITABLE_FIELDS if field in blend_data]
             
             # Get field to edit
             field = get_selection(available_fields, "Select Field to Edit", 
@@ -165,9 +181,19 @@ def edit_blend_data(file_path: Path) -> None:
             choice = confirm_edit(field, current_value, new_value)
             
             if choice == "Yes":
-                blend_data[field] = new_value
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=4)
+                def set_field(data: dict) -> None:
+                    # Re-read under the blend's lock: other fields (ratings) may have changed
+                    # meanwhile and are kept, but this field must still be what was shown
+                    if str(data.get(field, "")) != current_value:
+                        raise BlendConflict(f"{field} was changed by someone else to: {data.get(field, '')}")
+                    data[field] = new_value
+
+                try:
+                    update_blend_file(file_path, set_field)
+                except BlendConflict as e:
+                    print(f"\nNot saved: {e}")
+                    input("\nPress Enter to continue...")
+                    break
                 print("\nChanges saved successfully!")
                 break
             elif choice == "Edit":
@@ -180,11 +206,47 @@ def edit_blend_data(file_path: Path) -> None:
         print(f"Error editing file: {str(e)}")
         input("\nPress Enter to continue...")
 
-def main():
-    # Setup paths
-    root = Path(__file__).parent.parent
-    blend_data_path = root / "blend_data"
-    
+def run_patch(patch_file: str, blend_dir: Path, dry_run: bool, show_diff: bool,
+              changed_list: Path = None, workers: int = None) -> None:
+    """Apply a JSONL patch stream as one transaction."""
+    start = time.perf_counter()
+    try:
+        if patch_file == "-":
+            patches = parse_patches(sys.stdin)
+        else:
+            with open(patch_file, 'r', encoding='utf-8') as f:
+                patches = parse_patches(f)
+        changes = plan(patches, blend_dir, workers)
+        summary = diff_summary(patches, changes)
+        written = [] if dry_run else commit(changes, blend_dir)
+    except PatchError as e:
+        for error in e.errors[:50]:
+            print(error, file=sys.stderr)
+        if len(e.errors) > 50:
+            print(f"... and {len(e.errors) - 50} more", file=sys.stderr)
+        print(f"Batch rejected ({len(e.errors)} errors); no files were changed", file=sys.stderr)
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+
+    if show_diff:
+        for change in changes:
+            for field, old, new in change.changed:
+                print(f"{change.filename}  {field}")
+                print(f"  - {json.dumps(old, ensure_ascii=False)}")
+                print(f"  + {json.dumps(new, ensure_ascii=False)}")
+
+    fields = ", ".join(f"{field} {count}" for field, count in summary["fields"].items())
+    verb = "Would change" if dry_run else "Changed"
+    print(f"{verb} {summary['edits']} values in {summary['filesChanged']} of {summary['files']} files "
+          f"from {summary['patches']} patches ({summary['unchanged']} already applied) in {elapsed:.2f}s"
+          + (f"; {fields}" if fields else ""))
+
+    if changed_list and written:
+        with open(changed_list, 'a', encoding='utf-8') as f:
+            for filename in written:
+                f.write(f"{os.path.relpath(Path(blend_dir) / filename)}\n")
+
+def interactive(blend_data_path: Path) -> None:
     while True:
         clear_screen()
         # Get search term
@@ -211,6 +273,22 @@ def main():
         if get_selection(["Edit Another", "Quit"], "What Next?") == "Quit":
             break
 
+def main():
+    parser = argparse.ArgumentParser(description="Edit blend files interactively or from a JSONL patch stream.")
+    parser.add_argument("--patch", metavar="FILE", help="apply a JSONL patch stream ('-' for stdin) and exit")
+    parser.add_argument("--dry-run", action="store_true", help="check every guard and report, but write nothing")
+    parser.add_argument("--diff", action="store_true", help="print every changed value")
+    parser.add_argument("--changed-list", type=Path, metavar="FILE",
+                        help="append the rewritten blend files here, one per line")
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.patch:
+        run_patch(args.patch, args.blend_dir, args.dry_run, args.diff, args.changed_list, args.workers)
+    else:
+        interactive(args.blend_dir)
+
 if __name__ == "__main__":
     try:
         main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Precomputed facet cubes for graphs.html, written by scripts/build_site_data.py to
+assets/data/facets/.
+
+    <field>.json                 counts and mean rating per value of one facet
+    <field>__<field>.json        the same per pair of values, for the common combinations
+    graphs.json                  the rating-profile scatter plots, binned by profile level and
+                                 rating band, plus the page's checkbox lists
+    graphs_<field>.json          the scatter bins split by each value of one filter facet
+
+A facet cube is {"fields": [...], "columns": [...], "rows": [[value, ..., measure, ...]]},
+largest group first. Scatter bins are [level (1-10), rating band, blends, reviews]. All of
+it comes from the columnar snapshot (blend_snapshot.py), so the page draws its charts from
+a few kilobytes instead of looping over the whole blend index.
+
+    python site_tools/facet_cubes.py --output-dir /tmp/facets
+"""
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from blend_corpus import BLEND_DATA_DIR, ROOT_DIR
+from blend_snapshot import LEVEL_FIELDS, RATING_BAND_FIELD, Snapshot, load_snapshot
+
+FACET_DIR_NAME = "facets"
+GRAPHS_FILE = "graphs.json"
+
+# One-way cubes, in the order cube file names list their fields
+FACET_FIELDS = ["country", "blendType", "cut", "production", "contentsToken", "flavoringToken", "blender"]
+
+# Facets graphs.html can filter on without the full index; every pair of one of these
+# with any other facet gets a two-way cube
+FILTER_FACETS = ["country", "blendType", "cut", "production"]
+
+CUBE_COLUMNS = ["blends", "rated", "reviews", "rating", "meanAverage"]
+
+
+def cube_name(fields: List[str]) -> str:
+    return "__".join(sorted(fields, key=FACET_FIELDS.index)) + ".json"
+
+
+def cube_fields() -> List[List[str]]:
+    """Every cube written: each facet alone, then each filter facet with each other facet."""
+    pairs = {tuple(sorted(pair, key=FACET_FIELDS.index))
+             for pair in combinations(FACET_FIELDS, 2) if set(pair) & set(FILTER_FACETS)}
+    # Two token fields can't be grouped together
+    pairs = [pair for pair in pairs if not all(field.endswith("Token") for field in pair)]
+    return [[field] for field in FACET_FIELDS] + [list(pair) for pair in sorted(pairs, key=cube_name)]
+
+
+def facet_cube(snapshot: Snapshot, fields: List[str]) -> Dict[str, Any]:
+    rows = snapshot.group_by(*fields)
+    return {
+        "fields": fields,
+        "columns": CUBE_COLUMNS,
+        "rows": [[row[field] for field in fields] + [row[column] for column in CUBE_COLUMNS] for row in rows],
+    }
+
+
+def scatter_bins(snapshot: Snapshot, mask: Optional[np.ndarray] = None,
+                 split_by: Optional[str] = None) -> Dict[str, Any]:
+    """
+    {profile: [[level, band, blends, reviews], ...]} over rated blends with a profile level,
+    or {value: {profile: bins}} when split by a facet.
+    """
+    rated = snapshot.reviews > 0
+    mask = rated if mask is None else mask & rated
+    split: Dict[str, Dict[str, list]] = {}
+    for level_field, profile_type in LEVEL_FIELDS.items():
+        fields = ([split_by] if split_by else []) + [level_field, RATING_BAND_FIELD]
+        levels = snapshot.vocab[level_field]
+        for row in snapshot.group_by(*fields, mask=mask & (snapshot.codes[level_field] > 0)):
+            key = row[split_by] if split_by else ""
+            bins = split.setdefault(key, {}).setdefault(profile_type, [])
+            bins.append([levels.index(row[level_field]), float(row[RATING_BAND_FIELD]), row["blends"], row["reviews"]])
+    for profiles in split.values():
+        for bins in profiles.values():
+            bins.sort()
+    return split if split_by else split.get("", {})
+
+
+def dump(payload: Any) -> str:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def render_facets(snapshot: Snapshot, contents: List[str], flavorings: List[str]) -> Dict[str, str]:
+    """Every file for assets/data/facets/, as {filename: text}."""
+    cubes = cube_fields()
+    rendered = {cube_name(fields): dump(facet_cube(snapshot, fields)) for fields in cubes}
+    rendered[GRAPHS_FILE] = dump({
+        "blends": len(snapshot),
+        "maxReviewCount": int(snapshot.review_count.max()) if len(snapshot) else 0,
+        "contents": contents,
+        "flavorings": flavorings,
+        "filterFacets": FILTER_FACETS,
+        "cubes": [cube_name(fields) for fields in cubes],
+        "profiles": scatter_bins(snapshot),
+    })
+    for field in FILTER_FACETS:
+        rendered[f"graphs_{field}.json"] = dump({"field": field, "values": scatter_bins(snapshot, split_by=field)})
+    return rendered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the facet cubes for graphs.html.")
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    parser.add_argument("--output-dir", type=Path, default=ROOT_DIR / "assets" / "data" / FACET_DIR_NAME)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    snapshot = load_snapshot(args.blend_dir)
+    lists = []
+    for filename in ("contents.json", "flavorings.json"):
+        try:
+            with open(ROOT_DIR / "assets" / "data" / filename, 'r', encoding='utf-8') as f:
+                lists.append(json.load(f))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Could not read {filename}: {e}", file=sys.stderr)
+            lists.append([])
+    rendered = render_facets(snapshot, *lists)
+    elapsed = time.perf_counter() - start
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    for filename, text in rendered.items():
+        (args.output_dir / filename).write_text(text, encoding='utf-8')
+    total = sum(len(text.encode('utf-8')) for text in rendered.values())
+    print(f"Wrote {len(rendered)} facet files ({total / 1024:.0f} KB) to {args.output_dir} in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Find duplicate blend pictures and optionally store each distinct picture once.
+
+Every picture in blend_pictures/ gets a content hash and a 64-bit perceptual hash
+(dHash), computed in parallel and cached by (mtime, size). Pictures with the same bytes
+are exact duplicates; pictures whose perceptual hashes differ in only a few bits are
+near duplicates (re-encoded or resized copies of the same shot). The report also lists
+blends whose imagePath points at a missing file.
+
+With --content-address, every referenced picture is copied to
+blend_pictures/by-hash/<hash>.jpg and imagePath is switched to that file, so identical
+pictures are stored and cached once. --prune then deletes the named pictures this run
+moved to by-hash/ that nothing references any more; pictures it didn't move, and the
+ones the site uses without any blend referencing them (PROTECTED_PICTURES), stay.
+
+    python site_tools/image_dedup.py                       # report only
+    python site_tools/image_dedup.py --content-address --prune
+"""
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from blend_corpus import (BLEND_DATA_DIR, PICTURES_DIR, ROOT_DIR, map_chunks, load_blends, picture_for,
+                          cache_path_for, read_pickle, write_pickle, update_blend_file)
+from image_pipeline import SOURCE_EXTENSIONS
+
+REPORT_FILE = ROOT_DIR / "site_tools_output" / "image_dedup_report.json"
+CONTENT_DIR_NAME = "by-hash"
+CONTENT_HASH_LENGTH = 16
+
+# Used by the site itself (blend_html/popup.js shows it for blends without a picture),
+# so never pruned although no imagePath points at it
+PROTECTED_PICTURES = {"pictureless.jpg"}
+
+# Pictures whose dHashes differ in at most this many of 64 bits count as near duplicates
+NEAR_DISTANCE = 4
+
+STATE_VERSION = 1
+PARALLEL_THRESHOLD = 64
+
+BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def dhash(img: Image.Image) -> int:
+    """64-bit difference hash: is each pixel of a 9x8 greyscale thumbnail brighter than its right neighbour."""
+    img.draft("L", (36, 32))
+    pixels = np.asarray(img.convert("L").resize((9, 8), Image.Resampling.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, :-1] > pixels[:, 1:]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _hash_chunk(pictures_dir: str, names: List[str]) -> List[tuple]:
+    """Worker: (name, sha1, dhash, error) for a chunk of pictures."""
+    results = []
+    for name in names:
+        try:
+            path = Path(pictures_dir) / name
+            with open(path, 'rb') as f:
+                sha1 = hashlib.sha1(f.read()).hexdigest()
+            with Image.open(path) as img:
+                results.append((name, sha1, dhash(img), None))
+        except Exception as e:
+            results.append((name, None, None, str(e)))
+    return results
+
+
+def list_pictures(pictures_dir: Path) -> Dict[str, Tuple[int, int]]:
+    """Return {path relative to pictures_dir: (mtime_ns, size)} for every picture, recursively."""
+    stats = {}
+    for root, _, filenames in os.walk(pictures_dir):
+        for filename in filenames:
+            if filename.lower().endswith(SOURCE_EXTENSIONS):
+                path = Path(root) / filename
+                st = path.stat()
+                stats[path.relative_to(pictures_dir).as_posix()] = (st.st_mtime_ns, st.st_size)
+    return dict(sorted(stats.items()))
+
+
+def hash_pictures(pictures_dir: Path = PICTURES_DIR, workers: int = None,
+                  errors: List[Tuple[str, str]] = None) -> Dict[str, Tuple[str, int]]:
+    """Return {picture: (sha1, dhash)}, re-hashing only pictures whose (mtime, size) changed."""
+    state_file = cache_path_for(pictures_dir, "image_hashes")
+    state = read_pickle(state_file, STATE_VERSION) or {"version": STATE_VERSION, "entries": {}}
+    entries = state["entries"]
+
+    stats = list_pictures(pictures_dir)
+    stale = [name for name, stat in stats.items() if name not in entries or entries[name][0] != stat]
+    for name, sha1, phash, error in map_chunks(_hash_chunk, pictures_dir, stale, workers,
+                                               threshold=PARALLEL_THRESHOLD):
+        if error is not None:
+            if errors is not None:
+                errors.append((name, error))
+            entries.pop(name, None)
+            continue
+        entries[name] = (stats[name], sha1, phash)
+
+    removed = [name for name in entries if name not in stats]
+    for name in removed:
+        del entries[name]
+    if stale or removed:
+        write_pickle(state_file, state)
+    return {name: (entries[name][1], entries[name][2]) for name in stats if name in entries}
+
+
+def exact_groups(hashes: Dict[str, Tuple[str, int]]) -> List[List[str]]:
+    """Groups of pictures with identical bytes."""
+    by_sha1: Dict[str, List[str]] = {}
+    for name, (sha1, _) in hashes.items():
+        by_sha1.setdefault(sha1, []).append(name)
+    return sorted(names for names in by_sha1.values() if len(names) > 1)
+
+
+def near_groups(hashes: Dict[str, Tuple[str, int]], max_distance: int = NEAR_DISTANCE) -> List[List[str]]:
+    """
+    Groups of pictures within max_distance bits of the group's first picture, one
+    representative per distinct file. Grouping around a first member rather than linking
+    every close pair keeps long chains of merely similar pictures (plain tins of the same
+    brand) from collapsing into one group. Pairwise distances are computed a block of rows
+    at a time with NumPy.
+    """
+    by_sha1: Dict[str, str] = {}
+    for name, (sha1, _) in hashes.items():
+        by_sha1.setdefault(sha1, name)
+    names = sorted(by_sha1.values())
+    if not names:
+        return []
+    values = np.array([hashes[name][1] for name in names], dtype=np.uint64)
+    as_bytes = values.view(np.uint8).reshape(-1, 8)
+
+    neighbours: Dict[int, List[int]] = {}
+    block = 512
+    for start in range(0, len(names), block):
+        xor = as_bytes[start:start + block, None, :] ^ as_bytes[None, :, :]
+        distances = BYTE_POPCOUNT[xor].sum(axis=2, dtype=np.uint8)
+        rows, cols = np.nonzero(distances <= max_distance)
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            if start + row < col:
+                neighbours.setdefault(start + row, []).append(col)
+
+    grouped = set()
+    groups = []
+    for i in sorted(neighbours):
+        if i in grouped:
+            continue
+        members = [i] + [j for j in neighbours[i] if j not in grouped]
+        if len(members) > 1:
+            grouped.update(members)
+            groups.append([names[j] for j in members])
+    return groups
+
+
+def content_name(sha1: str, picture: str) -> str:
+    return f"{CONTENT_DIR_NAME}/{sha1[:CONTENT_HASH_LENGTH]}{Path(picture).suffix.lower()}"
+
+
+def content_address(blends: Dict[str, Any], hashes: Dict[str, Tuple[str, int]], pictures_dir: Path,
+                    blend_dir: Path) -> Tuple[List[str], List[str]]:
+    """
+    Copy each referenced picture to by-hash/ and point imagePath at it; returns the blend
+    files changed and the named pictures they were moved away from.
+    """
+    (pictures_dir / CONTENT_DIR_NAME).mkdir(exist_ok=True)
+    changed, moved = [], []
+    for filename, record in blends.items():
+        image_path = record.data.get("imagePath")
+        picture = picture_for(image_path, pictures_dir)
+        if picture is None:
+            continue
+        name = picture.relative_to(pictures_dir).as_posix()
+        if name not in hashes or name.startswith(CONTENT_DIR_NAME + "/"):
+            continue
+        target = content_name(hashes[name][0], name)
+        if not (pictures_dir / target).exists():
+            shutil.copy2(picture, pictures_dir / target)
+        new_path = f"../blend_pictures/{target}"
+        if image_path != new_path:
+
+            def set_image(blend: Dict[str, Any]) -> None:
+                blend["imagePath"] = new_path
+
+            update_blend_file(blend_dir / filename, set_image)
+            changed.append(filename)
+            if name not in moved:
+                moved.append(name)
+    return changed, moved
+
+
+def unreferenced(blends: Dict[str, Any], hashes: Dict[str, Tuple[str, int]], pictures_dir: Path) -> List[str]:
+    """Pictures no blend's imagePath points at."""
+    referenced = set()
+    for record in blends.values():
+        picture = picture_for(record.data.get("imagePath"), pictures_dir)
+        if picture is not None:
+            referenced.add(picture.relative_to(pictures_dir).as_posix())
+    return [name for name in hashes if name not in referenced]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report duplicate and missing blend pictures.")
+    parser.add_argument("--pictures-dir", type=Path, default=PICTURES_DIR)
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    parser.add_argument("--distance", type=int, default=NEAR_DISTANCE,
+                        help=f"max dHash bit difference for near duplicates (default {NEAR_DISTANCE})")
+    parser.add_argument("--report", type=Path, default=REPORT_FILE)
+    parser.add_argument("--content-address", action="store_true",
+                        help="store referenced pictures under by-hash/ and switch imagePath to them")
+    parser.add_argument("--prune", action="store_true",
+                        help="with --content-address, delete the named pictures it moved that nothing references any more")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    errors = []
+    hashes = hash_pictures(args.pictures_dir, args.workers, errors)
+    blends = load_blends(args.blend_dir)
+    hashed = time.perf_counter()
+
+    exact = exact_groups(hashes)
+    near = near_groups(hashes, args.distance)
+    missing = []
+    for filename, record in blends.items():
+        image_path = record.data.get("imagePath") or ""
+        if picture_for(image_path, args.pictures_dir) is None:
+            missing.append({"blend": filename, "imagePath": image_path})
+
+    print(f"Hashed {len(hashes)} pictures in {hashed - start:.2f}s; "
+          f"{len(exact)} groups of identical pictures ({sum(len(g) - 1 for g in exact)} redundant copies), "
+          f"{len(near)} groups of near duplicates, {len(missing)} blends with a missing picture")
+
+    if args.content_address:
+        changed, moved = content_address(blends, hashes, args.pictures_dir, args.blend_dir)
+        print(f"Pointed imagePath at by-hash/ pictures in {len(changed)} blend files")
+        if args.prune:
+            blends = load_blends(args.blend_dir)
+            hashes = hash_pictures(args.pictures_dir, args.workers)
+            # Only what this run moved: a picture may be unreferenced for reasons of its own
+            candidates = set(moved) - PROTECTED_PICTURES
+            pruned = [name for name in unreferenced(blends, hashes, args.pictures_dir) if name in candidates]
+            for name in pruned:
+                (args.pictures_dir / name).unlink()
+            print(f"Deleted {len(pruned)} pictures nothing references")
+
+    report = {
+        "exact": exact,
+        "near": near,
+        "missing": missing,
+        "unreferenced": unreferenced(blends, hashes, args.pictures_dir),
+        "errors": [{"picture": name, "error": error} for name, error in errors],
+    }
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    print(f"Report written to {args.report}")
+    for name, error in errors:
+        print(f"Error processing {args.pictures_dir / name}: {error}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import os
 import shlex
-import shutil
-from PIL import Image, ImageOps
+
+from image_pipeline import OUTPUT_DIR, build_images
 
 def clear_console():
     """Clears the console screen for better visibility."""
@@ -42,13 +42,6 @@ def select_directory(prompt: str) -> str:
         dir_path = dir_input
     return dir_path.strip('"').strip("'") if os.path.isdir(dir_path) else ""
 
-def resize_and_crop(input_path: str, output_path: str, size=(262, 262)):
-    """Resize image to fill the given size while maintaining aspect ratio (crop excess)."""
-    with Image.open(input_path) as img:
-        img = img.convert("RGB")  # Ensure compatibility with JPEG format
-        img = ImageOps.fit(img, size, method=Image.Resampling.LANCZOS)
-        img.save(output_path, "JPEG", quality=85, optimize=True)
-
 if __name__ == "__main__":
     clear_console()
     display_ascii_art()
@@ -57,15 +50,8 @@ if __name__ == "__main__":
     if not input_dir:
         exit("Invalid input directory provided. Exiting.")
 
-    root_dir = os.path.expanduser("~/Documents/GitHub/TabacWiki")
-    output_dir = os.path.join(root_dir, "site_tools_output", "blend_pictures")
-    os.makedirs(output_dir, exist_ok=True)
-
-    for filename in os.listdir(input_dir):
-        if filename.lower().endswith(("jpg", "jpeg", "png", "webp", "bmp", "gif")):
-            input_path = os.path.join(input_dir, filename)
-            output_filename = os.path.splitext(filename)[0] + ".jpg"
-            output_path = os.path.join(output_dir, output_filename)
-            resize_and_crop(input_path, output_path)
+    summary = build_images(input_dir, OUTPUT_DIR)
+    for filename, error in summary["errors"]:
+        print(f"⚠️ Could not process {filename}: {error}")
 
-    print("\n✅ All images have been resized and saved in:", output_dir)
+    print(f"\n✅ {summary['rendered']} new or changed images resized and saved in:", OUTPUT_DIR)
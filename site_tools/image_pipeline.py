@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Shared blend picture pipeline.
+
+Each source image is decoded once and written as every configured variant: the 262x262
+JPEG the site uses, a 2x JPEG for high-density screens and a WebP. A state file records
+each source's (mtime, size), content hash and the variant spec it was rendered with, so a
+re-run only touches new or changed pictures. Large batches run on a process pool.
+Variants are named after the source's stem, so sources that differ only in extension
+(X.jpg and X.png) are rejected as errors rather than overwriting each other's outputs.
+
+    python site_tools/image_pipeline.py blend_pictures
+    python site_tools/image_pipeline.py ~/Downloads/new_pictures --output-dir blend_pictures
+"""
+from functools import partial
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, NamedTuple
+import argparse
+import hashlib
+import io
+import os
+import sys
+import time
+
+from PIL import Image, ImageOps
+
+from blend_corpus import ROOT_DIR, map_chunks, cache_path_for, read_pickle, write_pickle
+
+OUTPUT_DIR = ROOT_DIR / "site_tools_output" / "blend_pictures"
+SOURCE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif")
+BASE_SIZE = (262, 262)
+
+# Bump whenever rendering changes in a way the variant spec doesn't capture
+STATE_VERSION = 1
+
+# Each image costs milliseconds rather than microseconds, so pools pay off much sooner
+# than they do for blend JSON
+PARALLEL_THRESHOLD = 32
+CHUNK_SIZE = 16
+
+
+class ImageVariant(NamedTuple):
+    """One output rendition: {stem}{suffix}{extension} at BASE_SIZE * scale."""
+    name: str
+    suffix: str
+    extension: str
+    scale: int
+    format: str
+    quality: int
+
+
+VARIANTS = [
+    ImageVariant("jpg", "", ".jpg", 1, "JPEG", 85),
+    ImageVariant("2x", "@2x", ".jpg", 2, "JPEG", 85),
+    ImageVariant("webp", "", ".webp", 1, "WEBP", 80),
+]
+
+
+def variant_filename(stem: str, variant: ImageVariant) -> str:
+    return f"{stem}{variant.suffix}{variant.extension}"
+
+
+def spec_key(variants: List[ImageVariant], size: Tuple[int, int], upscale: bool) -> str:
+    """Identifies everything that determines the outputs apart from the source bytes."""
+    return repr((STATE_VERSION, size, upscale, [tuple(v) for v in variants]))
+
+
+def render_variants(source: Any, output_dir: Path, stem: str, variants: List[ImageVariant] = VARIANTS,
+                    size: Tuple[int, int] = BASE_SIZE, upscale: bool = False) -> List[str]:
+    """
+    Decode `source` (a path or bytes) once and write each variant into output_dir.
+
+    Images are cropped to fill the target size, keeping the aspect ratio. Variants larger
+    than the source are skipped unless `upscale` is set, apart from the base size, which is
+    always written. Returns the filenames written.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    output_dir = Path(output_dir)
+    written = []
+    with Image.open(source) as img:
+        img = img.convert("RGB")  # Ensure compatibility with JPEG format
+        for variant in variants:
+            target = (size[0] * variant.scale, size[1] * variant.scale)
+            if variant.scale > 1 and not upscale and (img.width < target[0] or img.height < target[1]):
+                continue
+            fitted = ImageOps.fit(img, target, method=Image.Resampling.LANCZOS)
+            filename = variant_filename(stem, variant)
+            tmp_path = output_dir / (filename + ".tmp")
+            fitted.save(tmp_path, variant.format, quality=variant.quality, optimize=True)
+            os.replace(tmp_path, output_dir / filename)
+            written.append(filename)
+    return written
+
+
+def _render_chunk(input_dir: str, filenames: List[str], output_dir: str, variants: List[ImageVariant],
+                  size: Tuple[int, int], upscale: bool) -> List[tuple]:
+    """Worker: hash and render a chunk of source images; returns (filename, sha1, outputs, error)."""
+    results = []
+    for filename in filenames:
+        try:
+            with open(Path(input_dir) / filename, 'rb') as f:
+                data = f.read()
+            outputs = render_variants(data, Path(output_dir), Path(filename).stem, variants, size, upscale)
+            results.append((filename, hashlib.sha1(data).hexdigest(), outputs, None))
+        except Exception as e:
+            results.append((filename, None, None, str(e)))
+    return results
+
+
+def list_sources(input_dir: Path) -> Dict[str, Tuple[int, int]]:
+    """Return {filename: (mtime_ns, size)} for every source image, sorted by filename."""
+    stats = {}
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if entry.name.lower().endswith(SOURCE_EXTENSIONS) and entry.is_file():
+                st = entry.stat()
+                stats[entry.name] = (st.st_mtime_ns, st.st_size)
+    return dict(sorted(stats.items()))
+
+
+def file_sha1(path: Path) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def build_images(input_dir: Path, output_dir: Path = OUTPUT_DIR, variants: List[ImageVariant] = VARIANTS,
+                 size: Tuple[int, int] = BASE_SIZE, upscale: bool = False, force: bool = False,
+                 workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Render every source image in input_dir that is new, changed, or was rendered with a
+    different spec, and delete the outputs of sources that have gone. Sources sharing a
+    stem are reported as errors and left as they were. Returns a summary.
+    """
+    input_dir = Path(input_dir)
+    output_dir = Path(output_dir)
+    if input_dir.resolve() == output_dir.resolve():
+        raise ValueError("The output directory must differ from the input directory")
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    spec = spec_key(variants, size, upscale)
+    state_file = cache_path_for(output_dir, "image_pipeline")
+    state = read_pickle(state_file, STATE_VERSION)
+    if state is None or state.get("input_dir") != str(input_dir.resolve()):
+        state = {"version": STATE_VERSION, "spec": spec, "input_dir": str(input_dir.resolve()), "entries": {}}
+    # Entries rendered under another spec are kept, so their outputs can still be cleaned up
+    rerender_all = force or state["spec"] != spec
+    state["spec"] = spec
+    entries = state["entries"]
+
+    stats = list_sources(input_dir)
+    # Case-insensitively, as the outputs would collide on macOS and Windows too
+    by_stem: Dict[str, List[str]] = {}
+    for filename in stats:
+        by_stem.setdefault(Path(filename).stem.casefold(), []).append(filename)
+    collisions = [(filename, f"same output names as {', '.join(other for other in group if other != filename)}")
+                  for group in by_stem.values() if len(group) > 1 for filename in group]
+    colliding = {filename for filename, _ in collisions}
+
+    stale = []
+    refreshed = 0
+    for filename, stat in stats.items():
+        if filename in colliding:
+            continue
+        entry = entries.get(filename)
+        if not rerender_all and entry is not None and all((output_dir / name).exists() for name in entry["outputs"]):
+            if entry["stat"] == stat:
+                continue
+            # Touched but not edited (a fresh checkout, say): keep the outputs
+            if entry["sha1"] == file_sha1(input_dir / filename):
+                entry["stat"] = stat
+                refreshed += 1
+                continue
+        stale.append(filename)
+
+    removed = [filename for filename in entries if filename not in stats]
+    for filename in removed:
+        for name in entries.pop(filename)["outputs"]:
+            (output_dir / name).unlink(missing_ok=True)
+
+    worker = partial(_render_chunk, output_dir=str(output_dir), variants=list(variants), size=size, upscale=upscale)
+    errors = []
+    for filename, sha1, outputs, error in map_chunks(worker, input_dir, stale, workers,
+                                                     threshold=PARALLEL_THRESHOLD, chunk_size=CHUNK_SIZE):
+        if error is not None:
+            errors.append((filename, error))
+            entries.pop(filename, None)
+            continue
+        previous = entries.get(filename)
+        for name in set(previous["outputs"] if previous else ()) - set(outputs):
+            (output_dir / name).unlink(missing_ok=True)
+        entries[filename] = {"stat": stats[filename], "sha1": sha1, "outputs": outputs}
+
+    if stale or removed or refreshed or rerender_all:
+        write_pickle(state_file, state)
+
+    return {
+        "sources": len(stats),
+        "rendered": len(stale) - len(errors),
+        "removed": len(removed),
+        "errors": collisions + errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render blend pictures into their site variants.")
+    parser.add_argument("input_dir", type=Path)
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR)
+    parser.add_argument("--variants", default=",".join(v.name for v in VARIANTS),
+                        help="comma-separated subset of: " + ", ".join(v.name for v in VARIANTS))
+    parser.add_argument("--upscale", action="store_true", help="also write variants larger than the source")
+    parser.add_argument("--force", action="store_true", help="ignore the state file and re-render everything")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size")
+    args = parser.parse_args()
+
+    names = args.variants.split(",")
+    unknown = set(names) - {v.name for v in VARIANTS}
+    if unknown:
+        parser.error(f"unknown variants: {', '.join(sorted(unknown))}")
+
+    start = time.perf_counter()
+    summary = build_images(args.input_dir, args.output_dir, [v for v in VARIANTS if v.name in names],
+                           upscale=args.upscale, force=args.force, workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    print(f"Rendered {summary['rendered']} of {summary['sources']} images "
+          f"({summary['removed']} removed) into {args.output_dir} in {elapsed:.2f}s")
+    for filename, error in summary["errors"]:
+        print(f"Error processing {args.input_dir / filename}: {error}", file=sys.stderr)
+    if summary["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Corpus-wide rating aggregates, computed in one vectorised pass.
+
+Every blend's star counts are loaded into a blends x 8 matrix and each rating profile's
+level counts into a blends x 10 matrix. Averages, profile modes, normalised distributions
+and Bayesian-adjusted scores then come out of a handful of NumPy operations instead of a
+Python loop per blend. The results match the per-blend helpers in blend_ratings.py.
+
+    python site_tools/rating_aggregates.py               # report stale stored averages
+    python site_tools/rating_aggregates.py --write       # fix them in blend_data/
+    python site_tools/rating_aggregates.py --top 20      # best blends by Bayesian score
+"""
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable, NamedTuple
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from blend_corpus import BLEND_DATA_DIR, ROOT_DIR, BlendRecord, load_blends, update_blend_file
+from blend_ratings import PROFILE_SCALES, STAR_KEYS, STAR_VALUES, UNRATED_LEVEL, profile_counts
+
+OUTPUT_FILE = ROOT_DIR / "site_tools_output" / "rating_aggregates.json"
+
+
+class RatingMatrix(NamedTuple):
+    """Rating counters for a corpus, one row per blend in `filenames` order."""
+    filenames: List[str]
+    stars: np.ndarray                  # blends x 8, STAR_KEYS order
+    profiles: Dict[str, np.ndarray]    # profile -> blends x 10, PROFILE_SCALES level order
+    stored_average: np.ndarray         # averageRating as stored in each file
+    tiebreaks: Dict[str, np.ndarray] = {}  # profile -> stored tiebreak level index, -1 for none
+
+
+class RatingAggregates(NamedTuple):
+    reviews: np.ndarray                # star ratings per blend
+    average: np.ndarray                # mean stars, rounded half up to 2 decimals
+    bayesian: np.ndarray               # average shrunk towards the corpus mean
+    prior_mean: float
+    prior_weight: float
+    levels: Dict[str, np.ndarray]      # profile -> index of the mode level, -1 when unrated
+    distributions: Dict[str, np.ndarray]  # profile -> counts as a percentage of the mode
+
+
+def load_rating_matrix(records: Iterable[BlendRecord]) -> RatingMatrix:
+    """Collect the star and profile counters of every record into count matrices."""
+    records = list(records)
+    n = len(records)
+
+    star_values = []
+    profile_values = {profile_type: [] for profile_type in PROFILE_SCALES}
+    tiebreaks = {profile_type: np.full(n, -1, dtype=np.int64) for profile_type in PROFILE_SCALES}
+    stored_average = np.zeros(n)
+    for row, record in enumerate(records):
+        blend = record.data
+        distribution = blend.get("ratingDistribution") or {}
+        star_values.extend(distribution.get(key) or 0 for key in STAR_KEYS)
+        stored_average[row] = blend.get("averageRating") or 0
+
+        ratings = blend.get("ratings") or {}
+        total_reviews = blend.get("totalReviews") or 0
+        for profile_type, (_, levels) in PROFILE_SCALES.items():
+            profile = ratings.get(profile_type)
+            counts = profile_counts(profile, total_reviews) if isinstance(profile, dict) else {}
+            profile_values[profile_type].extend(counts.get(level) or 0 for level in levels)
+            if isinstance(profile, dict) and profile.get("tiebreak") in levels:
+                tiebreaks[profile_type][row] = levels.index(profile["tiebreak"])
+
+    return RatingMatrix(
+        filenames=[record.filename for record in records],
+        stars=np.array(star_values, dtype=np.int64).reshape(n, len(STAR_KEYS)),
+        profiles={
+            profile_type: np.array(values, dtype=np.int64).reshape(n, len(PROFILE_SCALES[profile_type][1]))
+            for profile_type, values in profile_values.items()
+        },
+        stored_average=stored_average,
+        tiebreaks=tiebreaks,
+    )
+
+
+def profile_modes(counts: np.ndarray, tiebreaks: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Row-wise profile_level(): the mode, ties to the row's tiebreak level (-1 for none) if it
+    is tied, else to the level nearest the mean, then the milder one.
+    """
+    positions = np.arange(counts.shape[1])
+    top = counts.max(axis=1)
+    totals = counts.sum(axis=1)
+    mean = (counts @ positions) / np.maximum(totals, 1)
+    distance = np.where(counts == top[:, None], np.abs(positions - mean[:, None]), np.inf)
+    # argmin returns the first (mildest) of equally near levels
+    modes = distance.argmin(axis=1)
+    if tiebreaks is not None:
+        rows = np.arange(len(counts))
+        tied = (tiebreaks >= 0) & (counts[rows, np.maximum(tiebreaks, 0)] == top)
+        modes = np.where(tied, tiebreaks, modes)
+    return np.where(top > 0, modes, -1)
+
+
+def profile_distributions(counts: np.ndarray) -> np.ndarray:
+    """Row-wise profile_distribution(), before rounding to 14 significant digits."""
+    top = counts.max(axis=1, keepdims=True)
+    return np.where(top > 0, counts * 100 / np.maximum(top, 1), 0.0)
+
+
+def aggregate(matrix: RatingMatrix, prior_weight: Optional[float] = None) -> RatingAggregates:
+    """
+    Compute every aggregate for every blend at once.
+
+    The Bayesian score is (C * m + stars) / (C + reviews), where m is the mean star rating
+    over the whole corpus and C defaults to the mean number of reviews of rated blends.
+    """
+    reviews = matrix.stars.sum(axis=1)
+    stars = matrix.stars @ np.array(STAR_VALUES)
+    average = np.where(reviews > 0, np.floor(stars * 100 / np.maximum(reviews, 1) + 0.5) / 100, 0.0)
+
+    rated = reviews > 0
+    prior_mean = float(stars.sum() / reviews.sum()) if reviews.sum() else 0.0
+    if prior_weight is None:
+        prior_weight = float(reviews[rated].mean()) if rated.any() else 0.0
+    bayesian = (prior_weight * prior_mean + stars) / np.maximum(prior_weight + reviews, 1e-12)
+
+    return RatingAggregates(
+        reviews=reviews,
+        average=average,
+        bayesian=bayesian,
+        prior_mean=prior_mean,
+        prior_weight=prior_weight,
+        levels={profile_type: profile_modes(counts, matrix.tiebreaks.get(profile_type))
+                for profile_type, counts in matrix.profiles.items()},
+        distributions={profile_type: profile_distributions(counts) for profile_type, counts in matrix.profiles.items()},
+    )
+
+
+def stale_averages(matrix: RatingMatrix, aggregates: RatingAggregates) -> List[int]:
+    """Rows whose stored averageRating no longer matches their star counts."""
+    return np.flatnonzero(matrix.stored_average != aggregates.average).tolist()
+
+
+def write_averages(matrix: RatingMatrix, aggregates: RatingAggregates, rows: List[int],
+                   blend_dir: Path = BLEND_DATA_DIR) -> List[Path]:
+    """Write the recomputed averageRating back to just the given rows' files."""
+    written = []
+    for row in rows:
+        file_path = Path(blend_dir) / matrix.filenames[row]
+        average = float(aggregates.average[row])
+
+        def set_average(blend: Dict[str, Any]) -> None:
+            blend["averageRating"] = average
+
+        update_blend_file(file_path, set_average)
+        written.append(file_path)
+    return written
+
+
+def aggregates_report(matrix: RatingMatrix, aggregates: RatingAggregates) -> Dict[str, Any]:
+    """Per-blend aggregates as plain JSON-friendly values."""
+    blends = {}
+    for row, filename in enumerate(matrix.filenames):
+        levels = {}
+        for profile_type, (_, scale_levels) in PROFILE_SCALES.items():
+            index = int(aggregates.levels[profile_type][row])
+            levels[profile_type] = scale_levels[index] if index >= 0 else UNRATED_LEVEL
+        blends[filename] = {
+            "reviews": int(aggregates.reviews[row]),
+            "average": float(aggregates.average[row]),
+            "bayesian": round(float(aggregates.bayesian[row]), 4),
+            "levels": levels,
+        }
+    return {
+        "priorMean": round(aggregates.prior_mean, 4),
+        "priorWeight": round(aggregates.prior_weight, 4),
+        "blends": blends,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute rating aggregates for every blend.")
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    parser.add_argument("--write", action="store_true", help="write corrected averageRating values back")
+    parser.add_argument("--changed-list", type=Path, metavar="FILE",
+                        help="append the rewritten blend files here, one per line")
+    parser.add_argument("--prior-weight", type=float, default=None,
+                        help="Bayesian prior weight (default: mean reviews per rated blend)")
+    parser.add_argument("--top", type=int, default=0, metavar="N", help="print the N best blends by Bayesian score")
+    parser.add_argument("--output", type=Path, nargs="?", const=OUTPUT_FILE, default=None,
+                        help=f"write per-blend aggregates as JSON (default: {OUTPUT_FILE})")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    matrix = load_rating_matrix(load_blends(args.blend_dir).values())
+    loaded = time.perf_counter()
+    aggregates = aggregate(matrix, args.prior_weight)
+    stale = stale_averages(matrix, aggregates)
+    computed = time.perf_counter()
+
+    print(f"Aggregated {len(matrix.filenames)} blends in {(computed - loaded) * 1000:.1f} ms "
+          f"(loaded in {loaded - start:.2f}s); {len(stale)} stored averages are stale")
+
+    if args.top:
+        order = np.argsort(-aggregates.bayesian, kind="stable")[:args.top]
+        for row in order:
+            print(f"  {aggregates.bayesian[row]:.3f}  {aggregates.average[row]:.2f} "
+                  f"({aggregates.reviews[row]:>4})  {matrix.filenames[row][:-len('.json')]}")
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(aggregates_report(matrix, aggregates), f, indent=4, ensure_ascii=False)
+        print(f"Wrote {args.output}")
+
+    if args.write and stale:
+        written = write_averages(matrix, aggregates, stale, args.blend_dir)
+        print(f"Updated averageRating in {len(written)} blend files")
+        if args.changed_list:
+            with open(args.changed_list, 'a', encoding='utf-8') as f:
+                for file_path in written:
+                    f.write(f"{os.path.relpath(file_path)}\n")
+    elif stale and not args.write:
+        for row in stale[:20]:
+            print(f"  {matrix.filenames[row]}: stored {matrix.stored_average[row]}, "
+                  f"counts give {aggregates.average[row]}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""
+Append-only rating event log, with the blend files' rating counters as a view of it.
+
+Every rating that process_ratings.py accepts is appended as one JSON line to
+rating_log/events/<YYYY-MM-DD>.ndjson (next to blend_data/, partitioned by the UTC day it
+was logged, or the newest partition if that sorts later, so appends only ever extend the
+newest partition) before any blend file changes:
+
+    {"seq": 1042, "at": "2024-01-05T00:31:12Z", "blendId": "Peterson - Irish Flake",
+     "rating": 3.5, "profiles": {"strength": "Medium"}}
+
+Only the fields that feed the counters (plus the submission's id and timestamp) are kept;
+names, e-mails and IP hashes never reach the log. Events are never edited: a bad rating is
+undone by appending a retraction ({"retracts": 1042, ...} with the original's values),
+which counts -1 wherever the original counted +1.
+
+rating_log/genesis.json holds the counters blend_data/ had when logging started, up to the
+`seq` it records. Genesis plus every later event gives each blend's totalReviews,
+ratingDistribution, averageRating and profile counts. Those totals are kept as a snapshot
+(site_tools_output/cache/) with a high-water mark - the last sequence number and, per
+partition, the events and bytes it includes - so a sync only reads what was appended to
+any partition since, however it sorts, and rewrites the blends those events touched.
+Events are decoded a partition chunk at a time and summed with np.bincount, so a full
+replay of millions of events takes seconds.
+
+    python site_tools/rating_log.py --sync           # apply the log tail to blend_data/
+    python site_tools/rating_log.py --replay         # rebuild from genesis + the whole log
+    python site_tools/rating_log.py --retract 1042   # undo one rating
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Tuple, NamedTuple
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from blend_corpus import BLEND_DATA_DIR, cache_path_for, file_lock, load_blends, lock_path_for, read_pickle, \
+    update_blend_file, write_pickle
+from blend_ratings import PROFILE_SCALES, STAR_KEYS, STAR_VALUES, average_rating, empty_profile, migrate_ratings, \
+    settle_tiebreak
+from rating_aggregates import load_rating_matrix
+
+SNAPSHOT_VERSION = 3
+COLUMNS_VERSION = 1
+GENESIS_FILE = "genesis.json"
+EVENTS_DIR = "events"
+
+# Event fields kept from a rating submission
+EVENT_FIELDS = ["blendId", "rating", "profiles", "id", "timestamp"]
+
+# Event lines decoded per json.loads call
+BATCH_EVENTS = 1 << 16
+
+STAR_INDEX = {value: i for i, value in enumerate(STAR_VALUES)}
+LEVEL_INDEX = {profile: {level: i for i, level in enumerate(levels)}
+               for profile, (_, levels) in PROFILE_SCALES.items()}
+
+
+def log_dir_for(blend_dir: Path) -> Path:
+    """The event log belonging to a blend directory: rating_log/ beside it."""
+    return Path(blend_dir).resolve().parent / "rating_log"
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class EventColumns(NamedTuple):
+    """Decoded events as arrays; `blend` indexes `names` (blendIds)."""
+    names: List[str]
+    seq: np.ndarray       # int64
+    blend: np.ndarray     # int32
+    weight: np.ndarray    # int8: 1, or -1 for a retraction
+    star: np.ndarray      # int8: STAR_KEYS index
+    levels: np.ndarray    # int8: events x profiles (PROFILE_SCALES order), -1 when not rated
+
+
+def encode_events(events: List[Dict[str, Any]], previous: Optional[EventColumns] = None) -> EventColumns:
+    """Columns for `events`, appended to `previous` (whose names are extended)."""
+    names = list(previous.names) if previous else []
+    lookup = {name: i for i, name in enumerate(names)}
+    blend, weight, star, levels = [], [], [], []
+    for event in events:
+        index = lookup.get(event["blendId"])
+        if index is None:
+            index = lookup[event["blendId"]] = len(names)
+            names.append(event["blendId"])
+        blend.append(index)
+        weight.append(-1 if "retracts" in event else 1)
+        star.append(STAR_INDEX[float(event["rating"])])
+        profiles = event.get("profiles") or {}
+        levels.extend(index.get(profiles.get(profile), -1) for profile, index in LEVEL_INDEX.items())
+    columns = EventColumns(
+        names,
+        np.array([event["seq"] for event in events], dtype=np.int64),
+        np.array(blend, dtype=np.int32),
+        np.array(weight, dtype=np.int8),
+        np.array(star, dtype=np.int8),
+        np.array(levels, dtype=np.int8).reshape(len(events), len(LEVEL_INDEX)),
+    )
+    if previous is None:
+        return columns
+    return EventColumns(names, *(np.concatenate([old, new]) for old, new in zip(previous[1:], columns[1:])))
+
+
+class RatingLog:
+    """The date-partitioned event files of one log directory."""
+
+    def __init__(self, log_dir: Path):
+        self.dir = Path(log_dir)
+        self.events_dir = self.dir / EVENTS_DIR
+
+    def partitions(self) -> List[Path]:
+        return sorted(self.events_dir.glob("*.ndjson"))
+
+    def last_seq(self) -> int:
+        """Highest sequence number in the log (0 for an empty log)."""
+        # Every partition's last event: one written late to an older partition may be the highest
+        return max((self._last_seq(partition) for partition in self.partitions()), default=0)
+
+    @staticmethod
+    def _last_seq(partition: Path) -> int:
+        with open(partition, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            for size in (4096, 65536):
+                f.seek(max(0, end - size))
+                lines = [line for line in f.read().splitlines() if line.strip()]
+                for line in reversed(lines):
+                    try:
+                        return json.loads(line)["seq"]
+                    except (ValueError, KeyError):
+                        continue  # torn last line, or a line cut by the seek
+        return 0
+
+    def append(self, ratings: Iterable[Dict[str, Any]], at: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Log ratings (or retractions) under the next sequence numbers; returns the events. Hold log_lock()."""
+        at = at or utc_now()
+        seq = self.last_seq()
+        events = []
+        for rating in ratings:
+            seq += 1
+            event = {"seq": seq, "at": at}
+            if "retracts" in rating:
+                event["retracts"] = rating["retracts"]
+            event.update((field, rating[field]) for field in EVENT_FIELDS if field in rating)
+            events.append(event)
+        if events:
+            self.events_dir.mkdir(parents=True, exist_ok=True)
+            # Never behind the newest partition (a clock set back, say), so partitions only grow at the end
+            partitions = self.partitions()
+            stem = max(at[:10], partitions[-1].stem) if partitions else at[:10]
+            with open(self.events_dir / f"{stem}.ndjson", 'a', encoding='utf-8') as f:
+                f.write("".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events))
+                f.flush()
+                os.fsync(f.fileno())
+        return events
+
+    def events(self) -> Iterator[Dict[str, Any]]:
+        """Every complete event line, oldest first."""
+        for partition in self.partitions():
+            with open(partition, 'rb') as f:
+                for line in f:
+                    if line.endswith(b"\n") and line.strip():
+                        yield json.loads(line)
+
+    def columns(self, partition: Path) -> Tuple[EventColumns, int]:
+        """
+        A partition's events as columns, and the byte offset they cover. The columns are
+        cached, and since partitions only grow, only lines appended since are decoded.
+        """
+        cache_path = cache_path_for(self.dir, f"rating_events-{partition.stem}")
+        payload = read_pickle(cache_path, COLUMNS_VERSION)
+        with open(partition, 'rb') as f:
+            columns, offset, tail = None, 0, b""
+            if payload is not None:
+                # The cached bytes must still be there: a rewritten partition is decoded afresh
+                f.seek(max(0, payload["offset"] - len(payload["tail"])))
+                if f.read(len(payload["tail"])) == payload["tail"]:
+                    columns, offset, tail = payload["columns"], payload["offset"], payload["tail"]
+            f.seek(offset)
+            data = f.read()
+        # Only complete lines: an append in progress is picked up next time
+        data = data[:data.rfind(b"\n") + 1]
+        if data or columns is None:
+            lines = [line for line in data.splitlines() if line.strip()]
+            columns = encode_events([], columns)
+            for start in range(0, len(lines), BATCH_EVENTS):
+                # One json.loads over a batch of lines beats one call per line
+                columns = encode_events(json.loads(b"[" + b",".join(lines[start:start + BATCH_EVENTS]) + b"]"), columns)
+            offset += len(data)
+            tail = (tail + data)[-64:]
+            write_pickle(cache_path, {"version": COLUMNS_VERSION, "offset": offset, "tail": tail,
+                                      "columns": columns})
+        return columns, offset
+
+    def scan(self, mark: Dict[str, Any]) -> Iterator[Tuple[EventColumns, np.ndarray, Dict[str, Any]]]:
+        """
+        (partition columns, mask of events after `mark`, mark past them) per partition that
+        grew since the mark, older partitions included; a partition whose size is the offset
+        the mark has for it is skipped without reading it.
+        """
+        offsets = dict(mark["offsets"])
+        seq = mark["seq"]
+        for partition in self.partitions():
+            events, read = offsets.get(partition.stem, (0, 0))
+            if read and partition.stat().st_size == read:
+                continue
+            columns, offset = self.columns(partition)
+            # Events before genesis are in its counters already
+            after = (np.arange(len(columns.seq)) >= events) & (columns.seq > mark["genesis"])
+            if after.any():
+                seq = max(seq, int(columns.seq[after].max()))
+            offsets[partition.stem] = (len(columns.seq), offset)
+            yield columns, after, {"seq": seq, "genesis": mark["genesis"], "offsets": dict(offsets)}
+
+    def find(self, seq: int) -> Optional[Dict[str, Any]]:
+        return next((event for event in self.events() if event["seq"] == seq), None)
+
+
+def start_mark(seq: int = 0) -> Dict[str, Any]:
+    """The mark of a log nothing after genesis's `seq` has been read from."""
+    return {"seq": seq, "genesis": seq, "offsets": {}}
+
+
+class RatingCounters:
+    """Per-blend counters, one row per blend filename."""
+
+    def __init__(self, filenames: List[str], reviews: np.ndarray, stars: np.ndarray,
+                 profiles: Dict[str, np.ndarray]):
+        self.filenames = list(filenames)
+        self.rows = {filename: row for row, filename in enumerate(self.filenames)}
+        self.reviews = reviews
+        self.stars = stars
+        self.profiles = profiles
+
+    def row(self, filename: str) -> int:
+        """Row of a blend, adding an empty one for blends genesis didn't have."""
+        row = self.rows.get(filename)
+        if row is None:
+            row = self.rows[filename] = len(self.filenames)
+            self.filenames.append(filename)
+        return row
+
+    def of(self, row: int) -> tuple:
+        """(reviews, star counts, profile counts per profile) of one row, for comparing."""
+        return (int(self.reviews[row]), tuple(self.stars[row].tolist()),
+                tuple(tuple(counts[row].tolist()) for counts in self.profiles.values()))
+
+    def _grow(self) -> None:
+        extra = len(self.filenames) - len(self.reviews)
+        if extra > 0:
+            self.reviews = np.concatenate([self.reviews, np.zeros(extra, dtype=np.int64)])
+            self.stars = np.vstack([self.stars, np.zeros((extra, len(STAR_KEYS)), dtype=np.int64)])
+            self.profiles = {profile: np.vstack([counts, np.zeros((extra, counts.shape[1]), dtype=np.int64)])
+                             for profile, counts in self.profiles.items()}
+
+    def apply(self, columns: EventColumns, mask: np.ndarray) -> np.ndarray:
+        """Add the masked events (retractions subtract); returns the rows they touched."""
+        row_of = np.array([self.row(f"{name}.json") for name in columns.names], dtype=np.int64)
+        self._grow()
+        if not mask.any():
+            return np.zeros(0, dtype=np.int64)
+
+        n = len(self.filenames)
+        rows = row_of[columns.blend[mask]]
+        weights = columns.weight[mask].astype(np.int64)
+        self.reviews += np.bincount(rows, weights, minlength=n).astype(np.int64)
+        width = len(STAR_KEYS)
+        self.stars += np.bincount(rows * width + columns.star[mask], weights,
+                                  minlength=n * width).astype(np.int64).reshape(n, width)
+        levels = columns.levels[mask]
+        for p, counts in enumerate(self.profiles.values()):
+            rated = levels[:, p] >= 0
+            width = counts.shape[1]
+            counts += np.bincount(rows[rated] * width + levels[rated, p], weights[rated],
+                                  minlength=n * width).astype(np.int64).reshape(n, width)
+        return np.unique(rows)
+
+
+def genesis_counters(genesis: Dict[str, Any]) -> RatingCounters:
+    blends = genesis["blends"]
+    filenames = list(blends)
+    return RatingCounters(
+        filenames,
+        np.array([blends[f][0] for f in filenames], dtype=np.int64),
+        np.array([blends[f][1] for f in filenames], dtype=np.int64).reshape(len(filenames), len(STAR_KEYS)),
+        {profile: np.array([blends[f][2][profile] for f in filenames], dtype=np.int64)
+                    .reshape(len(filenames), len(levels))
+         for profile, (_, levels) in PROFILE_SCALES.items()},
+    )
+
+
+def write_genesis(log_dir: Path, blend_dir: Path, seq: int) -> None:
+    """Record blend_dir's current counters as the log's starting point, one blend per line."""
+    records = load_blends(blend_dir)
+    matrix = load_rating_matrix(records.values())
+    lines = []
+    for row, (filename, record) in enumerate(records.items()):
+        counts = [int(record.data.get("totalReviews") or 0), matrix.stars[row].tolist(),
+                  {profile: counts[row].tolist() for profile, counts in matrix.profiles.items()}]
+        lines.append(f"{json.dumps(filename, ensure_ascii=False)}: {json.dumps(counts, separators=(',', ':'))}")
+    log_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = log_dir / (GENESIS_FILE + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(f'{{"seq": {seq}, "created": "{utc_now()}", "blends": {{\n' + ",\n".join(lines) + "\n}}\n")
+    os.replace(tmp_path, log_dir / GENESIS_FILE)
+
+
+def ensure_genesis(log_dir: Path, blend_dir: Path) -> None:
+    """Start the log from blend_dir's counters if it has no genesis yet."""
+    if not (Path(log_dir) / GENESIS_FILE).is_file():
+        write_genesis(Path(log_dir), blend_dir, RatingLog(log_dir).last_seq())
+
+
+def load_snapshot(log_dir: Path, blend_dir: Path) -> Tuple[RatingCounters, Dict[str, Any], str]:
+    """(counters, high-water mark, genesis digest): the cached snapshot, or genesis when it is missing or stale."""
+    with open(Path(log_dir) / GENESIS_FILE, 'rb') as f:
+        raw = f.read()
+    digest = hashlib.sha1(raw).hexdigest()
+    payload = read_pickle(cache_path_for(blend_dir, "rating_snapshot"), SNAPSHOT_VERSION)
+    # A snapshot restored from another checkout (a CI cache, say) may count events this log
+    # doesn't have; it is only used while the log still holds the bytes it stopped at
+    if (payload is not None and payload["genesis"] == digest
+            and mark_tail(log_dir, payload["mark"]) == payload["tail"]):
+        return RatingCounters(payload["filenames"], payload["reviews"], payload["stars"],
+                              payload["profiles"]), payload["mark"], digest
+    genesis = json.loads(raw)
+    return genesis_counters(genesis), start_mark(genesis["seq"]), digest
+
+
+def mark_tail(log_dir: Path, mark: Dict[str, Any]) -> Optional[Dict[str, bytes]]:
+    """The last bytes before a mark in each partition it covers, or None if one of them is gone."""
+    tails = {}
+    for stem, (_, offset) in mark["offsets"].items():
+        try:
+            with open(Path(log_dir) / EVENTS_DIR / f"{stem}.ndjson", 'rb') as f:
+                f.seek(max(0, offset - 64))
+                tails[stem] = f.read(offset - f.tell())
+        except FileNotFoundError:
+            return None
+    return tails
+
+
+def save_snapshot(blend_dir: Path, log_dir: Path, counters: RatingCounters, mark: Dict[str, Any],
+                  digest: str) -> None:
+    write_pickle(cache_path_for(blend_dir, "rating_snapshot"), {
+        "version": SNAPSHOT_VERSION, "genesis": digest, "mark": mark, "tail": mark_tail(log_dir, mark),
+        "filenames": counters.filenames,
+        "reviews": counters.reviews, "stars": counters.stars, "profiles": counters.profiles,
+    })
+
+
+def advance(counters: RatingCounters, log: RatingLog, mark: Dict[str, Any]) -> Tuple[Dict[str, Any], set, int]:
+    """Apply every event after `mark`; returns (new mark, touched rows, events applied)."""
+    touched = set()
+    applied = 0
+    for columns, after, mark in log.scan(mark):
+        touched.update(counters.apply(columns, after).tolist())
+        applied += int(after.sum())
+    return mark, touched, applied
+
+
+def stored_counters(blend: Dict[str, Any]) -> tuple:
+    """A blend file's counters in RatingCounters.of() form (profiles already in counts format)."""
+    distribution = blend.get("ratingDistribution") or {}
+    ratings = blend.get("ratings") or {}
+    profiles = []
+    for profile, (_, levels) in PROFILE_SCALES.items():
+        counts = (ratings.get(profile) or {}).get("counts") or {}
+        profiles.append(tuple(counts.get(level) or 0 for level in levels))
+    return (blend.get("totalReviews") or 0, tuple(distribution.get(key) or 0 for key in STAR_KEYS), tuple(profiles))
+
+
+def write_counters(counters: RatingCounters, rows: Iterable[int], blend_dir: Path = BLEND_DATA_DIR) -> List[Path]:
+    """Write the counters of the given rows into blend files that differ; returns those files."""
+    written = []
+    for row in sorted(rows):
+        file_path = Path(blend_dir) / counters.filenames[row]
+        if not file_path.is_file():
+            print(f"Warning: {file_path.name} has logged ratings but no blend file", file=sys.stderr)
+            continue
+
+        def set_counters(blend: Dict[str, Any]) -> bool:
+            migrated = migrate_ratings(blend)
+            if not migrated and stored_counters(blend) == counters.of(row):
+                # Left alone, so a replay doesn't reformat blends whose counts are unchanged
+                return False
+            blend["totalReviews"] = int(counters.reviews[row])
+            distribution = blend.get("ratingDistribution") or {}
+            for key, count in zip(STAR_KEYS, counters.stars[row].tolist()):
+                # Keys only appear once rated, as when ratings were added one at a time
+                if count or key in distribution:
+                    distribution[key] = count
+            blend["ratingDistribution"] = distribution
+            blend["averageRating"] = average_rating(distribution)
+            ratings = blend.setdefault("ratings", {})
+            for profile, (_, levels) in PROFILE_SCALES.items():
+                profile_data = ratings.setdefault(profile, empty_profile(profile))
+                profile_data["counts"].update(zip(levels, counters.profiles[profile][row].tolist()))
+                settle_tiebreak(profile_data)
+            return True
+
+        # Under the blend's lock, so an editor saving another field at the same time keeps it
+        if update_blend_file(file_path, set_counters):
+            written.append(file_path)
+    return written
+
+
+def log_lock(log_dir: Path):
+    """
+    Serialises appends and syncs on one log: sequence numbers stay unique, and a sync
+    working from an older snapshot can't overwrite counters a newer one already wrote.
+    Blend edits don't take it.
+    """
+    return file_lock(lock_path_for(log_dir))
+
+
+def _sync(blend_dir: Path, log_dir: Path) -> List[Path]:
+    counters, mark, digest = load_snapshot(log_dir, blend_dir)
+    mark, touched, _ = advance(counters, RatingLog(log_dir), mark)
+    written = write_counters(counters, touched, blend_dir)
+    save_snapshot(blend_dir, log_dir, counters, mark, digest)
+    return written
+
+
+def sync(blend_dir: Path = BLEND_DATA_DIR, log_dir: Optional[Path] = None) -> List[Path]:
+    """Bring blend_dir's counters up to date with the log tail; returns the files written."""
+    log_dir = Path(log_dir or log_dir_for(blend_dir))
+    with log_lock(log_dir):
+        ensure_genesis(log_dir, blend_dir)
+        return _sync(blend_dir, log_dir)
+
+
+def record(ratings: List[Dict[str, Any]], blend_dir: Path = BLEND_DATA_DIR,
+           log_dir: Optional[Path] = None) -> List[Path]:
+    """Log already-validated ratings and sync; returns the blend files written."""
+    log_dir = Path(log_dir or log_dir_for(blend_dir))
+    with log_lock(log_dir):
+        # Genesis has to capture the counters from before these ratings
+        ensure_genesis(log_dir, blend_dir)
+        RatingLog(log_dir).append(ratings)
+        return _sync(blend_dir, log_dir)
+
+
+def replay(blend_dir: Path = BLEND_DATA_DIR, log_dir: Optional[Path] = None) -> Tuple[RatingCounters, int, List[Path]]:
+    """Rebuild every blend's counters from genesis and the whole log; returns (counters, events, files written)."""
+    log_dir = Path(log_dir or log_dir_for(blend_dir))
+    with log_lock(log_dir):
+        ensure_genesis(log_dir, blend_dir)
+        with open(log_dir / GENESIS_FILE, 'rb') as f:
+            raw = f.read()
+        genesis = json.loads(raw)
+        counters = genesis_counters(genesis)
+        mark, _, applied = advance(counters, RatingLog(log_dir), start_mark(genesis["seq"]))
+        written = write_counters(counters, range(len(counters.filenames)), blend_dir)
+        save_snapshot(blend_dir, log_dir, counters, mark, hashlib.sha1(raw).hexdigest())
+    return counters, applied, written
+
+
+def retract(seq: int, log_dir: Path) -> Dict[str, Any]:
+    """Append a retraction of event `seq`; raises ValueError if there is nothing to retract."""
+    log = RatingLog(log_dir)
+    with log_lock(log_dir):
+        original = None
+        for event in log.events():
+            if event["seq"] == seq and "retracts" not in event:
+                original = event
+            elif event.get("retracts") == seq:
+                raise ValueError(f"event {seq} is already retracted (by {event['seq']})")
+        if original is None:
+            raise ValueError(f"no rating event {seq}")
+        retraction = {field: original[field] for field in EVENT_FIELDS if field in original}
+        retraction["retracts"] = seq
+        return log.append([retraction])[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply, replay or correct the rating event log.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--sync", action="store_true", help="apply events newer than the snapshot to blend_data/")
+    group.add_argument("--replay", action="store_true", help="rebuild every blend's counters from genesis + the log")
+    group.add_argument("--retract", type=int, metavar="SEQ", help="undo rating event SEQ, then sync")
+    group.add_argument("--show", metavar="SEQ", type=int, help="print one event")
+    parser.add_argument("--blend-dir", type=Path, default=BLEND_DATA_DIR)
+    parser.add_argument("--log-dir", type=Path, default=None, help="default: rating_log/ beside the blend directory")
+    parser.add_argument("--changed-list", type=Path, metavar="FILE",
+                        help="append the rewritten blend files here, one per line")
+    args = parser.parse_args()
+    log_dir = args.log_dir or log_dir_for(args.blend_dir)
+
+    if args.show is not None:
+        event = RatingLog(log_dir).find(args.show)
+        if event is None:
+            print(f"Error: no event {args.show}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(event, indent=2, ensure_ascii=False))
+        return
+
+    start = time.perf_counter()
+    if args.replay:
+        counters, applied, written = replay(args.blend_dir, log_dir)
+        elapsed = time.perf_counter() - start
+        print(f"Replayed {applied} events over {len(counters.filenames)} blends in {elapsed:.2f}s; "
+              f"{len(written)} blend files changed")
+    else:
+        if args.retract is not None:
+            try:
+                event = retract(args.retract, log_dir)
+            except ValueError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                sys.exit(1)
+            print(f"Logged retraction {event['seq']} of event {args.retract} ({event['blendId']})")
+        written = sync(args.blend_dir, log_dir)
+        print(f"Synced in {time.perf_counter() - start:.2f}s; {len(written)} blend files changed")
+
+    if args.changed_list:
+        with open(args.changed_list, 'a', encoding='utf-8') as f:
+            for file_path in written:
+                f.write(f"{os.path.relpath(file_path)}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Synthetic blend corpora for benchmarking the tooling beyond the real ~8,400 blends.
+
+Blends are built with blend_data_creator.transform_blend_data, so they have exactly the
+schema new blends get, and then filled in the way the real corpus looks: blenders,
+countries, cuts, blend types, contents and flavorings drawn from the dropdown lists in
+assets/data/ (a few blenders own most blends), descriptions and notes of realistic length,
+and ratings on most blends with a long tail of review counts. Source pictures are
+decodable JPEGs of varying size and aspect ratio named after their blends, like
+blend_pictures/.
+
+Output is deterministic for a given seed and independent of the number of workers:
+
+    <out>/blend_data/        one blend file per blend (sparse format unless --dense)
+    <out>/blend_pictures/    source pictures for the first --images blends
+    <out>/corpus.json        what was generated, so a matching corpus can be reused
+
+    python site_tools/synthetic_corpus.py /tmp/corpus-100k --blends 100000 --images 500
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+from blend_corpus import ROOT_DIR, dump_blend_for
+from blend_data_creator import transform_blend_data
+from blend_ratings import PROFILE_SCALES, STAR_KEYS, STAR_VALUES, average_rating
+from blend_sparse import SPARSE_MARKER
+
+VOCAB_DIR = ROOT_DIR / "assets" / "data"
+
+# Bump whenever the generated records change, so saved corpora are regenerated
+CORPUS_VERSION = 1
+CORPUS_FILE = "corpus.json"
+
+# Blends (or pictures) generated per task; each chunk has its own seeded generator
+CHUNK_SIZE = 2000
+
+# Share of blends with at least one rating, as in blend_data/ (7,039 of 8,371)
+RATED_SHARE = 0.84
+# The most reviewed real blend has 685
+MAX_REVIEWS = 1000
+# About half of the real blends have no flavoring and a third are sold in bulk
+UNFLAVORED_SHARE = 0.45
+PACKAGE_SIZES = ["40 grams", "50 grams", "100 grams", "250 grams", "1.5oz", "1.75oz", "8oz"]
+
+WORDS = (
+    "aged autumn bright black burley cask cavendish cherry country cross cut dark dutch "
+    "evening flake fresh gold harbour heritage honey latakia leaf mixture morning navy "
+    "old orange oriental perique plug private reserve ribbon rope royal rum sailor select "
+    "smoke special spice sweet tawny twist vanilla velvet virginia whisky wild winter"
+).split()
+
+PROSE = (
+    "a blend of ripe red and bright virginias pressed and aged before slicing with a touch "
+    "of perique for spice and a little latakia to round out the smoke it burns cool and "
+    "slow with a natural sweetness that deepens towards the bottom of the bowl the tin note "
+    "is of dried fruit hay and cocoa while the room note stays pleasant the cut rubs out "
+    "easily and packs without fuss an old favourite reissued from the original recipe"
+).split()
+
+
+def load_pools(vocab_dir: Path = VOCAB_DIR) -> Dict[str, List[str]]:
+    """Value pools for each field, from the dropdown lists the site itself offers."""
+    pools = {}
+    for key, filename in [("blender", "blenders.json"), ("blendedBy", "blended_by.json"),
+                          ("manufacturedBy", "manufactured_by.json"), ("country", "countries.json"),
+                          ("cut", "cut_types.json"), ("blendType", "blend_types.json"),
+                          ("contents", "contents.json"), ("flavoring", "flavorings.json"),
+                          ("production", "production.json"), ("packaging", "packaging_types.json")]:
+        with open(vocab_dir / filename, 'r', encoding='utf-8') as f:
+            values = json.load(f)
+        # packaging_types.json lists synonyms together; the first is the display name
+        pools[key] = [value[0] if isinstance(value, list) else value for value in values]
+    # Blender names end up in filenames
+    pools["blender"] = [value for value in pools["blender"] if "/" not in value]
+    return pools
+
+
+def skewed(rng: random.Random, values: List[str]) -> str:
+    """Pick from values with a long tail: early entries are picked far more often."""
+    return values[min(int(rng.paretovariate(1.1)) - 1, len(values) - 1)] if rng.random() < 0.5 \
+        else rng.choice(values)
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    start = rng.randrange(len(PROSE))
+    text = " ".join(PROSE[(start + i) % len(PROSE)] for i in range(words))
+    return text[:1].upper() + text[1:] + "."
+
+
+def fill_ratings(rng: random.Random, blend: Dict[str, Any]) -> None:
+    """Give a blend a believable set of ratings: a per-blend quality and a long tail of reviews."""
+    if rng.random() >= RATED_SHARE:
+        return
+    reviews = min(int(rng.paretovariate(0.9)), MAX_REVIEWS)
+    quality = rng.uniform(1.5, 3.9)
+    distribution = dict.fromkeys(STAR_KEYS, 0)
+    for _ in range(reviews):
+        stars = min(max(round(rng.gauss(quality, 0.6) * 2) / 2, 0.5), 4.0)
+        distribution[STAR_KEYS[STAR_VALUES.index(stars)]] += 1
+    blend["totalReviews"] = blend["reviewCount"] = reviews
+    blend["ratingDistribution"] = distribution
+    blend["averageRating"] = average_rating(distribution)
+    blend["maxRating"] = max(value for key, value in zip(STAR_KEYS, STAR_VALUES) if distribution[key])
+    for profile_type, (_, levels) in PROFILE_SCALES.items():
+        counts = blend["ratings"][profile_type]["counts"]
+        centre = rng.randrange(len(levels))
+        # Not every review rates every profile
+        for _ in range(rng.randint(0, reviews)):
+            level = min(max(int(rng.gauss(centre, 1.2)), 0), len(levels) - 1)
+            counts[levels[level]] += 1
+
+
+def synthetic_blend(rng: random.Random, index: int, pools: Dict[str, List[str]]) -> Tuple[str, str, Dict[str, Any]]:
+    """(filename stem, key, blend data) for blend number `index`."""
+    brand = skewed(rng, pools["blender"])
+    # The index keeps names unique however the words fall
+    name = " ".join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 3))) + f" No. {index}"
+    contents = rng.sample(pools["contents"], rng.randint(1, 4))
+    flavoring = [] if rng.random() < UNFLAVORED_SHARE else rng.sample(pools["flavoring"], rng.randint(1, 2))
+    packaging = "Bulk" if rng.random() < 0.35 else f"{rng.choice(PACKAGE_SIZES)} {rng.choice(pools['packaging']).lower()}"
+    raw = {
+        "brand": brand,
+        "blend_name": name,
+        "details": {
+            "Blended By": rng.choice(pools["blendedBy"]) if rng.random() < 0.6 else "",
+            "Manufactured By": rng.choice(pools["manufacturedBy"]) if rng.random() < 0.4 else "",
+            "Production": skewed(rng, pools["production"]),
+            "Country": skewed(rng, pools["country"]),
+            "Blend Type": rng.choice(pools["blendType"]),
+            "Contents": ",  ".join(sorted(contents)),
+            "Cut": rng.choice(pools["cut"]),
+            "Packaging": packaging,
+            "Flavoring": ", ".join(flavoring),
+        },
+        "tin_description": " ".join(sentence(rng, rng.randint(8, 24)) for _ in range(rng.randint(1, 3))),
+        "notes": sentence(rng, rng.randint(5, 20)) if rng.random() < 0.3 else "",
+    }
+    stem = f"{brand} - {name}"
+    transformed = transform_blend_data(raw, f"{stem}.jpg")
+    key, blend = next(iter(transformed.items()))
+    blend["ratingDistribution"] = dict.fromkeys(STAR_KEYS, 0)
+    fill_ratings(rng, blend)
+    return stem, key, blend
+
+
+def _write_chunk(blend_dir: str, seed: int, start: int, end: int) -> List[str]:
+    pools = load_pools()
+    rng = random.Random(f"{seed}-{start}")
+    stems = []
+    for index in range(start, end):
+        stem, key, blend = synthetic_blend(rng, index, pools)
+        with open(os.path.join(blend_dir, f"{stem}.json"), 'w', encoding='utf-8') as f:
+            f.write(dump_blend_for(Path(blend_dir), key, blend))
+        stems.append(stem)
+    return stems
+
+
+def _picture_chunk(pictures_dir: str, seed: int, stems: List[str]) -> List[str]:
+    rng = random.Random(f"{seed}-{stems[0] if stems else ''}")
+    for stem in stems:
+        width, height = rng.randint(300, 1200), rng.randint(300, 1200)
+        img = Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        # Shapes give the encoder (and the resizer) real detail to work with
+        for _ in range(12):
+            x, y = rng.randrange(width), rng.randrange(height)
+            draw.ellipse([x, y, x + rng.randint(20, width // 2), y + rng.randint(20, height // 2)],
+                         fill=tuple(rng.randrange(256) for _ in range(3)))
+        img.save(os.path.join(pictures_dir, f"{stem}.jpg"), "JPEG", quality=85)
+    return stems
+
+
+def read_corpus_info(out_dir: Path) -> Optional[Dict[str, Any]]:
+    """The corpus.json of a generated corpus, or None if there isn't one."""
+    try:
+        with open(Path(out_dir) / CORPUS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def generate(out_dir: Path, blends: int, images: int = 0, seed: int = 1, sparse: bool = True,
+             workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Write a synthetic corpus into out_dir, replacing any corpus already there, and return
+    its corpus.json. A corpus with the same settings already in place is kept as it is.
+    """
+    out_dir = Path(out_dir)
+    info = {"version": CORPUS_VERSION, "blends": blends, "images": min(images, blends),
+            "seed": seed, "sparse": sparse}
+    if read_corpus_info(out_dir) == info:
+        return info
+
+    blend_dir, pictures_dir = out_dir / "blend_data", out_dir / "blend_pictures"
+    for directory in (blend_dir, pictures_dir):
+        shutil.rmtree(directory, ignore_errors=True)
+        directory.mkdir(parents=True)
+    (out_dir / CORPUS_FILE).unlink(missing_ok=True)
+    if sparse:
+        (blend_dir / SPARSE_MARKER).touch()
+
+    starts = list(range(0, blends, CHUNK_SIZE))
+    workers = workers or os.cpu_count() or 1
+    stems = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in executor.map(_write_chunk, [str(blend_dir)] * len(starts), [seed] * len(starts), starts,
+                                  [min(start + CHUNK_SIZE, blends) for start in starts]):
+            stems.extend(chunk)
+        pictured = stems[:info["images"]]
+        chunks = [pictured[i:i + CHUNK_SIZE // 20] for i in range(0, len(pictured), CHUNK_SIZE // 20)]
+        list(executor.map(_picture_chunk, [str(pictures_dir)] * len(chunks), [seed] * len(chunks), chunks))
+
+    # Written last: a half-generated corpus is never mistaken for a finished one
+    with open(out_dir / CORPUS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=2)
+    return info
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic blend corpus for benchmarks.")
+    parser.add_argument("out_dir", type=Path, help="directory to write blend_data/ and blend_pictures/ into")
+    parser.add_argument("--blends", type=int, default=10000)
+    parser.add_argument("--images", type=int, default=200, help="source pictures, for the first N blends")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dense", action="store_true", help="write full blend files instead of sparse ones")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.out_dir.resolve() == ROOT_DIR:
+        print("Error: refusing to generate into the repository root", file=sys.stderr)
+        sys.exit(1)
+    start = time.perf_counter()
+    info = generate(args.out_dir, args.blends, args.images, args.seed, not args.dense, args.workers)
+    print(f"{info['blends']:,} blends and {info['images']:,} pictures in {args.out_dir} "
+          f"({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()